@@ -1,4 +1,4 @@
-# Copyright 2021 Hewlett Packard Enterprise Development LP
+# Copyright 2021, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -84,6 +84,9 @@ install -m 755 -d                                                   %{buildroot}
 install -m 755 latest_version/latest_version.py                     %{buildroot}%{lvdir}
 install -m 755 latest_version/latest_version.sh                     %{buildroot}%{lvdir}
 install -m 755 latest_version/update_external_versions.sh           %{buildroot}%{lvdir}
+install -m 755 latest_version/url_cache.py                          %{buildroot}%{lvdir}
+install -m 755 latest_version/version_resolver.py                   %{buildroot}%{lvdir}
+install -m 755 latest_version/snapshot.py                           %{buildroot}%{lvdir}
 
 install -m 755 -d                                                   %{buildroot}%{scdir}/
 install -m 755 scripts/runBuildPrep.sh                              %{buildroot}%{scdir}
@@ -118,6 +121,9 @@ rmdir %{buildroot}%{gldir}
 rm -f %{buildroot}%{lvdir}/latest_version.py
 rm -f %{buildroot}%{lvdir}/latest_version.sh
 rm -f %{buildroot}%{lvdir}/update_external_versions.sh
+rm -f %{buildroot}%{lvdir}/url_cache.py
+rm -f %{buildroot}%{lvdir}/version_resolver.py
+rm -f %{buildroot}%{lvdir}/snapshot.py
 rmdir %{buildroot}%{lvdir}
 
 rm -f %{buildroot}%{scdir}/runBuildPrep.sh
@@ -161,6 +167,9 @@ rmdir %{buildroot}%{cmtdir}
 %attr(755, root, root) %{lvdir}/latest_version.py
 %attr(755, root, root) %{lvdir}/latest_version.sh
 %attr(755, root, root) %{lvdir}/update_external_versions.sh
+%attr(755, root, root) %{lvdir}/url_cache.py
+%attr(755, root, root) %{lvdir}/version_resolver.py
+%attr(755, root, root) %{lvdir}/snapshot.py
 
 %dir %{scdir}
 %attr(755, root, root) %{scdir}/runBuildPrep.sh
@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -24,10 +24,14 @@
 #
 # Very simple scanner for files missing copyrights & licenses
 # It should be called from the root of the target repo
-# Usage: copyright_license_check.sh
+# Usage: copyright_license_check.sh [<file-list>]
+#
+# If <file-list> is specified, it is a file listing the files to scan, which has already
+# been produced by running file_filter with the config files that this script would use
+# (runLint.sh does this, so that the files for all of its tools are filtered in a single
+# pass). Otherwise, this script runs file_filter itself.
 
-TMPFILE1=/tmp/.copyright_license_check.$$.$RANDOM.tmp.1
-TMPFILE2=/tmp/.copyright_license_check.$$.$RANDOM.tmp.2
+TMPFILE=/tmp/.copyright_license_check.$$.$RANDOM.tmp
 CLC_CONF="copyright_license_check.yaml"
 MYDIR="copyright_license_check"
 MYNAME="copyright_license_check.sh"
@@ -87,6 +91,14 @@ function run_cmd_verify_dir
     [ -d "$out" ] || err_exit "Non-directory path ($out) given by command: $*"
 }
 
+FILE_LIST=""
+if [ $# -gt 1 ]; then
+    err_exit "Too many arguments: $*"
+elif [ $# -eq 1 ]; then
+    FILE_LIST="$1"
+    [ -f "$FILE_LIST" ] || err_exit "File list does not exist or is not a file: $FILE_LIST"
+fi
+
 [ -n "${CMS_META_TOOLS_PATH}" ] && info "CMS_META_TOOLS_PATH is set to $CMS_META_TOOLS_PATH"
 
 # If CMS_META_TOOLS_PATH variable is set to a valid value, we will defer to that
@@ -164,16 +176,21 @@ else
     err_exit "Does not exist: $FF_DIR"
 fi
 
-if ! git ls-files --empty-directory > $TMPFILE1 ; then
-    rm -f $TMPFILE1 >/dev/null 2>&1
-    err_exit "Command failed:  git ls-files --empty-directory"
-fi
-
 # $REPO_CLC_CONF not in quotes because we know it has no whitespace and because if it is
 # blank (meaning there is no repo clc config file), we do not want it passed as an empty
 # string argument
-if ! cat $TMPFILE1 | "$FF_TARGETS" "$DEFAULT_CLC_CONF" $REPO_CLC_CONF > $TMPFILE2 ; then
-    rm -f $TMPFILE1 $TMPFILE2 >/dev/null 2>&1
+#
+# file_filter enumerates the files tracked by git itself, so that directories which are
+# excluded by the config files are skipped entirely, rather than being listed and then
+# filtered out one file at a time
+if [ -n "$FILE_LIST" ]; then
+    info "Using list of files to scan from $FILE_LIST"
+    if ! cp "$FILE_LIST" $TMPFILE ; then
+        rm -f $TMPFILE >/dev/null 2>&1
+        err_exit "Unable to copy $FILE_LIST"
+    fi
+elif ! "$FF_TARGETS" --walk . --git-tracked "$DEFAULT_CLC_CONF" $REPO_CLC_CONF > $TMPFILE ; then
+    rm -f $TMPFILE >/dev/null 2>&1
     err_exit "$FF_TARGETS failed"
 fi
 
@@ -182,10 +199,10 @@ FAIL=0
 while read FILE ; do
     scan_file "$FILE" || FAIL=1
 done << EOF
-$(cat $TMPFILE2)
+$(cat $TMPFILE)
 EOF
 
-rm -f $TMPFILE1 $TMPFILE2 >/dev/null 2>&1
+rm -f $TMPFILE >/dev/null 2>&1
 
 if [ $FAIL -eq 0 ]; then
     info "All scanned code passed"
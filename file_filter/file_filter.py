@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -22,25 +22,95 @@
 # ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 #
-# Usage: file_filter.py <config-file-1> [<config-file-2>] ...
+# Usage: file_filter.py [--cache-dir <dir>] [-z] [--jobs <n> [--parallel-threshold <n>]]
+#                       [--walk <dir> [--git-tracked]] [--stats] [--stats-file <file>]
+#                       <config-file-1> [<config-file-2>] ...
+#    or: file_filter.py [--cache-dir <dir>] [-z] [--walk <dir> [--git-tracked]]
+#                       [--profile-output-dir <dir>]
+#                       --profile <name>=<config-file-1>[:<config-file-2>...]
+#                       [--profile <name>=<config-file-1>[:<config-file-2>...]] ...
 #
 # 1) For each file, parse it and read in its include and exclude
 # fields. Later files will overwrite values from fields in earlier files.
 #
 # 2) Build up a set of include and exclude rules from these include and exclude
-# fields.
+# fields. Literal rules (extensions, files, subfiles, directories, and
+# subdirectories with no regex special characters) are indexed in sets and tries,
+# so they can be checked with hash lookups. The remaining rules on each side are
+# merged into as few regular expressions as possible, so that each path is
+# normally tested with at most a single regex call per side.
 #
 # 3) Reads a list of path+filenames from stdin
 #
 # 4) Filters them based on the includes & excludes from the yaml files
 #
 # 5) Prints to stdout any which make it through the filter
+#
+# If -z is specified, the paths read in step 3 and printed in step 5 are terminated
+# by NUL characters instead of newlines (as with git ls-files -z). In this mode the
+# paths are handled as bytes, without being decoded or stripped of whitespace.
+#
+# If --walk is specified, then instead of reading paths from stdin in step 3, the
+# files inside the specified directory are enumerated (with paths relative to it).
+# Directories matching an exclude_directories, exclude_subdirectories,
+# exclude_dirname_patterns, or exclude_dirpath_patterns rule are pruned as soon as
+# they are reached, so their contents are never enumerated. With --git-tracked, the
+# files are taken from the git index (as with git ls-files) instead of the file
+# system. Otherwise, .git directories are skipped.
+#
+# If --jobs is specified with a value other than 1, and at least --parallel-threshold
+# paths are read (default 200000), the paths are split into chunks which are filtered
+# by that many worker processes (0 means one per CPU). The output order is unchanged.
+#
+# If --stats or --stats-file is specified, the rules are evaluated one at a time
+# (much more slowly), and a report is made of how many paths were read and emitted,
+# and for each rule, how many paths it was evaluated against, how many it matched,
+# and how long that took. Every include rule is evaluated against every path, and
+# every exclude rule against every included path. The report is written to stderr,
+# or as JSON to the --stats-file file. This cannot be combined with --walk or --jobs.
+#
+# If one or more --profile arguments are specified, each names a separate list of
+# config files, and the paths are filtered through all of these profiles in a single
+# pass. Each path which makes it through at least one profile is printed after a
+# comma-separated list of those profiles and a tab. If --profile-output-dir is
+# specified, then instead each path is written to a file in that directory named
+# after each profile it makes it through. With --walk, only directories which are
+# excluded by every profile are pruned.
+#
+# If --cache-dir is specified (or the FILE_FILTER_CACHE_DIR environment variable is
+# set), the compiled rules are cached in that directory, keyed by a hash of the config
+# files and of this tool. On a cache hit, steps 1 and 2 are skipped entirely (and the
+# yaml module is never imported). Any change to a config file or to this tool results
+# in a different key, so stale entries are never used.
+#
+# If a config file must be parsed but the yaml module cannot be imported, the exit code
+# is 3 (and nothing has been read from stdin), so that file_filter.sh can install the
+# module and run this tool again.
+#
+# The same filtering is available to other Python tools without starting a new
+# process, by importing the FileFilter class from this module:
+#
+#   from file_filter import FileFilter
+#   ff = FileFilter([ default_config_path, repo_config_path ])
+#   for path in ff.filter(paths):
+#       ...
 
+import bisect
+import copy
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
 import re
+import subprocess
 import sys
-import yaml
+import tempfile
+import time
 
 valid_fields = []
+# Maps each field name to its type (extensions, files, etc)
+field_kinds = dict()
 for s in [ "extensions", 
            "files", 
            "subfiles",
@@ -51,10 +121,9 @@ for s in [ "extensions",
            "filepath_patterns", 
            "dirpath_patterns" ]:
     for ie in [ "include", "exclude" ]:
-        valid_fields.append("%s_%s" % (ie, s))
-        valid_fields.append("also_%s_%s" % (ie, s))
-
-field_prog_lists = { f: [] for f in valid_fields }
+        for f in [ "%s_%s" % (ie, s), "also_%s_%s" % (ie, s) ]:
+            valid_fields.append(f)
+            field_kinds[f] = s
 
 def print_err(s):
     print("file_filter.py: ERROR: " + s, file=sys.stderr)
@@ -120,7 +189,45 @@ def dirname_pattern_to_re_prog(dname):
         fppat += "$"
     return re.compile(fppat)
 
+# Patterns which use backreferences, named groups, conditional groups, or global inline
+# flags cannot be merged into an alternation with other patterns without changing their
+# meaning (group numbers shift, names may collide, and global flags would apply to every
+# alternative). Any pattern matching this is left as a standalone program.
+UNCOMBINABLE_RE = re.compile(r"\\[1-9]|\(\?P[<=>]|\(\?\(|\(\?[aiLmsux]+\)")
+
+# Merge a list of compiled programs into a (usually single element) list of programs,
+# such that any(p.match(s) for p in result) == any(p.match(s) for p in progs) for all s.
+# Every pattern we generate is anchored at the start by match() and ends in $, so
+# wrapping each one in a non-capturing group and joining them with | preserves the
+# per-rule semantics.
+def combine_re_progs(progs):
+    combinable = [ p for p in progs if not UNCOMBINABLE_RE.search(p.pattern) ]
+    standalone = [ p for p in progs if UNCOMBINABLE_RE.search(p.pattern) ]
+    if len(combinable) > 1:
+        combined_pattern = "|".join("(?:%s)" % p.pattern for p in combinable)
+        try:
+            combinable = [ re.compile(combined_pattern) ]
+        except (re.error, OverflowError, RecursionError):
+            # Should not happen, since each pattern compiled on its own, but if the
+            # combined pattern is too large or complex for the regex engine, we can
+            # always fall back to evaluating the rules one at a time
+            pass
+    return combinable + standalone
+
+# Exit code if a config file must be parsed but the yaml module cannot be imported
+YAML_UNAVAILABLE_RC = 3
+
+class YamlUnavailableException(Exception):
+    """
+    Raised if a config file must be parsed but the yaml module cannot be imported.
+    """
+    pass
+
 class ConfigParseException(Exception):
+    """
+    Raised for any problem loading or parsing a config. Its args are the error
+    messages, most specific first.
+    """
     pass
 
 def get_reprog(field_name, s):
@@ -146,11 +253,12 @@ def get_reprog(field_name, s):
     # Should never get here, because we have previously vetted the field_name
     raise ConfigParseException("PROGRAMMING LOGIC ERROR: get_reprog: Unknown field name: %s" % field_name)
 
-def parse_field(config_data, field_name, field_value):
+def parse_field(field_name, field_value):
+    # Returns a list of (rule string, compiled program) tuples
     if not isinstance(field_value, list):
         raise ConfigParseException(
                 "Field %s should be a list but it is type %s" % (field_name, type(field_value)))
-    field_prog_lists[field_name] = list()
+    rules = list()
     for s in field_value:
         if not isinstance(s, str):
             raise ConfigParseException(
@@ -159,66 +267,989 @@ def parse_field(config_data, field_name, field_value):
             raise ConfigParseException(
                 "Field %s contains an empty string, which is not permitted" % field_name)
         try:
-            field_prog_lists[field_name].append(get_reprog(field_name, s))
+            rules.append((s, get_reprog(field_name, s)))
         except re.error as e:
-            print_err(str(e))
             raise ConfigParseException(
+                str(e),
                 "Field %s contains an invalid string value: %s" % (field_name, s))
+    return rules
 
-# First parse the config yaml files
-
-if len(sys.argv) < 2:
-    err_exit("At least one config file must be specified")
-
-for config_file in sys.argv[1:]:
+def read_config_file(config_file):
     try:
-        with open(config_file, "rt") as f:
-            config_data = yaml.safe_load(f)
+        with open(config_file, "rb") as f:
+            return f.read()
     except FileNotFoundError:
-        err_exit("File not found: %s" % config_file)
+        raise ConfigParseException("File not found: %s" % config_file)
+
+def load_config_data(config_bytes, config_file):
+    # yaml is only needed when parsing config files, which is not necessary
+    # when their compiled rules are cached, so it is not imported until then
+    try:
+        import yaml
+    except ImportError as e:
+        raise YamlUnavailableException("Unable to parse %s: %s" % (config_file, e))
+    try:
+        return yaml.safe_load(config_bytes)
     except yaml.YAMLError as e:
-        err_exit(
-            str(e), 
+        raise ConfigParseException(
+            str(e),
             "YAML error parsing %s" % config_file)
-    for field_name in valid_fields:
+
+# Characters with special meaning in a Python regular expression. A rule string
+# which contains none of these means exactly what it says, so it can be matched
+# with plain string operations.
+RE_SPECIAL_CHARS = frozenset("\\.^$*+?{}[]|()")
+
+# The rule types which apply to every file inside of a matching directory
+DIRECTORY_KINDS = [ "directories", "subdirectories", "dirname_patterns", "dirpath_patterns" ]
+
+def has_top_level_alternation(pattern):
+    # Returns True if pattern contains a | which is not inside of a group or
+    # character class
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            # Skip the escaped character
+            i += 1
+        elif in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+            # A ] immediately after the opening [ (or [^) is a literal ]
+            if pattern[i+1:i+2] == "^":
+                i += 1
+            if pattern[i+1:i+2] == "]":
+                i += 1
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+# Lookarounds could examine the text after a directory, which would make the rule
+# depend on more than just the directory
+LOOKAROUND_RE = re.compile(r"\(\?<?[=!]")
+
+def is_directory_rule(field_name, prog):
+    # Directory rule programs are normally of the form <pattern>/.*$, meaning they
+    # match either all paths inside of a directory or none of them. But that is not
+    # true if the rule contains a lookaround, or if it has an alternation which is
+    # not inside of a group (for example, a dirpath_pattern of "a|b" becomes
+    # a|b/.*$). Rules like those are evaluated as file rules.
+    if field_kinds[field_name] not in DIRECTORY_KINDS:
+        return False
+    return not has_top_level_alternation(prog.pattern) and not LOOKAROUND_RE.search(prog.pattern)
+
+# The rule types which are indexed when their strings are literals
+LITERAL_KINDS = [ "extensions", "files", "subfiles", "directories", "subdirectories" ]
+
+def is_literal(s):
+    return not any(c in RE_SPECIAL_CHARS for c in s)
+
+def trie_insert(trie, components):
+    node = trie
+    for c in components:
+        node = node.setdefault(c, dict())
+    # None can never be a path component, so we use it to mark the end of an entry
+    node[None] = True
+
+class RuleMatcher(object):
+    """
+    Answers whether a path matches at least one of a set of rules (that is, all of
+    the include rules, or all of the exclude rules).
+
+    Literal rules are answered without regular expressions:
+    - extensions: set of extensions, checked against the text after the final .
+    - files: set of exact paths
+    - subfiles: trie of reversed path components, walked from the basename up
+    - directories: trie of path components, walked from the root down
+    - subdirectories: trie of path components, walked from every directory component
+
+    All other rules are evaluated using their combined regular expressions.
+
+    A compiled RuleMatcher can be converted to and from a JSON-compatible state
+    (see to_state and from_state), so that it can be cached.
+
+    A RuleMatcher works either on str paths or (if binary is True) on bytes paths.
+    """
+    def __init__(self, binary=False):
+        if binary:
+            self.newline, self.dot, self.slash = b"\n", b".", b"/"
+        else:
+            self.newline, self.dot, self.slash = "\n", ".", "/"
+        self.num_rules = 0
+        # Literal rule strings, by rule type
+        self.literals = { kind: [] for kind in LITERAL_KINDS }
+        self.extensions = set()
+        self.files = set()
+        self.subfile_trie = dict()
+        self.directory_trie = dict()
+        self.subdirectory_trie = dict()
+        # Programs for rules which are not in the above indexes
+        self.progs = list()
+        # Programs for every rule. When loaded from a cached state, these are not
+        # compiled until they are first needed, since that is rare.
+        self.all_progs = list()
+        self.all_patterns = None
+
+    def __len__(self):
+        return self.num_rules
+
+    def add_rule(self, field_name, s, prog):
+        self.num_rules += 1
+        self.all_progs.append(prog)
+        kind = field_kinds[field_name]
+        if kind in LITERAL_KINDS and is_literal(s):
+            self.add_literal(kind, s)
+        else:
+            self.progs.append(prog)
+
+    def add_literal(self, kind, s):
+        self.literals[kind].append(s)
+        if kind == "extensions":
+            self.extensions.add(s)
+        elif kind == "files":
+            self.files.add(s)
+        elif kind == "subfiles":
+            trie_insert(self.subfile_trie, reversed(s.split(self.slash)))
+        elif kind == "directories":
+            trie_insert(self.directory_trie, s.split(self.slash))
+        elif kind == "subdirectories":
+            trie_insert(self.subdirectory_trie, s.split(self.slash))
+
+    def compile(self):
+        self.progs = combine_re_progs(self.progs)
+        self.all_progs = combine_re_progs(self.all_progs)
+
+    def to_state(self):
+        return {
+            "num_rules": self.num_rules,
+            "literals": self.literals,
+            "patterns": [ p.pattern for p in self.progs ],
+            "all_patterns": [ p.pattern for p in self.all_progs ] }
+
+    @classmethod
+    def from_state(cls, state, binary=False):
+        # For binary matchers, the rule strings and patterns are encoded the same way
+        # that Python encodes file system paths
+        encode = os.fsencode if binary else (lambda s: s)
+        matcher = cls(binary=binary)
+        matcher.num_rules = state["num_rules"]
+        for kind in LITERAL_KINDS:
+            for s in state["literals"][kind]:
+                matcher.add_literal(kind, encode(s))
+        matcher.progs = [ re.compile(encode(p)) for p in state["patterns"] ]
+        matcher.all_progs = None
+        matcher.all_patterns = [ encode(p) for p in state["all_patterns"] ]
+        return matcher
+
+    def for_bytes(self):
+        return RuleMatcher.from_state(self.to_state(), binary=True)
+
+    def matches(self, path):
+        if self.newline in path:
+            # Our regular expressions treat newlines specially (. does not match them,
+            # and $ matches just before a trailing one), so the indexes cannot be used
+            # to answer for this path
+            if self.all_progs is None:
+                self.all_progs = [ re.compile(p) for p in self.all_patterns ]
+            return any(p.match(path) for p in self.all_progs)
+        if self.extensions:
+            i = path.rfind(self.dot)
+            if i != -1 and path[i+1:] in self.extensions:
+                return True
+        if path in self.files:
+            return True
+        if self.subfile_trie or self.directory_trie or self.subdirectory_trie:
+            components = path.split(self.slash)
+            # The final component is the file name. All of the others are directories.
+            num_dirs = len(components) - 1
+            node = self.subfile_trie
+            for i in range(num_dirs, -1, -1):
+                node = node.get(components[i])
+                if node is None:
+                    break
+                elif None in node:
+                    return True
+            node = self.directory_trie
+            for i in range(num_dirs):
+                node = node.get(components[i])
+                if node is None:
+                    break
+                elif None in node:
+                    return True
+            if self.subdirectory_trie:
+                for start in range(num_dirs):
+                    node = self.subdirectory_trie
+                    for i in range(start, num_dirs):
+                        node = node.get(components[i])
+                        if node is None:
+                            break
+                        elif None in node:
+                            return True
+        return any(p.match(path) for p in self.progs)
+
+# Bump this if the format of cached rule sets changes
+CACHE_FORMAT_VERSION = 2
+
+def tool_version():
+    # Any change to this file may change how rules are compiled, so the tool version
+    # used in cache keys is a hash of its contents
+    with open(os.path.abspath(__file__), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def cache_key(configs_bytes):
+    h = hashlib.sha256()
+    h.update(("%d:%s" % (CACHE_FORMAT_VERSION, tool_version())).encode())
+    for b in configs_bytes:
+        # Prefix each config with its length, so that different splits of the same
+        # bytes between configs cannot produce the same key
+        h.update(b"%d:" % len(b))
+        h.update(b)
+    return h.hexdigest()
+
+def load_cached_rules(cache_dir, key):
+    # Returns the cached state, or None if there is no usable cache entry.
+    # Cache problems are never fatal -- at worst we parse the configs again.
+    try:
+        with open(os.path.join(cache_dir, key + ".json"), "rt") as f:
+            state = json.load(f)
+        if state["key"] != key:
+            return None
+        return state
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_cached_rules(cache_dir, key, state):
+    # Write to a temporary file and rename it into place, so that concurrent runs
+    # never see a partially written cache entry
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".%s." % key, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wt") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, os.path.join(cache_dir, key + ".json"))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+# Below this many paths, starting a pool of worker processes costs more than it saves
+DEFAULT_PARALLEL_THRESHOLD = 200000
+
+# How many paths are sent to a worker process at a time
+PARALLEL_CHUNK_SIZE = 20000
+
+# Maximum number of distinct directories whose verdicts are remembered
+DIR_VERDICT_CACHE_SIZE = 65536
+
+# The RuleMatchers which make up a FileFilter. The directory matchers contain the
+# rules for which is_directory_rule is True, and the file matchers contain the rest.
+MATCHER_NAMES = [ "include_dir_matcher", "include_file_matcher",
+                  "exclude_dir_matcher", "exclude_file_matcher" ]
+
+class FilterStats(object):
+    """
+    Statistics collected by FileFilter.filter_with_stats: the number of paths read and
+    emitted, and for each rule, the number of paths it was evaluated against, the
+    number it matched, and the total time spent matching them.
+    """
+    def __init__(self, rules):
+        self.paths_read = 0
+        self.paths_emitted = 0
+        # A [field name, rule string, evaluated, matched, seconds] list for each rule,
+        # in the order they appear in the fields of the configs
+        self.rule_stats = [ [k, s, 0, 0, 0.0] for (k, s) in rules ]
+
+    def to_dict(self):
+        return {
+            "paths_read": self.paths_read,
+            "paths_emitted": self.paths_emitted,
+            "rules": [ { "field": k, "rule": s, "evaluated": evaluated,
+                         "matched": matched, "seconds": seconds }
+                       for (k, s, evaluated, matched, seconds) in self.rule_stats ] }
+
+    def report_lines(self):
+        yield "Paths read: %d, paths emitted: %d" % (self.paths_read, self.paths_emitted)
+        yield "%10s %10s %10s  %s" % ("EVALUATED", "MATCHED", "SECONDS", "FIELD: RULE")
+        for (k, s, evaluated, matched, seconds) in self.rule_stats:
+            yield "%10d %10d %10.6f  %s: %s" % (evaluated, matched, seconds, k, s)
+
+class FileFilter(object):
+    """
+    A compiled set of include and exclude rules.
+
+    configs is a list whose elements are either paths to config files or
+    dicts with the same structure as a parsed config file. They are processed
+    in order, with fields in later configs overriding those in earlier ones.
+
+    If cache_dir is specified, the compiled rules are cached in that directory,
+    keyed by a hash of the contents of every config and of this tool. When there
+    is a cache hit, the configs are not parsed at all.
+
+    Directory rules depend only on the directory containing a path, so their verdicts
+    are computed once per distinct directory and remembered (up to
+    DIR_VERDICT_CACHE_SIZE directories). Only the file rules are evaluated for
+    every path.
+
+    Raises ConfigParseException if any config cannot be loaded or is invalid.
+    """
+    def __init__(self, configs, cache_dir=None):
+        configs_bytes = list()
+        for config in configs:
+            if isinstance(config, dict):
+                configs_bytes.append(json.dumps(config, sort_keys=True).encode())
+            else:
+                configs_bytes.append(read_config_file(config))
+
+        key = None
+        if cache_dir:
+            key = cache_key(configs_bytes)
+            state = load_cached_rules(cache_dir, key)
+            if state is not None:
+                self.binary = False
+                for name in MATCHER_NAMES:
+                    setattr(self, name, RuleMatcher.from_state(state[name]))
+                self.rules = [ tuple(r) for r in state["rules"] ]
+                self.reset_dir_verdicts()
+                return
+
+        # For each field, a list of (rule string, compiled program) tuples
+        self.field_rule_lists = { f: [] for f in valid_fields }
+        for config, config_bytes in zip(configs, configs_bytes):
+            if isinstance(config, dict):
+                self.parse_config(config, "<dict>")
+            else:
+                self.parse_config(load_config_data(config_bytes, config), config)
+
+        # Now build our include and exclude matchers
+        # Internally they are all converted to filepath patterns, although literal
+        # rules are also indexed so they can be checked without using the patterns
+        self.binary = False
+        for name in MATCHER_NAMES:
+            setattr(self, name, RuleMatcher())
+        # The (field name, rule string) of every rule, in order, for filter_with_stats
+        self.rules = list()
+        for (k, v) in self.field_rule_lists.items():
+            if "include_" in k:
+                side = "include"
+            elif "exclude_" in k:
+                side = "exclude"
+            else:
+                raise ConfigParseException("PROGRAMMING LOGIC ERROR: k = %s" % k)
+            for (s, prog) in v:
+                self.rules.append((k, s))
+                dir_file = "dir" if is_directory_rule(k, prog) else "file"
+                getattr(self, "%s_%s_matcher" % (side, dir_file)).add_rule(k, s, prog)
+        for name in MATCHER_NAMES:
+            getattr(self, name).compile()
+        self.reset_dir_verdicts()
+
+        if key is not None:
+            state = { name: getattr(self, name).to_state() for name in MATCHER_NAMES }
+            state["rules"] = [ list(r) for r in self.rules ]
+            state["key"] = key
+            save_cached_rules(cache_dir, key, state)
+
+    def parse_config(self, config_data, config_name):
+        if config_data is None:
+            # Empty config file
+            return
+        elif not isinstance(config_data, dict):
+            raise ConfigParseException(
+                "Config should be a dictionary but it is type %s" % type(config_data),
+                "Error parsing config file %s" % config_name)
+        for field_name in valid_fields:
+            try:
+                field_value = config_data[field_name]
+            except KeyError:
+                continue
+            try:
+                self.field_rule_lists[field_name] = parse_field(field_name, field_value)
+            except ConfigParseException as e:
+                raise ConfigParseException(*(e.args + ("Error parsing config file %s" % config_name,)))
+
+    def for_bytes(self):
+        """
+        Returns a copy of this filter which takes bytes paths (for example, as read
+        from the output of git ls-files -z) rather than str paths.
+        """
+        if self.binary:
+            return self
         try:
-            field_value = config_data[field_name]
-        except KeyError:
+            ff = copy.copy(self)
+            ff.binary = True
+            for name in MATCHER_NAMES:
+                setattr(ff, name, getattr(self, name).for_bytes())
+        except re.error as e:
+            # A pattern can be valid as str but not as bytes (for example, if it uses
+            # the (?u) flag)
+            raise ConfigParseException(str(e), "Rules cannot be used to match binary paths")
+        ff.reset_dir_verdicts()
+        return ff
+
+    def reset_dir_verdicts(self):
+        self.slash = self.include_file_matcher.slash
+        self.newline = self.include_file_matcher.newline
+        self.dir_verdict = functools.lru_cache(maxsize=DIR_VERDICT_CACHE_SIZE)(self.compute_dir_verdict)
+
+    def __getstate__(self):
+        # The verdict cache cannot be pickled (which is needed to send this filter to
+        # worker processes), so it is left out, and a new one is created on the other end
+        state = self.__dict__.copy()
+        del state["dir_verdict"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.reset_dir_verdicts()
+
+    def compute_dir_verdict(self, dirpath):
+        # Returns a tuple of whether our include and exclude directory rules match the
+        # specified directory. Directory rules are all of the form <pattern>/.*$ -- so
+        # if one of them matches the directory followed by a /, it matches every path
+        # inside the directory.
+        dirpath += self.slash
+        return (self.include_dir_matcher.matches(dirpath),
+                self.exclude_dir_matcher.matches(dirpath))
+
+    @property
+    def has_include_rules(self):
+        return len(self.include_dir_matcher) > 0 or len(self.include_file_matcher) > 0
+
+    def matches(self, path):
+        """
+        Returns True if the path meets at least one of our include criteria and
+        none of our exclude criteria.
+        """
+        if self.newline in path:
+            # The equivalence that lets us judge the directory on its own does not hold
+            # when the file name contains a newline, since .* does not match it
+            included = self.include_dir_matcher.matches(path)
+            excluded = self.exclude_dir_matcher.matches(path)
+        else:
+            i = path.rfind(self.slash)
+            if i == -1:
+                # Directory rules only match paths with at least one directory
+                included, excluded = False, False
+            else:
+                included, excluded = self.dir_verdict(path[:i])
+        if excluded:
+            return False
+        if not included and not self.include_file_matcher.matches(path):
+            return False
+        return not self.exclude_file_matcher.matches(path)
+
+    def filter(self, paths):
+        """
+        Generator yielding the paths from the specified iterable which make it through
+        the filter, in their original order.
+        """
+        matches = self.matches
+        for path in paths:
+            if matches(path):
+                yield path
+
+    def filter_with_stats(self, paths, stats):
+        """
+        Same as filter, except that the rules are evaluated one at a time, recording in
+        stats (a FilterStats for our rules) how many paths each rule is evaluated
+        against and matches, and how long it takes. Every include rule is evaluated
+        against every path, and every exclude rule against every path that is included,
+        so that the counts do not depend on the order of the rules. This is much slower
+        than filter, and is intended for profiling configs.
+        """
+        if self.binary:
+            compile_rule = lambda k, s: re.compile(os.fsencode(get_reprog(k, s).pattern))
+        else:
+            compile_rule = get_reprog
+        include_rules, exclude_rules = list(), list()
+        for entry, (k, s) in zip(stats.rule_stats, self.rules):
+            rules = include_rules if "include_" in k else exclude_rules
+            rules.append((entry, compile_rule(k, s).match))
+        perf_counter = time.perf_counter
+
+        def evaluate(rules, path):
+            # Returns True if any of the rules match, without short-circuiting
+            matched = False
+            for (entry, match) in rules:
+                start = perf_counter()
+                m = match(path)
+                entry[4] += perf_counter() - start
+                entry[2] += 1
+                if m:
+                    entry[3] += 1
+                    matched = True
+            return matched
+
+        for path in paths:
+            stats.paths_read += 1
+            if not evaluate(include_rules, path) or evaluate(exclude_rules, path):
+                continue
+            stats.paths_emitted += 1
+            yield path
+
+    def directory_excluded(self, dirpath):
+        """
+        Returns True if the specified directory matches one of our exclude_directories,
+        exclude_subdirectories, exclude_dirname_patterns, or exclude_dirpath_patterns
+        rules, meaning that every file inside of it will be excluded.
+        """
+        return self.dir_verdict(dirpath)[1]
+
+    def walk(self, top=".", git_tracked=False):
+        """
+        Generator yielding the files inside top (with paths relative to top) which make
+        it through the filter. Directories which match one of our directory exclude
+        rules are pruned as soon as they are reached, so nothing inside of them is
+        ever enumerated.
+
+        If git_tracked is True, the files are those in the index of the git repository
+        containing top (like git ls-files), rather than those in the file system.
+        Otherwise .git directories are always skipped.
+
+        Paths are str, unless this is a binary filter (see for_bytes), in which case
+        they are bytes.
+        """
+        if git_tracked:
+            ff = self.for_bytes()
+            for path in walk_git_index(top, ff.directory_excluded):
+                if ff.matches(path):
+                    yield path if self.binary else os.fsdecode(path)
+        else:
+            top = os.fsencode(top) if self.binary else os.fsdecode(top)
+            for path in walk_file_system(top, self.directory_excluded):
+                if self.matches(path):
+                    yield path
+
+    def parallel_filter(self, paths, jobs, threshold=DEFAULT_PARALLEL_THRESHOLD):
+        """
+        Same as filter, except that paths must be a list, which (if it has at least
+        threshold elements) is split into chunks that are filtered by a pool of jobs
+        worker processes. The output is still in the original order.
+        """
+        if jobs <= 1 or len(paths) < threshold:
+            for path in self.filter(paths):
+                yield path
+            return
+        chunks = [ paths[i:i+PARALLEL_CHUNK_SIZE] for i in range(0, len(paths), PARALLEL_CHUNK_SIZE) ]
+        # The compiled filter is sent to each worker once, when it starts
+        with multiprocessing.Pool(jobs, initializer=init_filter_worker, initargs=(self,)) as pool:
+            for chunk_matches in pool.imap(filter_worker_chunk, chunks):
+                for path in chunk_matches:
+                    yield path
+
+# Profile names are also used as file names, by --profile-output-dir
+PROFILE_NAME_RE = re.compile("^[A-Za-z0-9_][A-Za-z0-9_.-]*$")
+
+class FilterProfiles(object):
+    """
+    A set of named FileFilters (profiles), applied together so that a list of paths
+    only needs to be read (or a directory walked) once to find the paths that make it
+    through each of them.
+
+    profiles is a list of (name, configs) tuples, where configs is as for FileFilter.
+    cache_dir is passed to each FileFilter.
+
+    Raises ConfigParseException if a profile name is invalid or repeated, or if any
+    of the configs cannot be loaded or are invalid.
+    """
+    def __init__(self, profiles, cache_dir=None):
+        self.binary = False
+        self.names = list()
+        self.filters = list()
+        for (name, configs) in profiles:
+            if not PROFILE_NAME_RE.match(name):
+                raise ConfigParseException("Invalid profile name: %s" % name)
+            elif name in self.names:
+                raise ConfigParseException("Profile name specified more than once: %s" % name)
+            try:
+                ff = FileFilter(configs, cache_dir=cache_dir)
+            except ConfigParseException as e:
+                raise ConfigParseException(*(e.args + ("Error loading profile %s" % name,)))
+            self.names.append(name)
+            self.filters.append(ff)
+
+    def for_bytes(self):
+        """
+        Returns a copy of these profiles which take bytes paths rather than str paths.
+        """
+        if self.binary:
+            return self
+        fp = copy.copy(self)
+        fp.binary = True
+        fp.filters = [ ff.for_bytes() for ff in self.filters ]
+        return fp
+
+    def matching_profiles(self, path):
+        """
+        Returns a list of the names of the profiles which the path makes it through.
+        """
+        return [ name for (name, ff) in zip(self.names, self.filters) if ff.matches(path) ]
+
+    def filter(self, paths):
+        """
+        Generator yielding a (path, profile names) tuple for each path from the
+        specified iterable which makes it through at least one of the profiles, in
+        their original order.
+        """
+        matching_profiles = self.matching_profiles
+        for path in paths:
+            names = matching_profiles(path)
+            if names:
+                yield (path, names)
+
+    def directory_excluded(self, dirpath):
+        """
+        Returns True if no file inside the specified directory can make it through any
+        of the profiles (because each of them either has no include rules, or excludes
+        the directory).
+        """
+        return all(ff.directory_excluded(dirpath) for ff in self.filters if ff.has_include_rules)
+
+    def walk(self, top=".", git_tracked=False):
+        """
+        Same as FileFilter.walk, except that it yields a (path, profile names) tuple for
+        each file which makes it through at least one of the profiles, and only prunes
+        directories which are excluded by all of them.
+        """
+        if git_tracked:
+            fp = self.for_bytes()
+            for path in walk_git_index(top, fp.directory_excluded):
+                names = fp.matching_profiles(path)
+                if names:
+                    yield (path if self.binary else os.fsdecode(path), names)
+        else:
+            top = os.fsencode(top) if self.binary else os.fsdecode(top)
+            for path in walk_file_system(top, self.directory_excluded):
+                names = self.matching_profiles(path)
+                if names:
+                    yield (path, names)
+
+def walk_file_system(top, directory_excluded):
+    # Generator yielding the paths (relative to top, and of the same type as top) of the
+    # files inside top, skipping .git directories and any directory for which
+    # directory_excluded returns True
+    binary = isinstance(top, bytes)
+    slash = b"/" if binary else "/"
+    git_dir = b".git" if binary else ".git"
+    top_len = len(os.path.join(top, top[:0]))
+    for dirpath, dirnames, filenames in os.walk(top):
+        # Path of this directory relative to top, with a trailing / unless it is top
+        reldir = dirpath[top_len:]
+        if reldir:
+            reldir += slash
+        # Prune excluded directories in place, so os.walk does not descend into them
+        dirnames[:] = sorted(d for d in dirnames
+                             if d != git_dir and not directory_excluded(reldir + d))
+        for f in sorted(filenames):
+            yield reldir + f
+
+def walk_git_index(top, directory_excluded):
+    # Generator yielding the bytes paths of the files in the index of the git repository
+    # containing top (like git ls-files), skipping the contents of any directory for
+    # which directory_excluded (which is passed bytes) returns True.
+    #
+    # The index is sorted by the bytes of each path, so the contents of each directory
+    # are contiguous in it. We work in bytes so that this ordering holds exactly, which
+    # means an excluded directory can be skipped with a single binary search.
+    output = subprocess.check_output([ "git", "ls-files", "-z" ], cwd=top)
+    paths = output.split(b"\0")
+    if paths[-1] == b"":
+        del paths[-1]
+    i = 0
+    while i < len(paths):
+        path = paths[i]
+        # Find the outermost excluded directory containing this path, if any
+        pruned = None
+        j = path.find(b"/")
+        while j != -1:
+            if directory_excluded(path[:j]):
+                pruned = path[:j]
+                break
+            j = path.find(b"/", j+1)
+        if pruned is not None:
+            # Skip to the first path after everything in this directory.
+            # 0 is the character immediately after / in ASCII.
+            i = bisect.bisect_left(paths, pruned + b"0", i)
             continue
+        yield path
+        i += 1
+
+# The FileFilter used by this worker process
+worker_filter = None
+
+def init_filter_worker(ff):
+    global worker_filter
+    worker_filter = ff
+
+def filter_worker_chunk(paths):
+    return list(worker_filter.filter(paths))
+
+def filter_null_delimited(ff, jobs, threshold):
+    # Read all of stdin as a single buffer of NUL-terminated paths, filter them as bytes
+    # (so nothing is decoded, and paths may contain any characters, including newlines),
+    # and write the results in a single write
+    try:
+        ff = ff.for_bytes()
+    except ConfigParseException as e:
+        err_exit(*e.args)
+    paths = sys.stdin.buffer.read().split(b"\0")
+    if paths[-1] == b"":
+        # The final path is terminated by a NUL, rather than separated from another path
+        del paths[-1]
+    matches = list(ff.parallel_filter(paths, jobs, threshold))
+    if matches:
+        matches.append(b"")
+        sys.stdout.buffer.write(b"\0".join(matches))
+    sys.stdout.buffer.flush()
+
+def filter_and_report_stats(ff, null_delimited, stats_file):
+    # Filter stdin one rule at a time, then report how each rule fared, either to
+    # stderr or (as JSON) to stats_file
+    if null_delimited:
         try:
-            parse_field(config_data, field_name, field_value)
+            ff = ff.for_bytes()
         except ConfigParseException as e:
-            err_exit(
-                str(e),
-                "Error parsing config file %s" % config_file)
-
-# Now build our include and exclude patterns
-# Internally they are all converted to filepath patterns
-
-include_progs = list()
-exclude_progs = list()
-for (k, v) in field_prog_lists.items():
-    if "include_" in k:
-        include_progs.extend(v)
-    elif "exclude_" in k:
-        exclude_progs.extend(v)
+            err_exit(*e.args)
+        paths = sys.stdin.buffer.read().split(b"\0")
+        if paths[-1] == b"":
+            del paths[-1]
+    else:
+        paths = ( line.rstrip() for line in sys.stdin )
+    stats = FilterStats(ff.rules)
+    if null_delimited:
+        for path in ff.filter_with_stats(paths, stats):
+            sys.stdout.buffer.write(path + b"\0")
     else:
-        err_exit("PROGRAMMING LOGIC ERROR: k = %s" % k)
-
-if not include_progs:
-    print_err("No include patterns specified, so no files will be included for processing")
-    sys.exit(0)
-
-for line in sys.stdin:
-    line = line.rstrip()
-    if not any(p.match(line) for p in include_progs):
-        # This meets none of our include criteria, so skip it
-        continue
-    if any(p.match(line) for p in exclude_progs):
-        # This meets at least one of our exclude criteria, so skip it
-        continue
-    # Meets at least one include criterion and none of our exclude criteria,
-    # so print it
-    print(line)
-
-sys.exit(0)
+        for path in ff.filter_with_stats(paths, stats):
+            print(path)
+    sys.stdout.flush()
+    if stats_file is None:
+        for line in stats.report_lines():
+            print("file_filter.py: STATS: " + line, file=sys.stderr)
+        return
+    try:
+        with open(stats_file, "wt") as f:
+            json.dump(stats.to_dict(), f, indent=2)
+            f.write("\n")
+    except OSError as e:
+        err_exit("Error writing stats file %s: %s" % (stats_file, e))
+
+def walk_and_print(ff, top, git_tracked, null_delimited):
+    if not os.path.isdir(top):
+        err_exit("Not a directory: %s" % top)
+    if null_delimited:
+        try:
+            ff = ff.for_bytes()
+        except ConfigParseException as e:
+            err_exit(*e.args)
+    try:
+        if null_delimited:
+            for path in ff.walk(top, git_tracked):
+                sys.stdout.buffer.write(path + b"\0")
+        else:
+            for path in ff.walk(top, git_tracked):
+                print(path)
+    except subprocess.CalledProcessError as e:
+        err_exit("Command failed with rc %d: %s" % (e.returncode, " ".join(e.cmd)))
+    except OSError as e:
+        err_exit(str(e))
+    sys.stdout.flush()
+
+def filter_profiles(params):
+    # Filter the paths (from stdin, or by walking a directory) through every profile in
+    # a single pass. Each path which makes it through at least one profile is either
+    # printed with a comma-separated list of those profiles and a tab in front of it, or
+    # (if there is an output directory) written to a file named for each profile.
+    null_delimited = params["null_delimited"]
+    try:
+        fp = FilterProfiles(params["profiles"], cache_dir=params["cache_dir"])
+        if null_delimited:
+            fp = fp.for_bytes()
+    except ConfigParseException as e:
+        err_exit(*e.args)
+
+    for (name, ff) in zip(fp.names, fp.filters):
+        if not ff.has_include_rules:
+            print_err("No include patterns specified for profile %s, so no files will be included in it" % name)
+
+    if params["walk"] is not None:
+        if not os.path.isdir(params["walk"]):
+            err_exit("Not a directory: %s" % params["walk"])
+        tagged_paths = fp.walk(params["walk"], params["git_tracked"])
+    elif null_delimited:
+        paths = sys.stdin.buffer.read().split(b"\0")
+        if paths[-1] == b"":
+            del paths[-1]
+        tagged_paths = fp.filter(paths)
+    else:
+        tagged_paths = fp.filter(line.rstrip() for line in sys.stdin)
+
+    output_dir = params["profile_output_dir"]
+    try:
+        if output_dir is None:
+            if null_delimited:
+                for (path, names) in tagged_paths:
+                    sys.stdout.buffer.write(",".join(names).encode() + b"\t" + path + b"\0")
+            else:
+                for (path, names) in tagged_paths:
+                    print("%s\t%s" % (",".join(names), path))
+            sys.stdout.flush()
+            return
+        os.makedirs(output_dir, exist_ok=True)
+        mode, terminator = ("wb", b"\0") if null_delimited else ("wt", "\n")
+        files = dict()
+        try:
+            for name in fp.names:
+                files[name] = open(os.path.join(output_dir, name), mode)
+            for (path, names) in tagged_paths:
+                for name in names:
+                    files[name].write(path + terminator)
+        finally:
+            for f in files.values():
+                f.close()
+    except subprocess.CalledProcessError as e:
+        err_exit("Command failed with rc %d: %s" % (e.returncode, " ".join(e.cmd)))
+    except OSError as e:
+        err_exit(str(e))
+
+def validate_nonnegative_int(flag, n):
+    try:
+        i = int(n)
+    except ValueError:
+        err_exit("%s argument must be an integer. Invalid: %s" % (flag, n))
+    if i < 0:
+        err_exit("%s argument must be a nonnegative integer. Invalid: %d" % (flag, i))
+    return i
+
+def parse_parameters(args):
+    params = {
+        "cache_dir": os.environ.get("FILE_FILTER_CACHE_DIR") or None,
+        "null_delimited": False,
+        "jobs": 1,
+        "parallel_threshold": DEFAULT_PARALLEL_THRESHOLD,
+        "walk": None,
+        "git_tracked": False,
+        "stats": False,
+        "stats_file": None,
+        "profiles": list(),
+        "profile_output_dir": None,
+        "config_files": list() }
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if arg in { "--cache-dir", "--jobs", "--parallel-threshold", "--profile",
+                    "--profile-output-dir", "--stats-file", "--walk" }:
+            try:
+                flag_arg = args[i]
+            except IndexError:
+                err_exit("%s flag requires an argument" % arg)
+            i += 1
+            if not flag_arg:
+                err_exit("%s flag cannot have a blank argument" % arg)
+            elif arg == "--cache-dir":
+                params["cache_dir"] = flag_arg
+            elif arg == "--walk":
+                params["walk"] = flag_arg
+            elif arg == "--profile":
+                name, sep, configs = flag_arg.partition("=")
+                config_files = configs.split(":")
+                if not name or not sep or not all(config_files):
+                    err_exit("%s argument must be of the form <name>=<config-file>[:<config-file>...]. Invalid: %s" % (arg, flag_arg))
+                params["profiles"].append((name, config_files))
+            elif arg == "--profile-output-dir":
+                params["profile_output_dir"] = flag_arg
+            elif arg == "--stats-file":
+                params["stats"] = True
+                params["stats_file"] = flag_arg
+            elif arg == "--jobs":
+                # 0 means to use one job per CPU
+                params["jobs"] = validate_nonnegative_int(arg, flag_arg) or os.cpu_count() or 1
+            else:
+                params["parallel_threshold"] = validate_nonnegative_int(arg, flag_arg)
+        elif arg == "-z":
+            params["null_delimited"] = True
+        elif arg == "--git-tracked":
+            params["git_tracked"] = True
+        elif arg == "--stats":
+            params["stats"] = True
+        else:
+            params["config_files"].append(arg)
+    if params["profiles"]:
+        if params["config_files"]:
+            err_exit("Config files may not be specified as arguments when --profile is specified")
+        elif params["stats"]:
+            err_exit("--stats may not be specified with --profile")
+        elif params["jobs"] > 1:
+            err_exit("--jobs may not be specified with --profile")
+    elif params["profile_output_dir"] is not None:
+        err_exit("--profile-output-dir may only be specified with --profile")
+    elif not params["config_files"]:
+        err_exit("At least one config file must be specified")
+    elif params["git_tracked"] and params["walk"] is None:
+        err_exit("--git-tracked may only be specified with --walk")
+    elif params["stats"] and params["walk"] is not None:
+        err_exit("--stats may not be specified with --walk")
+    elif params["stats"] and params["jobs"] > 1:
+        err_exit("--stats may not be specified with --jobs")
+    return params
+
+def main(args):
+    params = parse_parameters(args)
+
+    if params["profiles"]:
+        filter_profiles(params)
+        return 0
+
+    try:
+        ff = FileFilter(params["config_files"], cache_dir=params["cache_dir"])
+    except ConfigParseException as e:
+        err_exit(*e.args)
+
+    if not ff.has_include_rules:
+        print_err("No include patterns specified, so no files will be included for processing")
+        return 0
+
+    if params["stats"]:
+        filter_and_report_stats(ff, params["null_delimited"], params["stats_file"])
+        return 0
+
+    if params["walk"] is not None:
+        walk_and_print(ff, params["walk"], params["git_tracked"], params["null_delimited"])
+        return 0
+
+    jobs = params["jobs"]
+    threshold = params["parallel_threshold"]
+    if params["null_delimited"]:
+        filter_null_delimited(ff, jobs, threshold)
+        return 0
+
+    # Print any line which meets at least one of our include criteria and
+    # none of our exclude criteria
+    if jobs <= 1:
+        for line in ff.filter(line.rstrip() for line in sys.stdin):
+            print(line)
+    else:
+        # All of the input is needed up front, so that it can be split up
+        lines = [ line.rstrip() for line in sys.stdin ]
+        for line in ff.parallel_filter(lines, jobs, threshold):
+            print(line)
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except YamlUnavailableException as e:
+        print("file_filter.py: %s" % e, file=sys.stderr)
+        sys.exit(YAML_UNAVAILABLE_RC)
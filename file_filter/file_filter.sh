@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -79,9 +79,17 @@ FF_PY_NAME=file_filter.py
 FF_PY_PATH="${MYDIR_PATH}/${FF_PY_NAME}"
 [ -f "${FF_PY_PATH}" ] || err_exit "${FF_PY_NAME} not found in directory ${MYDIR_PATH}"
 
-# Test to see if yaml module is available
-. "${CMS_META_TOOLS_PATH}/utils/pyyaml.sh"
+# The yaml module is only needed if the compiled rules are not cached, so rather than checking
+# for it up front, file_filter.py exits with rc 3 (before reading any input) if it needs the
+# module but cannot import it. Any modules which pyyaml.sh installed earlier are used.
+export PYTHONPATH="${PYTHONPATH}:${CMS_META_TOOLS_PATH}/pymods"
 
 # Now call file_filter located in this directory, with same arguments this script was passed
 "${MYDIR_PATH}"/file_filter.py "$@"
+rc=$?
+[ $rc -eq 3 ] || exit $rc
+
+# Install the yaml module, and try again
+. "${CMS_META_TOOLS_PATH}/utils/pyyaml.sh"
+"${MYDIR_PATH}"/file_filter.py "$@"
 exit $?
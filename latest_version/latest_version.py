@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -23,10 +23,14 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 #
 # Usage: latest_version.py [--type image_type] [--nonstandard-versions-okay]
-#                          [[--major major# [--minor minor#]]
-#                          --file input_file --image image_name {--docker | --helm}
+#                          [[--major major# [--minor minor#]] [--top k]
+#                          [--constraint constraint] [--no-prereleases]
+#                          {--file input_file | --index index_file}
+#                          --image image_name {--docker | --helm | --python}
+#    or: latest_version.py --batch batch_file
+#    or: latest_version.py --build-index index_file --file input_file {--docker | --helm}
 #
-# Parse the input_file (json file if docker, yaml if helm)
+# Parse the input_file (json file if docker, yaml if helm, PEP 503 simple index HTML page if python)
 # Find all versions of the specified image, filtering for major and minor number if specified
 
 # image_type is used to filter stable vs unstable on algol60
@@ -37,19 +41,59 @@
 # filtered to make sure they match the format described in update_versions.sh (essentially SemVer 2.0,
 # with a minor exception)
 
+# For python, the versions are those of the wheel and sdist files of the module (the image
+# name), compared according to PEP 440, and the major and minor numbers are those of the
+# release. If --nonstandard-versions-okay is not specified, only x.y.z releases and x.y.z.postN
+# post-releases are used (as pip only uses pre-releases and dev releases if asked to).
+# --index and --build-index do not support python.
+
+# With --constraint, only versions satisfying the constraint (such as ">=1.4.2 <2.0.0", "~1.3",
+# or "^2"; see "Version constraints" below) are used, and with --no-prereleases, pre-release
+# versions are not used. Neither is supported for python or with --index.
+
+# The versions are streamed through these filters, keeping track of only the latest
+# version so far, so the list of versions is never copied or sorted. If NumPy is installed,
+# very large lists of versions are instead ranked all at once (see "Column-wise ranking").
+
+# With --batch, each line of batch_file is a request with its own input file, image, and
+# filters (see read_batch_file for the format), and the results are written to the output
+# file of each request. Each input file is parsed only once, however many requests use it.
+# A request may have several input files (the same index, fetched from several mirrors), in
+# which case the latest versions among all of them are found.
+
+# With --build-index, the input_file is converted into an index_file (see "Version index"
+# below), and nothing is printed. A later query can then use --index index_file in place of
+# --file input_file, to find the same versions without parsing the input file.
+
+# The parsing and comparison logic can also be imported (as it is by version_resolver.py,
+# which keeps parsed files in memory to answer many queries); VersionSource holds the parsed
+# contents of input files.
+
 # Print the version string of the latest version and exit code 0
+# If --top is specified, print the version strings of the latest k versions instead,
+# one per line, latest first (or all of the versions, if there are fewer than k)
 # Print error message and exit code 1 if there is a problem with any of the above
 
-import functools
+import collections
+import gc
+import heapq
+import html.parser
+import itertools
+import json
+import os
 import re
 import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
 
 # Version regular expression patterns
 
 NUM_PATTERN="0|[1-9][0-9]*"
 
 # The basic pattern is 3 nonnegative integers without leading 0s, separated by dots
-BASE_VPATTERN="(?:{NUM})[.](?:{NUM})[.](?:{NUM})".format(NUM=NUM_PATTERN)
+BASE_VPATTERN="(?P<major>{NUM})[.](?P<minor>{NUM})[.](?P<patch>{NUM})".format(NUM=NUM_PATTERN)
 
 # A pre-release identifier is any of the following:
 # - Any string of 1 or more digits with no leading 0s
@@ -69,7 +113,8 @@ BMD_PATTERN="{BID}(?:[.]{BID})*".format(BID=BID_PATTERN)
 # The full version string must begin with the base pattern
 # After that is an optional hyphen and pre-release version
 # After those is an optional plus (or underscore) and build-metadata
-VPATTERN_PREFORMAT=BASE_VPATTERN + "(?:-{PRV})?" + "(?:[+_]{BMD})?"
+# Each part is captured in a named group, so matching a version string also parses it
+VPATTERN_PREFORMAT=BASE_VPATTERN + "(?:-(?P<prerelease>{PRV}))?" + "(?:[+_](?P<build>{BMD}))?"
 VPATTERN = VPATTERN_PREFORMAT.format(PRV=PRV_PATTERN, BMD=BMD_PATTERN)
 
 SEMVER_REGEX = re.compile(VPATTERN)
@@ -77,6 +122,9 @@ SEMVER_REGEX = re.compile(VPATTERN)
 def print_err(s):
     print("latest_version.py: ERROR: " + s, file=sys.stderr)
 
+def print_info(s):
+    print("latest_version.py: " + s, file=sys.stderr)
+
 def print_warn(s):
     print("latest_version.py: WARNING: " + s, file=sys.stderr)
 
@@ -85,6 +133,15 @@ def err_exit(*msgs):
         print_err(m)
     sys.exit(1)
 
+def validate_top(n):
+    try:
+        i = int(n)
+    except ValueError:
+        err_exit("--top argument must be an integer. Invalid: %s" % n)
+    if i < 1:
+        err_exit("--top argument must be a positive integer. Invalid: %d" % i)
+    return i
+
 def validate_majorminor(n):
     try:
         i = int(n)
@@ -94,16 +151,29 @@ def validate_majorminor(n):
         err_exit("Major/minor numbers must be nonnegative integers. Invalid: %d" % i)
     return i
 
+def validate_constraint(text, prereleases):
+    try:
+        return VersionConstraint(text, prereleases)
+    except ValueError as e:
+        err_exit("Invalid constraint %s: %s" % (text, e))
+
 def parse_parameters():
     argument_to_parameter_map = {
         "--nonstandard-versions-okay": "no_version_format_filter",
         "--type": "image_type",
         "--major": "major",
         "--minor": "minor",
+        "--top": "top",
+        "--constraint": "constraint",
+        "--no-prereleases": "no_prereleases",
         "--file": "input_file",
         "--image": "image_name",
         "--docker": "docker_helm",
-        "--helm": "docker_helm" }
+        "--helm": "docker_helm",
+        "--python": "docker_helm",
+        "--batch": "batch_file",
+        "--build-index": "build_index",
+        "--index": "index_file" }
     params = { pname: None for pname in argument_to_parameter_map.values() }
     cmd_line_args = sys.argv[1:]
     i=0
@@ -116,11 +186,11 @@ def parse_parameters():
             err_exit("Unrecognized flag: " + arg)
         if params[param_name] != None:
             err_exit("Duplicate or conflicting flag: " + arg)
-        elif arg in { "--docker", "--helm" }:
+        elif arg in { "--docker", "--helm", "--python" }:
             # Just strip off the leading --
             params[param_name] = arg[2:]
             continue
-        elif arg == "--nonstandard-versions-okay":
+        elif arg in { "--nonstandard-versions-okay", "--no-prereleases" }:
             params[param_name] = True
             continue
         try:
@@ -130,20 +200,46 @@ def parse_parameters():
         i+=1
         if arg in { "--major", "--minor" }:
             params[param_name] = validate_majorminor(flag_arg)
+        elif arg == "--top":
+            params[param_name] = validate_top(flag_arg)
         elif not flag_arg:
             err_exit("%s flag cannot have a blank argument" % arg)
         else:
             params[param_name] = flag_arg
 
     # Finally, make sure we got required arguments
+    if params["batch_file"] != None:
+        if any(params[pname] != None for pname in params if pname != "batch_file"):
+            err_exit("--batch may not be specified with any other flags")
+        return params
+    elif params["build_index"] != None:
+        if any(params[pname] != None for pname in params if pname not in { "build_index", "input_file", "docker_helm" }):
+            err_exit("--build-index may only be specified with --file and --docker or --helm")
+        elif params["input_file"] == None:
+            err_exit("Input file must be specified")
+        elif params["docker_helm"] not in { "docker", "helm" }:
+            err_exit("--docker or --helm must be specified")
+        return params
     if params["minor"] != None and params["major"] == None:
         err_exit("A minor number may not be specified without a major number")
-    elif params["input_file"] == None:
-        err_exit("Input file must be specified")
+    elif params["input_file"] != None and params["index_file"] != None:
+        err_exit("--file and --index are mutually exclusive")
+    elif params["input_file"] == None and params["index_file"] == None:
+        err_exit("Input file or index file must be specified")
+    elif params["index_file"] != None and params["image_type"] != None and "/" in params["image_type"]:
+        err_exit("Image type may not contain / when --index is specified")
     elif params["image_name"] == None:
         err_exit("Image name must be specified")
     elif params["docker_helm"] == None:
-        err_exit("--docker or --helm must be specified")
+        err_exit("--docker, --helm, or --python must be specified")
+    elif params["docker_helm"] == "python" and params["index_file"] != None:
+        err_exit("--index may not be specified with --python")
+    elif params["constraint"] != None or params["no_prereleases"] != None:
+        if params["docker_helm"] == "python":
+            err_exit("--constraint and --no-prereleases may not be specified with --python")
+        elif params["index_file"] != None:
+            err_exit("--constraint and --no-prereleases may not be specified with --index")
+        params["constraint"] = validate_constraint(params["constraint"], params["no_prereleases"] != True)
     return params
 
 def is_int(s):
@@ -153,31 +249,6 @@ def is_int(s):
     except ValueError:
         return False
 
-def compare_identifiers(a, b):
-    if is_int(a) and is_int(b):
-        i = int(a)
-        j = int(b)
-        if i > j:
-            return 1
-        elif j > i:
-            return -1
-        else:
-            return 0
-    elif is_int(a):
-        # a is an int, b is not
-        # so semver says that b > a
-        return -1
-    elif is_int(b):
-        # the reverse, so a > b
-        return 1
-    # Neither a nor b are ints, so just go by ASCII order
-    if a > b:
-        return 1
-    elif b > a:
-        return -1
-    else:
-        return 0
-
 def remove_build(s):
     # The build metadata string may be separated using either an underscore or a plus
     try:
@@ -197,137 +268,1401 @@ def get_version_and_prerelease(s):
     except ValueError:
         return s, None
 
-def compare_versions(a, b, prStripped=False):
-    # First, strip away build metadata, as this is to be ignored when doing comparisons
-    a = remove_build(a)
-    b = remove_build(b)
-    if not prStripped:
-        aVersion, aPrerelease = get_version_and_prerelease(a)
-        bVersion, bPrerelease = get_version_and_prerelease(b)
+# Sort keys
+#
+# The sort key of a version is a tuple of (version identifier keys, pre-release key).
+# Each identifier key is (0, number) for a numeric identifier and (1, string) for any
+# other identifier, because numeric identifiers have lower precedence than alphanumeric
+# ones. The pre-release key is (1,) for a version with no pre-release version (since
+# that has higher precedence than any pre-release of the same version), and otherwise
+# (0, key), where key is a sort key of the same shape for the pre-release version.
+# Build metadata is ignored.
+
+NO_PRERELEASE_KEY = (1,)
+
+def identifier_key(s):
+    return (0, int(s)) if is_int(s) else (1, s)
+
+def semver_key(match):
+    # Returns the sort key for a version string which matched SEMVER_REGEX. Its parts
+    # have already been validated, so the key follows SemVer 2.0 precedence exactly: the
+    # pre-release identifiers are split on periods only (never on hyphens), and an
+    # identifier is numeric only if it consists entirely of digits.
+    base_key = tuple((0, int(match.group(g))) for g in ("major", "minor", "patch"))
+    prerelease = match.group("prerelease")
+    if prerelease is None:
+        return (base_key, NO_PRERELEASE_KEY)
+    prerelease_key = tuple((0, int(s)) if s.isdigit() else (1, s) for s in prerelease.split('.'))
+    return (base_key, (0, (prerelease_key, NO_PRERELEASE_KEY)))
+
+def nonstandard_key(s):
+    # Returns the sort key for a version string which did not match SEMVER_REGEX. This
+    # uses the same rules that were used before version strings were validated: the
+    # build metadata starts at the first + (or if there is none, the first _), the
+    # pre-release version starts at the first hyphen (and is itself split the same way),
+    # and any identifier which Python can convert to an int is treated as numeric.
+    s = remove_build(s)
+    version, prerelease = get_version_and_prerelease(s)
+    version_key = tuple(identifier_key(i) for i in version.split('.'))
+    if prerelease is None:
+        return (version_key, NO_PRERELEASE_KEY)
+    return (version_key, (0, nonstandard_key(prerelease)))
+
+class Version(object):
+    """
+    A version string, parsed once. standard is True if the string matches SEMVER_REGEX,
+    and key is a tuple which sorts versions in order of precedence.
+    """
+    __slots__ = ("string", "standard", "key")
+
+    def __init__(self, s):
+        self.string = s
+        match = SEMVER_REGEX.fullmatch(s)
+        self.standard = match is not None
+        self.key = semver_key(match) if self.standard else nonstandard_key(s)
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __repr__(self):
+        return "Version(%r)" % self.string
+
+    @staticmethod
+    def prefix_matcher(version_prefix):
+        # Returns a function which tells whether a version matches the prefix.
+        # There are a few cases to consider:
+        # 1) The version string is exactly equal to our version prefix
+        # 2) The version string starts with our prefix followed by a period, because
+        #    there are additional version fields
+        # 3) The version string starts with our prefix followed by a dash, indicating
+        #    a prerelease id
+        # 4) The version string starts with our prefix followed by a plus, indicating
+        #    a build id
+        #
+        # So filter for only versions which meet one of the above criteria
+        version_prefixes = tuple( version_prefix + c
+                                  for c in [ ".", "-", "+" ] )
+        return lambda v: v.string == version_prefix or v.string.startswith(version_prefixes)
+
+# Python package versions
+#
+# The versions of a Python package are ordered according to PEP 440, which differs from
+# SemVer: for example, 1.0.dev1 < 1.0a1 < 1.0 < 1.0.post1, and 1.0 == 1.0.0. The sort key
+# follows the same rules as the packaging library: (epoch, release without trailing zeros,
+# pre-release, post-release, dev release, local version), where each optional part is a
+# tuple whose first element places a missing part before or after any present one.
+
+PEP440_PATTERN = r"""
+    v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:[.][0-9]+)*)
+    (?:[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?P<post>(?:-(?P<post_n1>[0-9]+))|(?:[-_.]?(?:post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?))?
+    (?P<dev>[-_.]?dev[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:[+](?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+"""
+
+PEP440_REGEX = re.compile(PEP440_PATTERN, re.VERBOSE | re.IGNORECASE)
+
+# The only versions used by default are final x.y.z releases and their x.y.z.postN
+# post-releases, which pip also chooses by default (unlike pre-releases and dev releases)
+PYTHON_STANDARD_REGEX = re.compile("[0-9]+[.][0-9]+[.][0-9]+(?:[.]post[0-9]+)?")
+
+PRE_RELEASE_LABELS = { "alpha": "a", "beta": "b", "c": "rc", "pre": "rc", "preview": "rc" }
+
+def pep440_key(match):
+    # Returns the sort key for a version string which matched PEP440_REGEX
+    epoch = int(match.group("epoch") or 0)
+    release = tuple(int(n) for n in match.group("release").split("."))
+    while release and release[-1] == 0:
+        release = release[:-1]
+    pre_label = match.group("pre_l")
+    if pre_label != None:
+        pre_label = pre_label.lower()
+        pre = (1, PRE_RELEASE_LABELS.get(pre_label, pre_label), int(match.group("pre_n") or 0))
+    elif match.group("post") == None and match.group("dev") != None:
+        # A dev release with no pre-release or post-release sorts before any pre-release
+        pre = (0,)
     else:
-        # This is a recursive call comparing prerelease versions, so we don't need to split that
-        aVersion, aPrerelease = a, None
-        bVersion, bPrerelease = b, None
-    
-    aVersionIds = aVersion.split('.')
-    bVersionIds = bVersion.split('.')
-    for aId, bId in zip(aVersionIds, bVersionIds):
-        c = compare_identifiers(aId, bId)
-        if c != 0:
-            return c
-    # If the Ids are all equal so far, if a or b has some Ids left over, then that
-    # version is considered higher
-    if len(aVersionIds) > len(bVersionIds):
-        return 1
-    elif len(bVersionIds) > len(aVersionIds):
-        return -1
-
-    # Ok, in this case we compare pre-release versions
-    if aPrerelease == None and bPrerelease == None:
-        # Nothing left to compare
-        return 0
-        
-    # By semver, a version with a pre-release version is lower than one without it
-    if aPrerelease == None and bPrerelease != None:
-        return 1
-    elif bPrerelease == None and aPrerelease != None:
-        return -1
-
-    # If both a and b pre-release versions are not none, then we compare those as version
-    # strings
-    return compare_versions(aPrerelease, bPrerelease)
-
-params = parse_parameters()
-docker_helm = params["docker_helm"]
-input_file = params["input_file"]
-image_name = params["image_name"]
-image_type = params["image_type"]
-major = params["major"]
-minor = params["minor"]
-version_format_filter = (params["no_version_format_filter"] != True)
-
-if major == None:
-    version_prefix = ""
-else:
-    version_prefix = str(major)
-    if minor != None:
-        version_prefix += "." + str(minor)
+        pre = (2,)
+    if match.group("post") == None:
+        post = (0,)
+    else:
+        post = (1, int(match.group("post_n1") or match.group("post_n2") or 0))
+    if match.group("dev") == None:
+        dev = (1,)
+    else:
+        dev = (0, int(match.group("dev_n") or 0))
+    if match.group("local") == None:
+        local = (0,)
+    else:
+        # Numeric segments sort after alphanumeric ones
+        local = (1, tuple((1, int(s)) if s.isdigit() else (0, s.lower())
+                          for s in re.split("[-_.]", match.group("local"))))
+    return (epoch, release, pre, post, dev, local)
 
-# The first thing we will do is generate a list of ALL versions of our chosen image
-if docker_helm == "docker":
-    import json
-    with open(input_file, "rt") as f:
-        docker_data = json.load(f)
-    # The Docker API call to /v2/{image_name}/tags/list returns the following JSON structure:
-    # {
-    #     "name": "image_name",
-    #     "tags": [
-    #         "tag1",
-    #         "tag2",
-    #         ...
-    all_versions = docker_data["tags"]
-else:
-    import yaml
+class PythonVersion(object):
+    """
+    A PEP 440 version string of a Python package, parsed once. standard is True if the
+    string is a plain x.y.z release or x.y.z.postN post-release, release is the tuple of
+    release numbers, and key is a tuple which sorts versions in PEP 440 order.
+    """
+    __slots__ = ("string", "standard", "release", "key")
+
+    def __init__(self, s, match):
+        self.string = s
+        self.standard = PYTHON_STANDARD_REGEX.fullmatch(s) is not None
+        self.release = tuple(int(n) for n in match.group("release").split("."))
+        self.key = pep440_key(match)
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __repr__(self):
+        return "PythonVersion(%r)" % self.string
+
+    @staticmethod
+    def prefix_matcher(version_prefix):
+        # Returns a function which tells whether the release numbers of a version begin
+        # with the major (and minor) numbers in the prefix, treating missing release
+        # numbers as 0 (so 1 matches major 1 and minor 0)
+        numbers = tuple(int(n) for n in version_prefix.split("."))
+        padding = (0,) * len(numbers)
+        return lambda v: (v.release + padding)[:len(numbers)] == numbers
+
+def parse_python_versions(version_strings):
+    # Generator yielding a PythonVersion for each distinct version among the strings
+    # (a release usually has both a wheel and an sdist). Strings which are not valid
+    # PEP 440 versions are skipped, as pip does.
+    seen = set()
+    for s in version_strings:
+        match = PEP440_REGEX.fullmatch(s)
+        if match == None:
+            continue
+        v = PythonVersion(s, match)
+        if v.key not in seen:
+            seen.add(v.key)
+            yield v
+
+# Input parsing
+#
+# Only a small part of each input file is needed: the tags list of a Docker tags/list
+# response, and the version and urls fields of the entries for one chart in a Helm
+# index.yaml (which has entries for every chart in the repository, and can be many
+# megabytes). So rather than loading the whole file, only those parts are extracted.
+
+JSON_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+def scan_docker_tags(text):
+    # Decodes the top-level JSON object in text one member at a time, keeping only the
+    # value of its "tags" member. Raises ValueError if text is not a single JSON object,
+    # and KeyError if it has no "tags" member.
+    decoder = json.JSONDecoder()
+    skip_whitespace = lambda i: JSON_WHITESPACE_RE.match(text, i).end()
+    i = skip_whitespace(0)
+    if text[i:i+1] != "{":
+        raise ValueError("Not a JSON object")
+    i = skip_whitespace(i+1)
+    found_tags = False
+    if text[i:i+1] == "}":
+        i += 1
+    else:
+        while True:
+            key, i = decoder.raw_decode(text, i)
+            if not isinstance(key, str):
+                raise ValueError("Object key is not a string")
+            i = skip_whitespace(i)
+            if text[i:i+1] != ":":
+                raise ValueError("Expected ':' after object key")
+            value, i = decoder.raw_decode(text, skip_whitespace(i+1))
+            if key == "tags":
+                # If the key appears more than once, the last value is used, as with json.load
+                tags = value
+                found_tags = True
+            i = skip_whitespace(i)
+            c = text[i:i+1]
+            i = skip_whitespace(i+1)
+            if c == "}":
+                break
+            elif c != ",":
+                raise ValueError("Expected ',' or '}' after object member")
+    if skip_whitespace(i) != len(text):
+        raise ValueError("Extra data after JSON object")
+    elif not found_tags:
+        raise KeyError("tags")
+    return tags
+
+# A registry may split the tags list of an image into pages. These are downloaded into a
+# single file as an RFC 7464 JSON text sequence (see url_cache.py --paginate), in which
+# each page is preceded by an ASCII record separator. JSON text cannot contain that
+# character, so the file can be split into pages without parsing it.
+RECORD_SEPARATOR = "\x1e"
+
+def docker_pages(input_file):
+    # Generator yielding the text of each page of the tags list in the input file, reading
+    # the file a piece at a time so that only one page is in memory at once
     with open(input_file, "rt") as f:
-        helm_data = yaml.safe_load(f)
-    entries = helm_data["entries"]
-    try:
-        my_image_entries = entries[image_name]
-    except KeyError:
-        my_image_entries = list()
-    # If an image_type was specified, we need to filter this list further, only including
+        first = f.read(1)
+        if first != RECORD_SEPARATOR:
+            # The whole file is a single tags list
+            yield first + f.read()
+            return
+        page = ""
+        for chunk in iter(lambda: f.read(65536), ""):
+            pieces = chunk.split(RECORD_SEPARATOR)
+            if len(pieces) == 1:
+                page += chunk
+                continue
+            yield page + pieces[0]
+            for piece in pieces[1:-1]:
+                yield piece
+            page = pieces[-1]
+        yield page
+
+def load_docker_tags(input_file):
+    # Generator yielding the tags in the input file, one page at a time
+    for text in docker_pages(input_file):
+        try:
+            tags = scan_docker_tags(text)
+        except (ValueError, KeyError):
+            # Let json report the problem the usual way
+            tags = json.loads(text)["tags"]
+        for tag in tags:
+            yield tag
+
+class HelmIndexFallback(Exception):
+    """
+    Raised by HelmIndexScanner when the part of an index.yaml it needs uses something it
+    does not handle (such as aliases, merge keys, values which are not strings, or an
+    unexpected structure). The whole file is then loaded instead, so that the result
+    (or error) is exactly what it would have been.
+    """
+
+class HelmIndexScanner(object):
+    """
+    Extracts the entries for one chart from a Helm repository index.yaml by walking the
+    stream of YAML parsing events, rather than constructing the entire document. Only
+    the version and urls fields of that chart's entries are built. Everything else
+    (including the entries of every other chart) is skipped over as it is parsed.
+    """
+    def __init__(self):
+        import yaml
+        self.yaml = yaml
+        # Use the libyaml-based loader, if PyYAML was built with it
+        self.loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        self.resolver = yaml.resolver.Resolver()
+        self.collection_starts = { yaml.MappingStartEvent, yaml.SequenceStartEvent }
+        self.collection_ends = { yaml.MappingEndEvent, yaml.SequenceEndEvent }
+
+    def load_chart_entries(self, input_file, chart_name):
+        """
+        Returns a list with a dict for each entry of the specified chart, containing (at
+        most) its version and urls fields. Returns an empty list if the index does not
+        have the chart.
+        """
+        return self.load_charts_entries(input_file, { chart_name }).get(chart_name, list())
+
+    def load_charts_entries(self, input_file, chart_names):
+        """
+        Same as load_chart_entries, but for several charts at once. Returns a dict
+        mapping the name of each of the charts which the index has to its entries.
+        If chart_names is None, the entries of every chart are returned.
+        """
+        try:
+            with open(input_file, "rt") as f:
+                return self.scan(self.yaml.parse(f, Loader=self.loader), chart_names)
+        except HelmIndexFallback:
+            pass
+        with open(input_file, "rt") as f:
+            helm_data = self.yaml.load(f, Loader=self.loader)
+        entries = helm_data["entries"]
+        if chart_names is None:
+            return dict(entries)
+        return { name: entries[name] for name in chart_names if name in entries }
+
+    def expect(self, events, event_class):
+        event = next(events)
+        if not isinstance(event, event_class):
+            raise HelmIndexFallback()
+        return event
+
+    def string_value(self, event):
+        # Returns the value of a scalar, if it is loaded as a string
+        if not isinstance(event, self.yaml.ScalarEvent):
+            raise HelmIndexFallback()
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = self.resolver.resolve(self.yaml.ScalarNode, event.value, event.implicit)
+        if tag != "tag:yaml.org,2002:str":
+            raise HelmIndexFallback()
+        return event.value
+
+    def mapping_keys(self, events):
+        # Generator yielding each key of a mapping whose start event has been consumed.
+        # After each key, the caller must consume the events of its value.
+        while True:
+            event = next(events)
+            if isinstance(event, self.yaml.MappingEndEvent):
+                return
+            yield self.string_value(event)
+
+    def skip_node(self, events):
+        event = next(events)
+        if type(event) not in self.collection_starts:
+            # A scalar or alias
+            return
+        depth = 1
+        starts, ends = self.collection_starts, self.collection_ends
+        for event in events:
+            event_type = type(event)
+            if event_type in starts:
+                depth += 1
+            elif event_type in ends:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def chart_entries(self, events):
+        y = self.yaml
+        entries = list()
+        self.expect(events, y.SequenceStartEvent)
+        while True:
+            event = next(events)
+            if isinstance(event, y.SequenceEndEvent):
+                return entries
+            elif not isinstance(event, y.MappingStartEvent):
+                raise HelmIndexFallback()
+            entry = dict()
+            for key in self.mapping_keys(events):
+                if key == "version":
+                    entry["version"] = self.string_value(next(events))
+                elif key == "urls":
+                    self.expect(events, y.SequenceStartEvent)
+                    urls = list()
+                    event = next(events)
+                    while not isinstance(event, y.SequenceEndEvent):
+                        urls.append(self.string_value(event))
+                        event = next(events)
+                    entry["urls"] = urls
+                else:
+                    self.skip_node(events)
+            entries.append(entry)
+
+    def scan(self, events, chart_names):
+        # The index is a mapping with an entries field, which maps each chart name to a
+        # list of entries. If a key appears more than once in a mapping, the last one is
+        # used, as when the document is loaded.
+        y = self.yaml
+        self.expect(events, y.StreamStartEvent)
+        self.expect(events, y.DocumentStartEvent)
+        self.expect(events, y.MappingStartEvent)
+        found_entries = False
+        charts_entries = dict()
+        for key in self.mapping_keys(events):
+            if key != "entries":
+                self.skip_node(events)
+                continue
+            found_entries = True
+            charts_entries = dict()
+            self.expect(events, y.MappingStartEvent)
+            for chart in self.mapping_keys(events):
+                if chart_names is None or chart in chart_names:
+                    charts_entries[chart] = self.chart_entries(events)
+                else:
+                    self.skip_node(events)
+        self.expect(events, y.DocumentEndEvent)
+        self.expect(events, y.StreamEndEvent)
+        if not found_entries:
+            raise HelmIndexFallback()
+        return charts_entries
+
+class PythonIndexParser(html.parser.HTMLParser):
+    """
+    Collects the names of the files linked to by a PEP 503 simple repository page for a
+    project, leaving out any which have been yanked (PEP 592). The page is fed to the
+    parser in pieces, so it is never held in memory all at once.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.file_names = list()
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        attrs = dict(attrs)
+        if "data-yanked" in attrs or not attrs.get("href"):
+            return
+        path = urllib.parse.urlsplit(attrs["href"]).path
+        self.file_names.append(urllib.parse.unquote(path.rsplit("/", 1)[-1]))
+
+def load_python_file_names(input_file):
+    parser = PythonIndexParser()
+    with open(input_file, "rt", encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(65536), ""):
+            parser.feed(chunk)
+    parser.close()
+    return parser.file_names
+
+SDIST_EXTENSIONS = [ ".tar.gz", ".zip", ".tar.bz2", ".tar.xz" ]
+
+def normalize_project_name(name):
+    # PEP 503 normalization: runs of -, _, and . are equivalent, and case is ignored
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def python_file_version(file_name, project):
+    # Returns the version string in the name of a wheel or sdist file of the project (whose
+    # name has been normalized), or None if it is not one
+    if file_name.endswith(".whl"):
+        # name-version(-build)?-python-abi-platform.whl
+        parts = file_name[:-len(".whl")].rsplit("-", 3)
+        if len(parts) != 4:
+            return None
+        stem = parts[0]
+    else:
+        # name-version.extension
+        for extension in SDIST_EXTENSIONS:
+            if file_name.endswith(extension):
+                stem = file_name[:-len(extension)]
+                break
+        else:
+            return None
+    # The name may itself contain hyphens (although it should not in a wheel file name)
+    i = stem.find("-")
+    while i != -1:
+        if normalize_project_name(stem[:i]) == project:
+            # Strip off any wheel build tag
+            return stem[i+1:].split("-")[0] if file_name.endswith(".whl") else stem[i+1:]
+        i = stem.find("-", i+1)
+    return None
+
+def python_versions(file_names, image_name):
+    # Generator yielding the version strings of the files of the Python package
+    project = normalize_project_name(image_name)
+    for file_name in file_names:
+        version = python_file_version(file_name, project)
+        if version != None:
+            yield version
+
+# Version selection
+#
+# The versions are passed through a series of generators, so that each one is parsed,
+# filtered, and compared to the latest so far before the next one is looked at.
+
+# Version constraints
+#
+# A constraint is one or more space-separated comparators, all of which a version must
+# satisfy. Each comparator is a version, optionally preceded by an operator (=, >, >=, <, <=,
+# ~, or ^). The version may be partial (x or x.y, which may also be written x.* or x.y.*, with
+# x or X in place of *), standing for every version of x (or x.y),
+# including its pre-releases, so its bounds are x.y.z-0, the lowest possible version of some
+# x.y.z. These are based on npm's semver ranges (with pre-releases included):
+#   1.4 or =1.4   >=1.4.0-0 <1.5.0-0     (a bare x.y.z, or =x.y.z, matches only that version)
+#   <2.0.0        <2.0.0-0                (so no pre-release of 2.0.0 is below it either)
+#   >1.4          >=1.5.0-0               <=1.4   <1.5.0-0       <1.4   <1.4.0-0
+#   ~1.3.2        >=1.3.2 <1.4.0-0        ~1   >=1.0.0-0 <2.0.0-0
+#   ^2.1.0        >=2.1.0 <3.0.0-0        ^0.3.1   >=0.3.1 <0.4.0-0   ^0.0.3   >=0.0.3 <0.0.4-0
+#   *             any version (x or X may be written for *, here and in a partial version)
+# Pre-release versions are included, unless pre-releases are excluded altogether. The exception
+# is <x.y.z: x.y.z-rc.1 precedes x.y.z, but a constraint such as >=1.4.2 <2.0.0 is written to
+# stay on 1.x, so no pre-release of x.y.z satisfies it. (<x.y.z-rc.1, with a pre-release, is
+# taken as it is.)
+#
+# A constraint is evaluated as a range of sort keys. The versions in the range are found
+# either by testing each key, or, when versions are to be searched more than once, by binary
+# search over the versions sorted once by key.
+
+COMPARATOR_PATTERN = r"(?P<op>[<>]=?|=|~|\^)?v?(?:(?P<any>[*xX])|(?P<partial>{PARTIAL})|(?P<full>{V}))"
+COMPARATOR_REGEX = re.compile(COMPARATOR_PATTERN.format(
+    PARTIAL="(?P<partial_major>{NUM})(?:[.](?:(?P<partial_minor>{NUM})|[*xX])(?:[.][*xX])?)?".format(NUM=NUM_PATTERN),
+    V=VPATTERN))
+
+def lowest_key(numbers):
+    # Returns the sort key of x.y.z-0, the lowest possible version of x.y.z, where x, y, and z
+    # are the given numbers (missing ones are 0)
+    numbers = list(numbers) + [ 0 ] * (3 - len(numbers))
+    return (tuple((0, n) for n in numbers), (0, (((0, 0),), NO_PRERELEASE_KEY)))
+
+def increment(numbers, i):
+    # Returns the numbers up to position i, with the number at position i incremented
+    return numbers[:i] + [ numbers[i] + 1 ]
+
+class VersionRange(object):
+    """
+    The versions whose keys lie between low and high (either of which may be None, for no
+    bound), including low and high themselves only if low_inclusive and high_inclusive.
+    """
+    __slots__ = ("low", "low_inclusive", "high", "high_inclusive")
+
+    def __init__(self, low=None, low_inclusive=True, high=None, high_inclusive=True):
+        self.low = low
+        self.low_inclusive = low_inclusive
+        self.high = high
+        self.high_inclusive = high_inclusive
+
+    def contains(self, key):
+        if self.low is not None and (key < self.low or (key == self.low and not self.low_inclusive)):
+            return False
+        if self.high is not None and (key > self.high or (key == self.high and not self.high_inclusive)):
+            return False
+        return True
+
+    def intersection(self, other):
+        # Of two equal bounds, the exclusive one is the narrower
+        low, low_inclusive = self.low, self.low_inclusive
+        if other.low is not None and (low is None or (other.low, not other.low_inclusive) > (low, not low_inclusive)):
+            low, low_inclusive = other.low, other.low_inclusive
+        high, high_inclusive = self.high, self.high_inclusive
+        if other.high is not None and (high is None or (other.high, other.high_inclusive) < (high, high_inclusive)):
+            high, high_inclusive = other.high, other.high_inclusive
+        return VersionRange(low, low_inclusive, high, high_inclusive)
+
+    def bounds(self, key_at, n):
+        # Returns the (start, end) slice of the n keys given by key_at (in sorted order)
+        # which are in the range
+        start = 0 if self.low is None else bisect_keys(key_at, n, self.low, not self.low_inclusive)
+        end = n if self.high is None else bisect_keys(key_at, n, self.high, self.high_inclusive)
+        return start, max(start, end)
+
+def bisect_keys(key_at, n, key, right):
+    # Returns the position of key among the n sorted keys given by key_at: before any equal
+    # keys, or after them if right is True
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key_at(mid) < key or (right and key_at(mid) == key):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def parse_comparator(comparator):
+    # Returns the VersionRange of one comparator. Raises ValueError if it is invalid.
+    match = COMPARATOR_REGEX.fullmatch(comparator)
+    if match is None:
+        raise ValueError("Invalid comparator: %s" % comparator)
+    op = match.group("op") or "="
+    if match.group("any"):
+        if op != "=":
+            raise ValueError("Invalid comparator: %s" % comparator)
+        return VersionRange()
+    if match.group("full"):
+        numbers = [ int(match.group(g)) for g in ("major", "minor", "patch") ]
+        version_key = semver_key(SEMVER_REGEX.fullmatch(match.group("full")))
+        if op == "=":
+            return VersionRange(version_key, True, version_key, True)
+        elif op in { ">", ">=" }:
+            return VersionRange(low=version_key, low_inclusive=(op == ">="))
+        elif op == "<" and match.group("prerelease") is None:
+            # Below every pre-release of the version too
+            return VersionRange(high=lowest_key(numbers), high_inclusive=False)
+        elif op in { "<", "<=" }:
+            return VersionRange(high=version_key, high_inclusive=(op == "<="))
+        low = version_key
+    else:
+        numbers = [ int(match.group("partial_major")) ]
+        if match.group("partial_minor") is not None:
+            numbers.append(int(match.group("partial_minor")))
+        # The upper bound of every version of x (or x.y)
+        following = lowest_key(increment(numbers, len(numbers) - 1))
+        if op == "=":
+            return VersionRange(lowest_key(numbers), True, following, False)
+        elif op == ">=":
+            return VersionRange(low=lowest_key(numbers))
+        elif op == ">":
+            return VersionRange(low=following)
+        elif op == "<":
+            return VersionRange(high=lowest_key(numbers), high_inclusive=False)
+        elif op == "<=":
+            return VersionRange(high=following, high_inclusive=False)
+        low = lowest_key(numbers)
+    if op == "~":
+        # Changes to the last number given are allowed, or to the patch number if all are given
+        high = increment(numbers, min(len(numbers) - 1, 1))
+    else:
+        # Changes are allowed to everything after the first nonzero number given (or after
+        # the last one, if they are all 0)
+        nonzero = [ i for i, n in enumerate(numbers) if n != 0 ]
+        high = increment(numbers, nonzero[0] if nonzero else len(numbers) - 1)
+    return VersionRange(low, True, lowest_key(high), False)
+
+class VersionConstraint(object):
+    """
+    A version constraint (see above). text may be None if only pre-releases are being
+    excluded. Raises ValueError if text is not a valid constraint.
+    """
+    def __init__(self, text, prereleases=True):
+        self.text = text
+        self.prereleases = prereleases
+        self.range = VersionRange()
+        comparators = (text or "").split()
+        # An operator may be separated from its version by spaces
+        while comparators:
+            comparator = comparators.pop(0)
+            if comparator in { "=", ">", ">=", "<", "<=", "~", "^" } and comparators:
+                comparator += comparators.pop(0)
+            self.range = self.range.intersection(parse_comparator(comparator))
+        if text is not None and not text.split():
+            raise ValueError("Constraint may not be blank")
+
+    def matches(self, key):
+        return self.range.contains(key) and (self.prereleases or key[1] == NO_PRERELEASE_KEY)
+
+    def description(self):
+        versions = "versions" if self.prereleases else "release versions"
+        if self.text is None:
+            return versions
+        return "%s matching %s" % (versions, self.text)
+
+class SortedVersions(object):
+    """
+    Versions sorted by key (later versions after earlier ones with the same key), so that
+    the versions satisfying a constraint are found by binary search. items are the versions
+    (in any form), in that order, releases are the ones which are not pre-releases, and
+    item_key returns the sort key of an item.
+    """
+    def __init__(self, items, releases, item_key):
+        self.items = items
+        self.releases = releases
+        self.item_key = item_key
+
+    def select(self, version_range, prereleases):
+        # Returns the list of items in the range, in sorted order
+        items = self.items if prereleases else self.releases
+        start, end = version_range.bounds(lambda i: self.item_key(items[i]), len(items))
+        return items[start:end]
+
+    @staticmethod
+    def latest(items, top):
+        # Returns the latest item (in a list), or the latest top items, latest first
+        return items[::-1][:1 if top is None else top]
+
+def prefix_range(major, minor):
+    # Returns the VersionRange of the standard versions which match the major (and minor)
+    # numbers, or None if there are none
+    if major is None:
+        return None
+    numbers = [ major ] if minor is None else [ major, minor ]
+    return VersionRange(lowest_key(numbers), True,
+                        lowest_key(increment(numbers, len(numbers) - 1)), False)
+
+def select_sorted(sorted_versions, counts, image_name, image_type, major, minor, top, constraint):
+    # Returns the latest version(s) from SortedVersions of the standard versions (whose
+    # numbers are already in counts), after filtering them, as find_latest_versions does.
+    version_range = prefix_range(major, minor)
+    if version_range is not None:
+        counts["prefix"] = len(sorted_versions.select(version_range, True))
+    else:
+        version_range = VersionRange()
+    if constraint is not None:
+        version_range = version_range.intersection(constraint.range)
+    selected = sorted_versions.select(version_range, constraint is None or constraint.prereleases)
+    counts["constraint"] = len(selected)
+    check_counts(counts, image_name, image_type, get_version_prefix(major, minor), True, constraint)
+    return SortedVersions.latest(selected, top)
+
+def count_versions(versions, counts, stage):
+    # Generator passing along the versions unchanged, counting them in counts[stage]
+    for v in versions:
+        counts[stage] += 1
+        yield v
+
+def select_latest(versions):
+    # Returns the version with the highest precedence (None if there are no versions).
+    # Of versions with the same precedence, the last one is chosen.
+    latest = None
+    for v in versions:
+        if latest is None or not v < latest:
+            latest = v
+    return latest
+
+def select_top(versions, k):
+    # Returns a list of the (up to) k versions with the highest precedence, highest
+    # first, keeping only k of them at a time. Of versions with the same precedence,
+    # later ones rank higher, consistent with select_latest.
+    heap = list()
+    for i, v in enumerate(versions):
+        # The index breaks ties, so the versions themselves are never compared
+        item = (v.key, i, v)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return [ item[2] for item in sorted(heap, reverse=True) ]
+
+def parse_versions(docker_helm, version_strings):
+    # Returns an iterable of the parsed versions, and the class of the versions
+    if docker_helm == "python":
+        return parse_python_versions(version_strings), PythonVersion
+    return ( Version(ver) for ver in version_strings ), Version
+
+class LatestVersionError(Exception):
+    """
+    Raised when no versions are left after filtering.
+    """
+
+def chart_versions(chart_entries, image_name, image_type):
+    # Generator yielding the version strings of the entries of a Helm chart
+    #
+    # If an image_type was specified, we need to filter the entries, only including
     # entries whose url field contains at least 1 url with "/image_type/image_name/" in them
     if image_type != None:
         url_substring = "/" + image_type + "/" + image_name + "/"
-        my_image_entries = [ entry for entry in my_image_entries if any(
-            url_substring in url for url in entry["urls"]) ]
-    # my_image_entries is now a list of dicts that have info on each version of our
-    # image. So we need to turn that into a list of just version strings
-    all_versions = [ mie["version"] for mie in my_image_entries ]
-
-if image_type == None:
-    label="entries"
-else:
-    label="%s entries" % image_type
-
-if len(all_versions) == 0:
-    if version_prefix:
-        err_exit("No %s found for %s even before filtering for version %s" % (label, image_name, version_prefix))
+        chart_entries = ( entry for entry in chart_entries if any(
+            url_substring in url for url in entry["urls"]) )
+    # chart_entries is now a sequence of dicts that have info on each version of our
+    # image. So we need to turn that into a sequence of just version strings
+    return ( entry["version"] for entry in chart_entries )
+
+def get_version_prefix(major, minor):
+    if major == None:
+        return ""
+    elif minor == None:
+        return str(major)
+    return "%d.%d" % (major, minor)
+
+def check_counts(counts, image_name, image_type, version_prefix, version_format_filter, constraint=None):
+    # Raises LatestVersionError if no versions were left after one of the filtering stages,
+    # saying which stage filtered them all out
+    if image_type == None:
+        label="entries"
     else:
-        err_exit("No %s found for %s" % (label, image_name))
-elif version_format_filter:
-    # Filter out any versions which don't begin with #.#.# followed by 
-    all_versions = [ ver for ver in all_versions if SEMVER_REGEX.fullmatch(ver) ]
-    if len(all_versions) == 0:
+        label="%s entries" % image_type
+
+    if counts["all"] == 0:
         if version_prefix:
-            err_exit("No %s found for %s after filtering nonstandard version formats (but before filtering for version %s)" % (label, image_name, version_prefix))
+            raise LatestVersionError("No %s found for %s even before filtering for version %s" % (label, image_name, version_prefix))
         else:
-            err_exit("No %s found for %s after filtering nonstandard version formats" % (label, image_name))
-
-if version_prefix:
-    # Now we need to extract only those version strings which match our prefix
-    # There are a few cases to consider:
-    # 1) The version string is exactly equal to our version prefix
-    # 2) The version string starts with our prefix followed by a period, because
-    #    there are additional version fields
-    # 3) The version string starts with our prefix followed by a dash, indicating
-    #    a prerelease id
-    # 4) The version string starts with our prefix followed by a plus, indicating
-    #    a build id
-    #
-    # So filter our list for only versions which meet one of the above criteria
-
-    version_prefixes = [ version_prefix + c
-                         for c in [ ".", "-", "+" ] ] 
-    my_versions = [ v for v in all_versions
-                   if v == version_prefix or
-                   any(v.find(vp) == 0 for vp in version_prefixes) ]
-    if len(my_versions) == 0:
-        err_exit("No entries found for %s after filtering for version %s" % (image_name, version_prefix))
-else:
-    # This case is simple -- we want the entire version list
-    my_versions = all_versions
-
-my_versions.sort(key=functools.cmp_to_key(compare_versions))
-print(my_versions[-1])
-sys.exit(0)
+            raise LatestVersionError("No %s found for %s" % (label, image_name))
+    elif version_format_filter and counts["standard"] == 0:
+        if version_prefix:
+            raise LatestVersionError("No %s found for %s after filtering nonstandard version formats (but before filtering for version %s)" % (label, image_name, version_prefix))
+        else:
+            raise LatestVersionError("No %s found for %s after filtering nonstandard version formats" % (label, image_name))
+    elif version_prefix and counts["prefix"] == 0:
+        raise LatestVersionError("No entries found for %s after filtering for version %s" % (image_name, version_prefix))
+    elif constraint is not None and counts["constraint"] == 0:
+        raise LatestVersionError("No entries found for %s after filtering for %s" % (image_name, constraint.description()))
+
+def find_latest_versions(versions, image_name, image_type, major, minor, version_format_filter, top,
+                         version_class=Version, constraint=None):
+    # Returns a list of the latest version (or if top is not None, the latest top versions)
+    # from versions, an iterable of version_class objects, after filtering them (by the
+    # VersionConstraint too, if one is given).
+    # Raises LatestVersionError if there are none left after filtering.
+    version_prefix = get_version_prefix(major, minor)
+
+    # Count how many versions there are at each stage, so that if none are left at
+    # the end, we can tell which stage filtered them all out
+    counts = { "all": 0, "standard": 0, "prefix": 0, "constraint": 0 }
+    versions = count_versions(versions, counts, "all")
+
+    if version_format_filter:
+        # Filter out any versions which don't begin with #.#.# followed by 
+        versions = count_versions(( ver for ver in versions if ver.standard ), counts, "standard")
+
+    if version_prefix:
+        # Now we need to extract only those versions which match our prefix
+        matches_prefix = version_class.prefix_matcher(version_prefix)
+        versions = count_versions(( v for v in versions if matches_prefix(v) ), counts, "prefix")
+
+    if constraint is not None:
+        versions = count_versions(( v for v in versions if constraint.matches(v.key) ), counts, "constraint")
+
+    if top == None:
+        latest_versions = [ select_latest(versions) ]
+    else:
+        latest_versions = select_top(versions, top)
+
+    check_counts(counts, image_name, image_type, version_prefix, version_format_filter, constraint)
+    return latest_versions
+
+class VersionList(object):
+    """
+    Parsed versions, from which find_latest_versions selects the latest. versions is a
+    list if they are to be searched more than once, or else any iterable. The first time
+    a list is searched with a constraint, its standard versions are sorted, so that every
+    constraint is then answered by binary search.
+    """
+    def __init__(self, versions, version_class):
+        self.versions = versions
+        self.version_class = version_class
+        self.sorted_versions = None
+
+    def latest(self, image_name, image_type, major, minor, version_format_filter, top, constraint=None):
+        if constraint is None or not version_format_filter or not isinstance(self.versions, list):
+            return find_latest_versions(self.versions, image_name, image_type, major, minor,
+                                        version_format_filter, top, self.version_class, constraint)
+        if self.sorted_versions is None:
+            standard = sorted(( (v.key, i, v) for i, v in enumerate(self.versions) if v.standard ),
+                              key=lambda item: item[:2])
+            self.sorted_versions = SortedVersions([ item[2] for item in standard ],
+                                                  [ item[2] for item in standard if item[0][1] == NO_PRERELEASE_KEY ],
+                                                  lambda v: v.key)
+        counts = { "all": len(self.versions), "standard": len(self.sorted_versions.items), "prefix": 0 }
+        return select_sorted(self.sorted_versions, counts, image_name, image_type, major, minor, top, constraint)
+
+# Column-wise ranking
+#
+# Some Docker repositories accumulate hundreds of thousands of CI tags, and parsing each of
+# them into a Version with its own key tuple takes most of the time. If NumPy is installed,
+# large lists of version strings are instead parsed with one regex call per string (mapped
+# in C) into column arrays: major, minor, patch, whether there is a pre-release version, and
+# the rank of each pre-release identifier among all of the distinct identifiers (0 if the
+# pre-release version has fewer identifiers). Sorting the columns lexicographically with
+# numpy.lexsort orders the versions exactly as their keys do, and only the versions that are
+# selected are ever made into Version objects.
+#
+# Only standard versions can be ranked this way, so this is only used when nonstandard
+# versions are being filtered out (as they are by default).
+
+# How many version strings there must be before the cost of importing NumPy pays off
+COLUMNS_THRESHOLD = 50000
+
+def load_numpy():
+    # Returns the numpy module, or None if it is not installed
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+# Matches each line of a string of newline-separated version strings which is a standard version
+COLUMNS_REGEX = re.compile("^(?:%s)$" % VPATTERN, re.MULTILINE)
+
+class VersionColumns(object):
+    """
+    The standard versions among a list of version strings, parsed into NumPy column arrays.
+    Raises OverflowError if a major, minor, or patch number is too large for the arrays.
+    """
+    def __init__(self, numpy, version_strings):
+        self.numpy = numpy
+        self.count = len(version_strings)
+        self.sorted_versions = None
+        # Parsing creates hundreds of thousands of short-lived containers, none of them in
+        # reference cycles, which would otherwise set off many pointless garbage collections
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.parse(version_strings)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def parse(self, version_strings):
+        numpy = self.numpy
+        text = "\n".join(version_strings)
+        if text.count("\n") == max(self.count - 1, 0):
+            # One regex pass over all of the version strings finds the standard ones, in order
+            matches = list(COLUMNS_REGEX.finditer(text))
+        else:
+            # Some version string has a newline in it, so they must be matched one at a time
+            matches = [ m for m in map(SEMVER_REGEX.fullmatch, version_strings) if m is not None ]
+        self.strings = [ m.group() for m in matches ]
+        n = len(matches)
+        parts = [ m.group("major", "minor", "patch", "prerelease") for m in matches ]
+        majors, minors, patches, prereleases = zip(*parts) if parts else ([], [], [], [])
+        self.major, self.minor, self.patch = (
+            numpy.fromiter(map(int, column), dtype=numpy.int64, count=n) for column in (majors, minors, patches))
+
+        # The pre-release identifiers, as one column for each position ("" where a version has
+        # fewer identifiers, which can never be an identifier itself)
+        with_prerelease = [ i for i, prerelease in enumerate(prereleases) if prerelease is not None ]
+        identifiers = list(itertools.zip_longest(*( prereleases[i].split(".") for i in with_prerelease ),
+                                                 fillvalue=""))
+        self.no_prerelease = numpy.ones(n, dtype=numpy.int8)
+        self.no_prerelease[with_prerelease] = 0
+        self.identifier_ranks = numpy.zeros((len(identifiers), n), dtype=numpy.int64)
+        for j, column in enumerate(identifiers):
+            self.identifier_ranks[j, with_prerelease] = self.identifier_column_ranks(numpy.array(column, dtype=bytes))
+
+    def identifier_column_ranks(self, column):
+        # Returns an array of the rank of each identifier in the column among the distinct
+        # identifiers in it, in order of precedence from 1 up (and 0 for ""). Numeric
+        # identifiers (which never have leading zeros, so each number has only one string)
+        # come before alphanumeric ones, which are ordered by their characters.
+        numpy = self.numpy
+        ranks = numpy.zeros(len(column), dtype=numpy.int64)
+        numeric = numpy.char.isdigit(column)
+        present = column != b""
+        numbers = column[numeric]
+        if len(numbers) and numpy.char.str_len(numbers).max() > 18:
+            # Too large for int64, so sort them as Python ints
+            numbers = numpy.array([ int(s) for s in numbers ], dtype=object)
+        else:
+            numbers = numbers.astype(numpy.int64)
+        distinct_numbers, number_ranks = numpy.unique(numbers, return_inverse=True)
+        ranks[numeric] = number_ranks + 1
+        alphanumeric = present & ~numeric
+        distinct_strings, string_ranks = numpy.unique(column[alphanumeric], return_inverse=True)
+        ranks[alphanumeric] = string_ranks + 1 + len(distinct_numbers)
+        return ranks
+
+    def ranked(self, indexes):
+        # Returns the indexes of the versions, ordered by precedence. The last key is the
+        # primary one. The index comes first, so that of versions with the same precedence,
+        # the later one ranks higher, as in select_latest and select_top.
+        keys = [ indexes ] + [ ranks[indexes] for ranks in self.identifier_ranks[::-1] ] + [
+            column[indexes] for column in [ self.no_prerelease, self.patch, self.minor, self.major ] ]
+        return indexes[self.numpy.lexsort(keys)]
+
+    def latest(self, image_name, image_type, major, minor, version_format_filter, top, constraint=None):
+        """
+        Returns the same list of Versions as find_latest_versions would for the version
+        strings (or raises the same LatestVersionError). version_format_filter must be True.
+        """
+        numpy = self.numpy
+        version_prefix = get_version_prefix(major, minor)
+        counts = { "all": self.count, "standard": len(self.strings), "prefix": 0 }
+        if constraint is not None:
+            # Rank all of the versions once, and then answer each constraint by binary search
+            if self.sorted_versions is None:
+                order = self.ranked(numpy.arange(len(self.strings)))
+                self.sorted_versions = SortedVersions(
+                    [ self.strings[i] for i in order ],
+                    [ self.strings[i] for i in order[self.no_prerelease[order] == 1] ],
+                    lambda s: Version(s).key)
+            return [ Version(s) for s in select_sorted(self.sorted_versions, counts, image_name, image_type,
+                                                       major, minor, top, constraint) ]
+        indexes = numpy.arange(len(self.strings))
+        if major is not None:
+            # A standard version matches the prefix exactly when its numbers do
+            selected = self.major == major
+            if minor is not None:
+                selected &= self.minor == minor
+            indexes = indexes[selected]
+        counts["prefix"] = len(indexes)
+        check_counts(counts, image_name, image_type, version_prefix, version_format_filter)
+        order = self.ranked(indexes)
+        return [ Version(self.strings[i]) for i in order[::-1][:1 if top is None else top] ]
+
+def rank_versions(docker_helm, version_strings, version_format_filter, reuse=False):
+    # Returns a VersionColumns for the version strings if NumPy is installed and there are
+    # enough of them for it to pay off, and otherwise a VersionList of them. If reuse is
+    # True, the result may be searched any number of times.
+    numpy = load_numpy() if docker_helm != "python" and version_format_filter else None
+    if numpy is not None:
+        # Only buffer the version strings once NumPy is known to be available, and only as many
+        # as are needed to tell whether there are enough of them; otherwise they are streamed
+        version_strings = iter(version_strings)
+        head = list(itertools.islice(version_strings, COLUMNS_THRESHOLD))
+        if len(head) < COLUMNS_THRESHOLD:
+            version_strings = head
+        else:
+            version_strings = head + list(version_strings)
+            try:
+                return VersionColumns(numpy, version_strings)
+            except OverflowError:
+                # Fall back to parsing each version, which handles numbers of any size
+                pass
+    versions, version_class = parse_versions(docker_helm, version_strings)
+    return VersionList(list(versions) if reuse else versions, version_class)
+
+# Batch mode
+#
+# Each line of a batch file is a request, with these tab-separated fields (which may be
+# blank where noted):
+# docker|helm|python, input file, image name, type (optional), major (optional), minor (optional),
+# top (optional), constraint (optional), no-prereleases (or blank), output file, mirror (or blank)
+#
+# A line whose last field is mirror gives another input file (and type) for the request on the
+# line before it, whose other fields it must repeat: for example, the same index downloaded from
+# another mirror, with the type which selects the image's entries in that mirror's index.
+
+BATCH_FIELDS = [ "docker_helm", "input_file", "image_name", "image_type", "major", "minor", "top",
+                 "constraint", "no_prereleases", "outfile", "mirror" ]
+
+# The fields which a mirror line must repeat
+MIRROR_FIELDS = [ "docker_helm", "image_name", "major", "minor", "top", "constraint", "no_prereleases", "outfile" ]
+
+def read_batch_file(batch_file):
+    requests = list()
+    with open(batch_file, "rt") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            fields = line.split("\t")
+            if len(fields) != len(BATCH_FIELDS):
+                err_exit("Line %d of batch file %s has %d fields, but should have %d" % (
+                    line_number, batch_file, len(fields), len(BATCH_FIELDS)))
+            request = { name: (value or None) for name, value in zip(BATCH_FIELDS, fields) }
+            if request["mirror"] not in { None, "mirror" }:
+                err_exit("Line %d of batch file %s: mirror field must be mirror or blank" % (line_number, batch_file))
+            elif request["mirror"] != None:
+                if not requests or any(request[name] != previous_fields[name] for name in MIRROR_FIELDS):
+                    err_exit("Line %d of batch file %s: A mirror line must follow a line with the same fields "
+                             "(other than the input file and type)" % (line_number, batch_file))
+                if request["input_file"] == None:
+                    err_exit("Line %d of batch file %s: input_file may not be blank" % (line_number, batch_file))
+                requests[-1]["inputs"].append((request["input_file"], request["image_type"]))
+                continue
+            previous_fields = dict(request)
+            request["inputs"] = [ (request["input_file"], request["image_type"]) ]
+            if request["docker_helm"] not in { "docker", "helm", "python" }:
+                err_exit("Line %d of batch file %s: first field must be docker, helm, or python" % (line_number, batch_file))
+            for name in [ "input_file", "image_name", "outfile" ]:
+                if request[name] == None:
+                    err_exit("Line %d of batch file %s: %s may not be blank" % (line_number, batch_file, name))
+            for name in [ "major", "minor" ]:
+                if request[name] != None:
+                    request[name] = validate_majorminor(request[name])
+            if request["minor"] != None and request["major"] == None:
+                err_exit("Line %d of batch file %s: A minor number may not be specified without a major number" % (line_number, batch_file))
+            if request["top"] != None:
+                request["top"] = validate_top(request["top"])
+            if request["no_prereleases"] not in { None, "no-prereleases" }:
+                err_exit("Line %d of batch file %s: no_prereleases field must be no-prereleases or blank" % (line_number, batch_file))
+            if request["constraint"] != None or request["no_prereleases"] != None:
+                if request["docker_helm"] == "python":
+                    err_exit("Line %d of batch file %s: A constraint may not be specified for python" % (line_number, batch_file))
+                request["constraint"] = validate_constraint(request["constraint"], request["no_prereleases"] == None)
+            requests.append(request)
+    return requests
+
+class VersionSource(object):
+    """
+    The parsed contents of input files, and the parsed versions of each image in them, so
+    that any number of requests can be answered while parsing each file only once.
+
+    If charts_by_file is given, it maps each Helm input file to the set of charts which will
+    be needed from it, so they can all be found in one pass; otherwise all of the charts in
+    a Helm input file are loaded.
+    """
+    def __init__(self, charts_by_file=None):
+        self.charts_by_file = charts_by_file
+        # The tags list of each Docker input file, the chart entries of each Helm input file,
+        # or the file names in each Python index
+        self.parsed_files = dict()
+        # The parsed versions for each distinct (input file, image name, image type)
+        self.parsed_versions = dict()
+
+    def parsed_file(self, docker_helm, input_file, name=None):
+        # Returns the parsed contents of the input file, parsing it if it has not been already.
+        # The contents are known by name (by default the input file itself) in later calls, so
+        # a file which will not be kept can be parsed and then looked up by something else,
+        # such as its URL.
+        if name is None:
+            name = input_file
+        if name not in self.parsed_files:
+            if docker_helm == "docker":
+                self.parsed_files[name] = list(load_docker_tags(input_file))
+            elif docker_helm == "helm":
+                charts = None if self.charts_by_file is None else self.charts_by_file[name]
+                self.parsed_files[name] = HelmIndexScanner().load_charts_entries(input_file, charts)
+            else:
+                self.parsed_files[name] = load_python_file_names(input_file)
+        return self.parsed_files[name]
+
+    def version_strings(self, docker_helm, input_file, image_name, image_type):
+        # Returns the version strings of the image in the input file
+        parsed_file = self.parsed_file(docker_helm, input_file)
+        if docker_helm == "docker":
+            return parsed_file
+        elif docker_helm == "helm":
+            return chart_versions(parsed_file.get(image_name, list()), image_name, image_type)
+        return python_versions(parsed_file, image_name)
+
+    def versions(self, docker_helm, input_file, image_name, image_type):
+        # Returns the VersionList or VersionColumns of the versions of the image
+        return self.union_versions(docker_helm, [ (input_file, image_type) ], image_name)
+
+    def union_versions(self, docker_helm, inputs, image_name):
+        # Returns the VersionList or VersionColumns of the versions of the image in any of
+        # the (input file, image type) inputs. A version string found in more than one of
+        # them is only used once.
+        versions_key = (docker_helm, tuple(inputs), image_name)
+        if versions_key not in self.parsed_versions:
+            if len(inputs) == 1:
+                version_strings = self.version_strings(docker_helm, inputs[0][0], image_name, inputs[0][1])
+            else:
+                version_strings = list(collections.OrderedDict.fromkeys(
+                    s for input_file, image_type in inputs
+                    for s in self.version_strings(docker_helm, input_file, image_name, image_type)))
+            self.parsed_versions[versions_key] = rank_versions(docker_helm, version_strings, True, reuse=True)
+        return self.parsed_versions[versions_key]
+
+def run_batch(batch_file):
+    # Carry out each request in the batch file, in order, writing the latest version(s)
+    # to its output file. Each input file is parsed only once, no matter how many of the
+    # requests use it.
+    requests = read_batch_file(batch_file)
+
+    # The charts needed from each Helm index, so they can all be found in one pass
+    charts_by_file = dict()
+    for request in requests:
+        if request["docker_helm"] == "helm":
+            for input_file, _ in request["inputs"]:
+                charts_by_file.setdefault(input_file, set()).add(request["image_name"])
+    source = VersionSource(charts_by_file)
+
+    for request in requests:
+        image_name = request["image_name"]
+        image_type = request["image_type"]
+        versions = source.union_versions(request["docker_helm"], request["inputs"], image_name)
+        try:
+            latest_versions = versions.latest(image_name, image_type, request["major"], request["minor"],
+                                              True, request["top"], request["constraint"])
+        except LatestVersionError as e:
+            err_exit(str(e))
+        outfile = request["outfile"]
+        try:
+            with open(outfile, "wt") as f:
+                for v in latest_versions:
+                    f.write(v.string + "\n")
+        except OSError as e:
+            err_exit("Error writing to %s: %s" % (outfile, e))
+        print_info("Found version %s of %s (written to %s)" % (
+            " ".join(v.string for v in latest_versions), image_name, outfile))
+
+# Version index
+#
+# --build-index converts a Docker tags list or a Helm index into an SQLite database with
+# a row for each version, and --index answers a query from such a database instead of
+# parsing the input file. Each row has the sort key of its version, encoded as bytes which
+# compare in the same order as the key. The encoding of a key begins with the encoding of
+# its major (and minor) number, so the versions for a major (and minor) number are a range
+# of keys, and the latest of them are found by scanning the database index of keys
+# backwards from the end of that range, reading only the rows that are returned.
+#
+# For a Helm index, each chart entry has a row with a NULL type (for queries which do not
+# specify one), and a row for each type it would be selected by: each path component
+# which precedes "/<chart name>/" in one of its urls. A Docker tags list is for a single
+# image, so its rows have a NULL name as well as a NULL type. Entries or tags which do not
+# have a version string are left out.
+
+INDEX_FORMAT_VERSION = 1
+
+class VersionIndexError(Exception):
+    """
+    Raised when a version index cannot be built or read.
+    """
+
+def encode_number(n):
+    # The length comes first, so that a longer (larger) number sorts after a shorter one
+    b = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    if len(b) < 255:
+        return bytes([len(b)]) + b
+    return b"\xff" + len(b).to_bytes(4, "big") + b
+
+def encode_string(s):
+    # UTF-8 preserves the order of code points. Any NUL bytes are escaped, so that the
+    # terminator sorts before every possible continuation of the string.
+    return s.encode("utf-8", "surrogatepass").replace(b"\x00", b"\x00\xff") + b"\x00\x01"
+
+def encode_key(key):
+    # Returns bytes which compare (byte by byte) in the same order as the sort key
+    ids, prerelease = key
+    parts = list()
+    for kind, value in ids:
+        if kind == 0:
+            parts.append(b"\x01" + encode_number(value))
+        else:
+            parts.append(b"\x02" + encode_string(value))
+    # The end of the identifiers sorts before any further identifier
+    parts.append(b"\x00")
+    if prerelease == NO_PRERELEASE_KEY:
+        parts.append(b"\x02")
+    else:
+        parts.append(b"\x01" + encode_key(prerelease[1]))
+    return b"".join(parts)
+
+def url_types(urls, chart):
+    # Returns the set of image types for which "/<type>/<chart>/" appears in one of the urls
+    marker = "/" + chart + "/"
+    types = set()
+    for url in urls:
+        if not isinstance(url, str):
+            continue
+        i = url.find(marker)
+        while i != -1:
+            j = url.rfind("/", 0, i)
+            if j != -1 and j + 1 < i:
+                types.add(url[j+1:i])
+            i = url.find(marker, i + 1)
+    return types
+
+def key_prefix_range(major, minor):
+    # Returns the (low, high) range of encoded keys whose first identifiers are the major
+    # (and minor) numbers. Every version which matches the prefix in find_latest_versions
+    # has a key in this range: the next byte after the prefix is 0x00 (no more identifiers),
+    # 0x01 (a numeric identifier), or 0x02 (an alphanumeric identifier).
+    prefix = b"\x01" + encode_number(major)
+    if minor != None:
+        prefix += b"\x01" + encode_number(minor)
+    return prefix, prefix + b"\x03"
+
+def index_rows(docker_helm, input_file):
+    # Generator yielding the (name, type, seq, version, standard, key) row for each
+    # version in the input file
+    if docker_helm == "docker":
+        sources = [ (None, ( (tag, list()) for tag in load_docker_tags(input_file) )) ]
+    else:
+        charts_entries = HelmIndexScanner().load_charts_entries(input_file, None)
+        sources = [ (chart, ( (entry.get("version"), entry.get("urls") or list())
+                              for entry in entries if isinstance(entry, dict) ))
+                    for chart, entries in charts_entries.items()
+                    if isinstance(chart, str) and isinstance(entries, list) ]
+    for name, versions in sources:
+        for seq, (version, urls) in enumerate(versions):
+            if not isinstance(version, str):
+                continue
+            v = Version(version)
+            key = encode_key(v.key)
+            types = url_types(urls, name) if name != None else set()
+            for image_type in [ None ] + sorted(types):
+                yield (name, image_type, seq, version, v.standard, key)
+
+def build_version_index(index_file, docker_helm, input_file):
+    # Writes the index to a temporary file which is then renamed, so that a query never
+    # sees a partially written index. Returns the number of versions indexed.
+    import sqlite3
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_file)), prefix=".tmp.")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE versions (name TEXT, type TEXT, seq INTEGER, version TEXT, "
+                         "standard INTEGER, key BLOB)")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("format", str(INDEX_FORMAT_VERSION)),
+                ("source", docker_helm),
+                ("input_file", input_file),
+                ("built", str(int(time.time()))) ])
+            conn.executemany("INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?)",
+                             index_rows(docker_helm, input_file))
+            # Creating the index after the rows are inserted is faster than maintaining it
+            conn.execute("CREATE INDEX versions_by_key ON versions "
+                         "(name, type, key, seq)")
+            count = conn.execute("SELECT COUNT(*) FROM versions WHERE type IS NULL").fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+        # mkstemp creates the file readable only by its owner, but the index is meant to
+        # be shared, so give it the usual permissions for a new file
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, index_file)
+    except (sqlite3.Error, OSError, UnicodeEncodeError) as e:
+        os.unlink(tmp_path)
+        raise VersionIndexError("Error building index %s from %s: %s" % (index_file, input_file, e))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+def query_version_index(index_file, docker_helm, image_name, image_type, major, minor, version_format_filter, top):
+    # Returns the same list of version strings as find_latest_versions would for the
+    # versions in the file that the index was built from, or raises LatestVersionError
+    # with the same message.
+    import sqlite3
+    uri = "file:%s?mode=ro" % urllib.request.pathname2url(os.path.abspath(index_file))
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            meta = dict(conn.execute("SELECT name, value FROM meta"))
+            if meta.get("format") != str(INDEX_FORMAT_VERSION):
+                raise VersionIndexError("Index %s has format %s, but format %d is required (it must be rebuilt)" % (
+                    index_file, meta.get("format"), INDEX_FORMAT_VERSION))
+            elif meta.get("source") != docker_helm:
+                raise VersionIndexError("Index %s was built from a %s file, not a %s file" % (
+                    index_file, meta.get("source"), docker_helm))
+            return query_versions(conn, docker_helm, image_name, image_type, major, minor, version_format_filter, top)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise VersionIndexError("Error reading index %s: %s" % (index_file, e))
+
+def query_versions(conn, docker_helm, image_name, image_type, major, minor, version_format_filter, top):
+    version_prefix = get_version_prefix(major, minor)
+    # Docker rows have no name or type (the type only appears in error messages)
+    if docker_helm == "docker":
+        conditions, args = [ "name IS NULL", "type IS NULL" ], list()
+    else:
+        conditions, args = [ "name = ?", "type IS ?" ], [ image_name, image_type ]
+    all_conditions, all_args = list(conditions), list(args)
+    if version_prefix:
+        conditions.append("key >= ? AND key < ?")
+        args.extend(key_prefix_range(major, minor))
+    if version_format_filter:
+        conditions.append("standard = 1")
+    elif version_prefix:
+        # Every standard version in the key range matches the prefix. Any nonstandard
+        # versions in it are matched the same way as in find_latest_versions.
+        conditions.append("(standard = 1 OR version = ? OR substr(version, 1, ?) IN (?, ?, ?))")
+        args.extend([ version_prefix, len(version_prefix) + 1 ])
+        args.extend( version_prefix + c for c in [ ".", "-", "+" ] )
+    # Of versions with the same precedence, the last one ranks highest
+    rows = conn.execute("SELECT version FROM versions WHERE %s ORDER BY key DESC, seq DESC LIMIT ?" % (
+                        " AND ".join(conditions)), args + [ top or 1 ]).fetchall()
+    if rows:
+        return [ row[0] for row in rows ]
+    # There are no versions left, so find out which stage of filtering removed them all
+    count = lambda extra: conn.execute("SELECT COUNT(*) FROM versions WHERE %s" % " AND ".join(
+                                       all_conditions + extra), all_args).fetchone()[0]
+    counts = { "all": count([]), "standard": count([ "standard = 1" ]), "prefix": 0 }
+    check_counts(counts, image_name, image_type, version_prefix, version_format_filter)
+    # check_counts always raises here, but just in case
+    raise LatestVersionError("No entries found for %s" % image_name)
+
+def main():
+    params = parse_parameters()
+
+    if params["batch_file"] != None:
+        run_batch(params["batch_file"])
+        return 0
+    elif params["build_index"] != None:
+        try:
+            count = build_version_index(params["build_index"], params["docker_helm"], params["input_file"])
+        except VersionIndexError as e:
+            err_exit(str(e))
+        print_info("Indexed %d versions from %s in %s" % (count, params["input_file"], params["build_index"]))
+        return 0
+    elif params["index_file"] != None:
+        try:
+            latest_versions = query_version_index(params["index_file"], params["docker_helm"], params["image_name"],
+                                                  params["image_type"], params["major"], params["minor"],
+                                                  params["no_version_format_filter"] != True, params["top"])
+        except (LatestVersionError, VersionIndexError) as e:
+            err_exit(str(e))
+        for v in latest_versions:
+            print(v)
+        return 0
+
+    docker_helm = params["docker_helm"]
+    input_file = params["input_file"]
+    image_name = params["image_name"]
+    image_type = params["image_type"]
+
+    # The first thing we will do is generate a list of ALL versions of our chosen image
+    if docker_helm == "docker":
+        # The Docker API call to /v2/{image_name}/tags/list returns the following JSON structure:
+        # {
+        #     "name": "image_name",
+        #     "tags": [
+        #         "tag1",
+        #         "tag2",
+        #         ...
+        all_versions = load_docker_tags(input_file)
+    elif docker_helm == "helm":
+        all_versions = chart_versions(HelmIndexScanner().load_chart_entries(input_file, image_name),
+                                      image_name, image_type)
+    else:
+        all_versions = python_versions(load_python_file_names(input_file), image_name)
+
+    # Parse each version string once, as it is needed (or all at once, into columns)
+    version_format_filter = params["no_version_format_filter"] != True
+    versions = rank_versions(docker_helm, all_versions, version_format_filter)
+    try:
+        latest_versions = versions.latest(image_name, image_type, params["major"], params["minor"],
+                                          version_format_filter, params["top"], params["constraint"])
+    except LatestVersionError as e:
+        err_exit(str(e))
+
+    for v in latest_versions:
+        print(v.string)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
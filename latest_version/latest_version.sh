@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2023 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2023, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -26,10 +26,15 @@ USAGE="\
 usage: latest_version.sh [--major x [--minor y]]
                          [--docker | --helm | --python] [--type <type>]
                          [[--server <server>] [--team <team>]  | [--url <url>]]
-                         [--outfile <file> [--overwrite]]
+                         [--mirror <server_or_url> ...] [--mirror-mode first|union]
+                         [--outfile <file> [--overwrite]] [--top <k>]
+                         [--constraint <constraint>] [--no-prereleases]
                          [--artifactory-username-var <artifactory_username_var>]
                          [--artifactory-password-var <artifactory_password_var>]
+                         [--plan <plan_file>]
                          image_name
+       latest_version.sh --run-plan <plan_file>
+       latest_version.sh --capture-plan <plan_file> <snapshot_file>
        latest_version.sh {-h || --help}"
 
 USAGE_EXTRA="\
@@ -48,10 +53,20 @@ docker: use https://artifactory.algol60.net/artifactory/<team>-docker/repository
 helm: use https://artifactory.algol60.net/artifactory/<team>-helm-charts/index.yaml
 python: use https://artifactory.algol60.net/artifactory/csm-python-modules/simple/<module_name>/
 
+--mirror may be specified any number of times, each time naming another server (if --url is not
+specified) or URL (if it is) from which the same file can be fetched. Every mirror is asked for
+the file at once. With --mirror-mode first (the default), the file from the first one to send
+all of it is used, and the others are abandoned. With --mirror-mode union, every mirror is
+waited for, and the versions in all of the files which could be fetched are used. Which mirrors
+were used and how long each took are reported, and if LATEST_VERSION_MIRROR_LOG is set, they
+are also appended to that file (see url_cache.py). The Artifactory username and password
+variables, if not specified, default to those for each mirror's server.
+
 For url, the file at the specified URL will be used.
 docker: Assumes file is in the same JSON format as the arti/algol60 repository.catalog files
 helm: Assumes file is in the same YAML format as the arti/algol60 index.yaml files
-python: Assumes directory index of .tar.gz files and -py3-none-any.whl files.
+python: Assumes PEP 503 simple index page of the module's wheel and sdist files. Versions are compared
+according to PEP 440, and only x.y.z releases and x.y.z.postN post-releases are considered.
 
 Looks in file for newest version of specified image name, and returns the version string.
 If a major is specified, it confines itself to versions of that major number.
@@ -61,7 +76,47 @@ For algol60, the type field is used within these files to distinguish between
 stable and unstable images by looking at the path to the images.
 
 Version is written to either the specified outfile or <image_name>.version if no outfile is specified.
-If the output file already exists, the script exits in error unless --overwrite is specified."
+If --top is specified, the newest k versions are written instead, one per line, newest first.
+If the output file already exists, the script exits in error unless --overwrite is specified.
+
+If --constraint is specified, only versions satisfying it are considered. A constraint is one or
+more space-separated comparators, all of which must be satisfied, such as \">=1.4.2 <2.0.0\",
+\"~1.3\" (any 1.3.x), or \"^2\" (any 2.x.y). Each comparator is a version (which may be partial,
+such as 1, 1.3, 1.x, or 1.3.x), optionally preceded by =, >, >=, <, <=, ~, or ^, as in npm's
+semver ranges (see latest_version.py), or * (or x) for any version. Pre-release versions are
+considered unless --no-prereleases is specified, except that <x.y.z also excludes the
+pre-releases of x.y.z. Neither may be specified with --python.
+
+For docker, if the registry splits the tags list into pages (giving the URL of each next page in a
+Link header), every page is fetched. If LATEST_VERSION_DOCKER_PAGE_SIZE is set (and url is not
+specified), the registry is asked for pages of that many tags.
+
+If the LATEST_VERSION_CACHE_DIR environment variable is set, downloaded files are cached in that
+directory, and a file is only transferred again if the server reports that it has changed (see
+url_cache.py). If LATEST_VERSION_CACHE_MAX_AGE is also set, a cached file which was fetched less
+than that many seconds ago is used without contacting the server at all.
+
+If the LATEST_VERSION_RESOLVER_SOCKET environment variable is set to the socket of a running
+version_resolver.py, the versions are looked up by the resolver, which keeps the files it has
+downloaded parsed in memory (see version_resolver.py). If the resolver cannot be reached, the
+versions are looked up directly, as usual.
+
+If --plan is specified, the arguments are validated, but instead of looking up the version, the
+request is appended to the specified plan file. --run-plan then carries out every request in a
+plan file, in order. Each distinct URL is downloaded only once, and the versions for all of the
+requests are found by a single call to latest_version.py, which parses each downloaded file only
+once. The URLs are downloaded concurrently by url_cache.py, up to
+LATEST_VERSION_JOBS (default 8) at a time, reusing connections to the same server. If a request
+fails, the requests before it in the plan are still completed, and the error is reported as if
+the requests had been carried out one at a time.
+
+--capture-plan downloads every URL of the requests in a plan file, without looking up any
+versions, and writes them all to a single compressed snapshot file (see snapshot.py). If the
+LATEST_VERSION_SNAPSHOT environment variable is set to such a snapshot file, nothing is downloaded:
+every URL is read from the snapshot instead (and the version resolver is not used), so no
+Artifactory username or password is needed. It is an error if a URL is not in the snapshot.
+If LATEST_VERSION_DOCKER_PAGE_SIZE was set when the snapshot was captured, it must be set to the
+same value when it is used, since it is part of the URL."
 
 MYDIR="latest_version"
 MYNAME="latest_version.sh"
@@ -131,18 +186,45 @@ else
 fi
 [ -f "${MYDIR_PATH}/$MYNAME" ] || err_exit "$MYNAME not found in directory ${MYDIR_PATH}"
 
-IMAGE_NAME=""
-MAJOR=""
-MINOR=""
-TEAM=""
-TYPE=""
-DOCK_HELM_PYTH=""
-OUTFILE=""
-OVERWRITE=N
-SERVER=""
-URL=""
-ARTIFACTORY_USERNAME_VAR=""
-ARTIFACTORY_PASSWORD_VAR=""
+function reset_arguments
+{
+    IMAGE_NAME=""
+    MAJOR=""
+    MINOR=""
+    TEAM=""
+    TYPE=""
+    DOCK_HELM_PYTH=""
+    OUTFILE=""
+    OVERWRITE=N
+    TOP=""
+    CONSTRAINT=""
+    NO_PRERELEASES=N
+    SERVER=""
+    URL=""
+    MIRRORS=()
+    MIRROR_MODE=""
+    ARTIFACTORY_USERNAME_VAR=""
+    ARTIFACTORY_PASSWORD_VAR=""
+    PLANFILE=""
+}
+
+function valid_constraint
+{
+    # Usage: valid_constraint <constraint>
+    # Checks that each space-separated word of the constraint is a comparator (or an operator,
+    # for a comparator with a space after its operator). latest_version.py checks the rest.
+    local num="(0|[1-9][0-9]*)" id="(0|[1-9][0-9]*|[-a-zA-Z0-9]*[-a-zA-Z][-a-zA-Z0-9]*)"
+    local bid="[-a-zA-Z0-9]+" op="(<|<=|>|>=|=|~|\^)" any="[*xX]" word
+    # A full version, a partial one (such as 1, 1.4, 1.x, or 1.4.x), or any version
+    local version="($num[.]$num[.]$num(-$id([.]$id)*)?([+_]$bid([.]$bid)*)?|$num([.]($num|$any)([.]$any)?)?|$any)"
+    local -a words
+    read -r -a words <<< "$1"
+    [ ${#words[@]} -gt 0 ] || return 1
+    for word in "${words[@]}"; do
+        [[ $word =~ ^($op?v?$version|$op)$ ]] || return 1
+    done
+    return 0
+}
 
 function parse_arguments
 {
@@ -172,9 +254,36 @@ function parse_arguments
                 [ $# -lt 2 ] && usage "--outfile requires an argument"
                 [ -z "$2" ] && usage "Output file may not be blank"
                 [ -e "$2" ] && [ ! -f "$2" ] && usage "Output file already exists and is not a regular file: $2"
+                [[ $2 =~ [[:cntrl:]] ]] && usage "Output file may not contain control characters: $2"
                 OUTFILE="$2"
                 shift 2
                 ;;
+            "--top")
+                [ -n "$TOP" ] && usage "--top may not be specified multiple times"
+                [ $# -lt 2 ] && usage "--top requires an argument"
+                echo "$2" | grep -Eq "^[1-9][0-9]*$" || usage "--top argument must be a positive integer. Invalid: $2"
+                TOP="$2"
+                shift 2
+                ;;
+            "--constraint")
+                [ -n "$CONSTRAINT" ] && usage "--constraint may not be specified multiple times"
+                [ $# -lt 2 ] && usage "--constraint requires an argument"
+                valid_constraint "$2" || usage "Invalid constraint: $2"
+                CONSTRAINT="$2"
+                shift 2
+                ;;
+            "--no-prereleases")
+                [ "$NO_PRERELEASES" = Y ] && usage "--no-prereleases may not be specified multiple times"
+                NO_PRERELEASES=Y
+                shift
+                ;;
+            "--plan")
+                [ -n "$PLANFILE" ] && usage "--plan may not be specified multiple times"
+                [ $# -lt 2 ] && usage "--plan requires an argument"
+                [ -z "$2" ] && usage "Plan file may not be blank"
+                PLANFILE="$2"
+                shift 2
+                ;;
             "--overwrite")
                 [ "$OVERWRITE" = Y ] && usage "--overwrite may not be specified multiple times"
                 OVERWRITE=Y
@@ -217,6 +326,22 @@ function parse_arguments
                 URL="$2"
                 shift 2
                 ;;
+            "--mirror")
+                [ $# -lt 2 ] && usage "--mirror requires an argument"
+                [ -z "$2" ] && usage "Mirror may not be blank"
+                [[ $2 =~ [[:space:][:cntrl:]] ]] && usage "Mirror may not contain spaces or control characters: $2"
+                MIRRORS+=( "$2" )
+                shift 2
+                ;;
+            "--mirror-mode")
+                [ -n "$MIRROR_MODE" ] && usage "--mirror-mode may not be specified multiple times"
+                [ $# -lt 2 ] && usage "--mirror-mode requires an argument"
+                if [ "$2" != first ] && [ "$2" != union ]; then
+                    usage "--mirror-mode argument must be first or union. Invalid mode: $2"
+                fi
+                MIRROR_MODE="$2"
+                shift 2
+                ;;
             "--artifactory-username-var")
                 [ -z "$2" ] && usage "Variable name for Artifactory username may not be blank"
                 ARTIFACTORY_USERNAME_VAR="$2"
@@ -240,6 +365,9 @@ function parse_arguments
     [ -z "$IMAGE_NAME" ] && usage "Image name must be specified"
     [ -z "$DOCK_HELM_PYTH" ] && DOCK_HELM_PYTH="docker"
     [ -n "$MINOR" ] && [ -z "$MAJOR" ] && usage "--minor may not be specified without --major"
+    if [ "${DOCK_HELM_PYTH}" == python ] && { [ -n "$CONSTRAINT" ] || [ "$NO_PRERELEASES" = Y ]; }; then
+        usage "--constraint and --no-prereleases may not be specified with --python"
+    fi
     [ -z "$OUTFILE" ] && OUTFILE="${IMAGE_NAME}.version"
     if [ -e "$OUTFILE" ]; then
         if [ ! -f "$OUTFILE" ]; then
@@ -256,31 +384,398 @@ function parse_arguments
         [ -z "$TYPE" ] && TYPE="stable"
         [ -z "$SERVER" ] && SERVER="algol60"
     fi
+    [ -n "$MIRROR_MODE" ] && [ ${#MIRRORS[@]} -eq 0 ] && usage "--mirror-mode may not be specified without --mirror"
+    [ -z "$MIRROR_MODE" ] && MIRROR_MODE=first
+    # The server of each mirror (blank for a mirror URL)
+    MIRROR_SERVERS=()
+    local mirror
+    for mirror in "${MIRRORS[@]}"; do
+        if [ -n "$URL" ]; then
+            [ "$mirror" == "$URL" ] && usage "A mirror may not be the same as the URL: $mirror"
+            MIRROR_SERVERS+=( "" )
+            continue
+        fi
+        if [ "$mirror" != "arti" ] && [ "$mirror" != "algol60" ]; then
+            usage "--mirror argument must be arti or algol60 (unless --url is specified). Invalid server: $mirror"
+        fi
+        [ "$mirror" == "$SERVER" ] && usage "A mirror may not be the same as the server: $mirror"
+        MIRROR_SERVERS+=( "$mirror" )
+    done
+    if [ ${#MIRRORS[@]} -gt 0 ] && [ $(printf "%s\n" "${MIRRORS[@]}" | sort -u | wc -l) -ne ${#MIRRORS[@]} ]; then
+        usage "The same mirror may not be specified multiple times"
+    fi
     # For arti, use HPE_ARTIFACTORY_USR/PSW vars provided by DST pipeline.
+    # Unless they were specified, each mirror uses the variables for its own server.
+    MIRROR_USERNAME_VARS=()
+    MIRROR_PASSWORD_VARS=()
+    for mirror in "${MIRROR_SERVERS[@]}"; do
+        MIRROR_USERNAME_VARS+=( "${ARTIFACTORY_USERNAME_VAR:-$([ "$mirror" == "arti" ] && echo HPE_ARTIFACTORY_USR || echo ARTIFACTORY_USERNAME)}" )
+        MIRROR_PASSWORD_VARS+=( "${ARTIFACTORY_PASSWORD_VAR:-$([ "$mirror" == "arti" ] && echo HPE_ARTIFACTORY_PSW || echo ARTIFACTORY_PASSWORD)}" )
+    done
     [ -z "$ARTIFACTORY_USERNAME_VAR" ] && ARTIFACTORY_USERNAME_VAR=$([ "$SERVER" == "arti" ] && echo HPE_ARTIFACTORY_USR || echo ARTIFACTORY_USERNAME)
     [ -z "$ARTIFACTORY_PASSWORD_VAR" ] && ARTIFACTORY_PASSWORD_VAR=$([ "$SERVER" == "arti" ] && echo HPE_ARTIFACTORY_PSW || echo ARTIFACTORY_PASSWORD)
-    [ -z "${!ARTIFACTORY_USERNAME_VAR}" ] && usage "Artifactory username must be specified via ${ARTIFACTORY_USERNAME_VAR} environment variable. Variable name may be adjusted via --artifactory-username-var parameter."
-    [ -z "${!ARTIFACTORY_PASSWORD_VAR}" ] && usage "Artifactory password must be specified via ${ARTIFACTORY_PASSWORD_VAR} environment variable. Variable name may be adjusted via --artifactory-password-var parameter."
+    # Nothing is downloaded when using a snapshot
+    [ -n "$LATEST_VERSION_SNAPSHOT" ] && return 0
+    local var
+    for var in "$ARTIFACTORY_USERNAME_VAR" "${MIRROR_USERNAME_VARS[@]}"; do
+        [ -z "${!var}" ] && usage "Artifactory username must be specified via ${var} environment variable. Variable name may be adjusted via --artifactory-username-var parameter."
+    done
+    for var in "$ARTIFACTORY_PASSWORD_VAR" "${MIRROR_PASSWORD_VARS[@]}"; do
+        [ -z "${!var}" ] && usage "Artifactory password must be specified via ${var} environment variable. Variable name may be adjusted via --artifactory-password-var parameter."
+    done
+    return 0
 }
 
-parse_arguments "$@"
-if [ -z "$URL" ]; then
-    if [ "$SERVER" = "arti" ]; then
+function set_url
+{
+    # If URL is not specified, construct it from the server, team, and type. Sets MIRROR_URLS
+    # to the URL of each mirror.
+    local mirror
+    MIRROR_URLS=()
+    for mirror in "${MIRRORS[@]}"; do
+        if [ -n "$URL" ]; then
+            MIRROR_URLS+=( "$mirror" )
+        else
+            MIRROR_URLS+=( "$(server_url "$mirror")" )
+        fi
+    done
+    [ -z "$URL" ] && URL=$(server_url "$SERVER")
+    return 0
+}
+
+function server_url
+{
+    # Usage: server_url <server>
+    # Prints the URL of the file to use on the server
+    local url
+    if [ "$1" = "arti" ]; then
         case "${DOCK_HELM_PYTH}" in
-            "docker") URL="https://arti.hpc.amslabs.hpecorp.net/artifactory/api/docker/${TEAM}-docker-${TYPE}-local/v2/${IMAGE_NAME}/tags/list" ;;
-            "helm")   URL="https://arti.hpc.amslabs.hpecorp.net/artifactory/${TEAM}-helm-${TYPE}-local/index.yaml" ;;
-            "python") URL="https://arti.hpc.amslabs.hpecorp.net/artifactory/csm-python-modules-local/simple/${IMAGE_NAME}/" ;;
+            "docker") url="https://arti.hpc.amslabs.hpecorp.net/artifactory/api/docker/${TEAM}-docker-${TYPE}-local/v2/${IMAGE_NAME}/tags/list" ;;
+            "helm")   url="https://arti.hpc.amslabs.hpecorp.net/artifactory/${TEAM}-helm-${TYPE}-local/index.yaml" ;;
+            "python") url="https://arti.hpc.amslabs.hpecorp.net/artifactory/csm-python-modules-local/simple/${IMAGE_NAME}/" ;;
         esac
     else
         # algol60
         case "${DOCK_HELM_PYTH}" in
-            "docker") URL="https://artifactory.algol60.net/artifactory/api/docker/${TEAM}-docker/v2/${TYPE}/${IMAGE_NAME}/tags/list" ;;
-            "helm")   URL="https://artifactory.algol60.net/artifactory/${TEAM}-helm-charts/index.yaml" ;;
-            "python") URL="https://artifactory.algol60.net/artifactory/csm-python-modules/simple/${IMAGE_NAME}/" ;;
+            "docker") url="https://artifactory.algol60.net/artifactory/api/docker/${TEAM}-docker/v2/${TYPE}/${IMAGE_NAME}/tags/list" ;;
+            "helm")   url="https://artifactory.algol60.net/artifactory/${TEAM}-helm-charts/index.yaml" ;;
+            "python") url="https://artifactory.algol60.net/artifactory/csm-python-modules/simple/${IMAGE_NAME}/" ;;
         esac
     fi
+    # Ask the registry for tags lists in pages of the specified size (it may use smaller ones)
+    if [ "${DOCK_HELM_PYTH}" == docker ] && [ -n "$LATEST_VERSION_DOCKER_PAGE_SIZE" ]; then
+        url+="?n=${LATEST_VERSION_DOCKER_PAGE_SIZE}"
+    fi
+    echo "$url"
+}
+
+function download
+{
+    # Usage: download <file>
+    # Downloads $URL to the specified file (or extracts it from LATEST_VERSION_SNAPSHOT)
+    #
+    # A Docker registry may split the tags list into pages, which curl cannot follow, so
+    # url_cache.py is always used for docker
+    local -a cache_args=() paginate_args=()
+    echo "latest_version.sh: url=$URL" 1>&2
+    if [ -n "$LATEST_VERSION_SNAPSHOT" ]; then
+        "$MYDIR_PATH/snapshot.py" --extract "$LATEST_VERSION_SNAPSHOT" <(printf "%s\t%s\n" "$URL" "$1") || exit 1
+        return 0
+    fi
+    if [ -n "$LATEST_VERSION_CACHE_DIR" ]; then
+        cache_args=( --cache-dir "$LATEST_VERSION_CACHE_DIR" --max-age "${LATEST_VERSION_CACHE_MAX_AGE:-0}" )
+    fi
+    [ "${DOCK_HELM_PYTH}" == docker ] && paginate_args=( --paginate )
+    if [ ${#cache_args[@]} -gt 0 ] || [ ${#paginate_args[@]} -gt 0 ]; then
+        if ! "$MYDIR_PATH/url_cache.py" "${cache_args[@]}" "${paginate_args[@]}" \
+                --username-var "$ARTIFACTORY_USERNAME_VAR" --password-var "$ARTIFACTORY_PASSWORD_VAR" \
+                "$URL" "$1" ; then
+            err_exit "Command failed: url_cache.py ${cache_args[*]} ${paginate_args[*]} $URL $1"
+        fi
+        return 0
+    fi
+    if ! curl -sSf -u "${!ARTIFACTORY_USERNAME_VAR}:${!ARTIFACTORY_PASSWORD_VAR}" -o "$1" "$URL" 1>&2 ; then
+        err_exit "Command failed: curl -sSf -o $1 $URL"
+    fi
+}
+
+function lvpy_type
+{
+    # Usage: lvpy_type [<server>]
+    # Prints the type to pass to latest_version.py, if any, for the file from the specified
+    # server (by default, $SERVER).
+    # Even if it is set, we do not pass in the type argument if we are
+    # using arti, because for arti the type is baked into the URL itself.
+    # Python module indexes do not distinguish types at all.
+    if [ -n "$TYPE" ] && [ "${1-$SERVER}" != "arti" ] && [ "${DOCK_HELM_PYTH}" != python ]; then
+        echo "$TYPE"
+    fi
+}
+
+function write_versions
+{
+    if [ -z "$TOP" ]; then
+        info "Found version ${UEV} of ${IMAGE_NAME}"
+    else
+        info "Found latest versions of ${IMAGE_NAME}:" ${UEV}
+    fi
+    echo "$UEV" > $OUTFILE && return 0
+    info "ERROR: Error writing to $OUTFILE"
+    return 1
+}
+
+function resolve
+{
+    # Usage: resolve <request_file>
+    # If LATEST_VERSION_RESOLVER_SOCKET is the socket of a running version_resolver.py,
+    # has it carry out the requests in the file (in the format of its --query option),
+    # and returns 0. Returns 1 if there is no resolver to use, so the caller can look the
+    # versions up itself. If the resolver reports an error, exits in error.
+    [ -n "$LATEST_VERSION_RESOLVER_SOCKET" ] && [ -S "$LATEST_VERSION_RESOLVER_SOCKET" ] || return 1
+    # A snapshot must give the same versions every time, whatever the resolver has seen since
+    [ -z "$LATEST_VERSION_SNAPSHOT" ] || return 1
+    "$MYDIR_PATH/version_resolver.py" --query --socket "$LATEST_VERSION_RESOLVER_SOCKET" < "$1"
+    case $? in
+        0)  return 0 ;;
+        2)  info "Version resolver unavailable; looking up versions directly"
+            return 1 ;;
+        *)  exit 1 ;;
+    esac
+}
+
+function no_prereleases_field
+{
+    # Prints the no-prereleases field of a batch or resolver request
+    [ "$NO_PRERELEASES" = Y ] && echo no-prereleases
+}
+
+function resolver_request
+{
+    # Prints the request for version_resolver.py --query for the current arguments
+    printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n" "${DOCK_HELM_PYTH}" "$URL" \
+        "$ARTIFACTORY_USERNAME_VAR" "$ARTIFACTORY_PASSWORD_VAR" "${IMAGE_NAME}" "$(lvpy_type)" "$MAJOR" \
+        "$MINOR" "$TOP" "$CONSTRAINT" "$(no_prereleases_field)" "$OUTFILE"
+}
+
+function run_batch
+{
+    # Usage: run_batch <batch_file>
+    # Finds the versions for the requests in the batch file, then empties it
+    [ -s "$1" ] || return 0
+    "$MYDIR_PATH/latest_version.py" --batch "$1" || exit 1
+    : > "$1" || err_exit "Unable to truncate $1"
+}
+
+function run_plan
+{
+    # Usage: run_plan <plan_file> [<snapshot_file>]
+    # Each line of the plan file is a quoted list of arguments to this script
+    #
+    # First every request is parsed, and every distinct URL is downloaded, several at a
+    # time. Then the requests are carried out in order. If a request fails, every request
+    # before it is still completed, just as if they had been carried out one at a time.
+    #
+    # If a snapshot file is specified, the downloaded URLs are written to it instead, and no
+    # requests are carried out.
+    local plan="$1" snapshot="$2" line args tmpdir batchfile listfile snapshotlist requestfile key
+    local group mirror_field url file source
+    local -a dhp groups images majors minors tops constraints noprereleases outfiles urls modes
+    local -a mirror_urls mirror_username_vars mirror_password_vars
+    local -A downloaded types
+    # Each download group is a URL and its mirrors, if any. Mirror j of group n is downloaded
+    # from group_urls[n.j] to group_files[n.j], and group_sizes[n] is the number of mirrors.
+    # The type to pass to latest_version.py for mirror j of request r is types[r.j].
+    local -A group_urls group_files
+    local -a group_sizes
+    local -i n=0 r=0 i j have_mirrors=0
+    [ -f "$plan" ] || err_exit "Plan file does not exist or is not a regular file: $plan"
+    tmpdir=$(mktemp -d /tmp/.latest_version.sh.$$.XXXXXX) || err_exit "Unable to create temporary directory"
+    trap "rm -rf $tmpdir" EXIT
+    batchfile="$tmpdir/batch"
+    listfile="$tmpdir/list"
+    snapshotlist="$tmpdir/snapshot"
+    requestfile="$tmpdir/requests"
+    : > "$batchfile" || err_exit "Unable to create $batchfile"
+    : > "$listfile" || err_exit "Unable to create $listfile"
+    : > "$snapshotlist" || err_exit "Unable to create $snapshotlist"
+    : > "$requestfile" || err_exit "Unable to create $requestfile"
+    while IFS= read -r line ; do
+        [ -z "$line" ] && continue
+        eval "args=( $line )" || err_exit "Invalid line in plan file $plan: $line"
+        reset_arguments
+        parse_arguments "${args[@]}"
+        set_url
+        resolver_request >> "$requestfile" || err_exit "Error writing to $requestfile"
+        # The URL is mirror 0, followed by any others
+        mirror_urls=( "$URL" "${MIRROR_URLS[@]}" )
+        mirror_username_vars=( "$ARTIFACTORY_USERNAME_VAR" "${MIRROR_USERNAME_VARS[@]}" )
+        mirror_password_vars=( "$ARTIFACTORY_PASSWORD_VAR" "${MIRROR_PASSWORD_VARS[@]}" )
+        types[$r.0]="$(lvpy_type)"
+        for ((j=1; j<${#mirror_urls[@]}; j++)); do
+            types[$r.$j]="$(lvpy_type "${MIRROR_SERVERS[j-1]}")"
+        done
+        [ ${#MIRRORS[@]} -gt 0 ] && have_mirrors=1
+        # Each URL (or set of mirrors) is only downloaded once (for each set of credentials)
+        key="${MIRROR_MODE}"
+        for ((j=0; j<${#mirror_urls[@]}; j++)); do
+            key+=" ${mirror_username_vars[j]} ${mirror_password_vars[j]} ${mirror_urls[j]}"
+        done
+        group="${downloaded[$key]}"
+        if [ -z "$group" ]; then
+            n+=1
+            group=$n
+            group_sizes[n]=${#mirror_urls[@]}
+            for ((j=0; j<${#mirror_urls[@]}; j++)); do
+                url="${mirror_urls[j]}"
+                file="$tmpdir/$n.$j"
+                echo "latest_version.sh: url=$url" 1>&2
+                # Docker tags lists may be split into pages
+                printf "%s\t%s\t%s\t%s\t%s%s%s\n" "$n" "$url" "$file" "${mirror_username_vars[j]}" \
+                    "${mirror_password_vars[j]}" "$([ "${DOCK_HELM_PYTH}" == docker ] && printf "\tpaginate")" \
+                    "$([ "${MIRROR_MODE}" == union ] && printf "\tunion")" >> "$listfile" ||
+                    err_exit "Error writing to $listfile"
+                printf "%s\t%s\t%s\n" "$url" "$file" "${DOCK_HELM_PYTH}" >> "$snapshotlist" ||
+                    err_exit "Error writing to $snapshotlist"
+                group_urls[$n.$j]="$url"
+                group_files[$n.$j]="$file"
+            done
+            downloaded[$key]=$n
+        fi
+        dhp[r]="${DOCK_HELM_PYTH}"
+        groups[r]="$group"
+        images[r]="${IMAGE_NAME}"
+        majors[r]="$MAJOR"
+        minors[r]="$MINOR"
+        tops[r]="$TOP"
+        constraints[r]="$CONSTRAINT"
+        noprereleases[r]="$(no_prereleases_field)"
+        outfiles[r]="$OUTFILE"
+        urls[r]="$URL"
+        modes[r]="${MIRROR_MODE}"
+        r+=1
+    done < "$plan"
+    [ $r -eq 0 ] && return 0
+
+    # A running version resolver may already have every URL parsed (it does not use mirrors)
+    [ -z "$snapshot" ] && [ $have_mirrors -eq 0 ] && resolve "$requestfile" && return 0
+
+    # Download every URL, racing the mirrors of each. url_cache.py (or snapshot.py) reports any
+    # failure itself, and a file is only created if its download succeeded (and, for a race, it
+    # was the one used), so failures are dealt with below, in plan order.
+    if [ -n "$LATEST_VERSION_SNAPSHOT" ]; then
+        "$MYDIR_PATH/snapshot.py" --extract --if-present "$LATEST_VERSION_SNAPSHOT" "$snapshotlist"
+    else
+        local -a cache_args=() log_args=()
+        if [ -n "$LATEST_VERSION_CACHE_DIR" ]; then
+            cache_args=( --cache-dir "$LATEST_VERSION_CACHE_DIR" --max-age "${LATEST_VERSION_CACHE_MAX_AGE:-0}" )
+        fi
+        [ -n "$LATEST_VERSION_MIRROR_LOG" ] && log_args=( --timing-log "$LATEST_VERSION_MIRROR_LOG" )
+        "$MYDIR_PATH/url_cache.py" "${cache_args[@]}" "${log_args[@]}" --jobs "${LATEST_VERSION_JOBS:-8}" \
+            --mirrors "$listfile"
+    fi
+
+    if [ -n "$snapshot" ]; then
+        for ((i=0; i<r; i++)); do
+            group="${groups[i]}"
+            for ((j=0; j<group_sizes[group]; j++)); do
+                [ -f "${group_files[$group.$j]}" ] && continue 2
+            done
+            err_exit "Unable to download ${urls[i]}"
+        done
+        # Only the mirrors which were used are captured
+        while IFS=$'\t' read -r url file source; do
+            [ -f "$file" ] && printf "%s\t%s\t%s\n" "$url" "$file" "$source"
+        done < "$snapshotlist" > "$tmpdir/capture" || err_exit "Error writing to $tmpdir/capture"
+        "$MYDIR_PATH/snapshot.py" --create "$snapshot" "$tmpdir/capture" || exit 1
+        return 0
+    fi
+
+    # Test to see if yaml module is available
+    for ((i=0; i<r; i++)); do
+        [ "${dhp[i]}" == helm ] || continue
+        . "${CMS_META_TOOLS_PATH}/utils/pyyaml.sh"
+        break
+    done
+
+    for ((i=0; i<r; i++)); do
+        # The requests for latest_version.py are tab-separated, in the order expected by its
+        # --batch option. With --mirror-mode union, each further mirror which was downloaded
+        # is added on a mirror line. Otherwise the first mirror that was downloaded is used
+        # (only one is, unless they came from a snapshot).
+        group="${groups[i]}"
+        mirror_field=""
+        for ((j=0; j<group_sizes[group]; j++)); do
+            [ -f "${group_files[$group.$j]}" ] || continue
+            printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n" "${dhp[i]}" "${group_files[$group.$j]}" \
+                "${images[i]}" "${types[$i.$j]}" "${majors[i]}" "${minors[i]}" "${tops[i]}" "${constraints[i]}" \
+                "${noprereleases[i]}" "${outfiles[i]}" "$mirror_field" >> "$batchfile" ||
+                err_exit "Error writing to $batchfile"
+            mirror_field=mirror
+            [ "${modes[i]}" == union ] || break
+        done
+        if [ -z "$mirror_field" ]; then
+            run_batch "$batchfile"
+            if [ ${group_sizes[group]} -gt 1 ]; then
+                err_exit "Unable to download ${urls[i]} or any of its mirrors"
+            fi
+            err_exit "Unable to download ${urls[i]}"
+        fi
+    done
+    run_batch "$batchfile"
+}
+
+if [ "$1" == "--run-plan" ]; then
+    [ $# -eq 2 ] || usage "--run-plan requires exactly one argument, and no other arguments may be specified"
+    [ -z "$2" ] && usage "Plan file may not be blank"
+    run_plan "$2"
+    exit 0
+elif [ "$1" == "--capture-plan" ]; then
+    [ $# -eq 3 ] || usage "--capture-plan requires exactly two arguments, and no other arguments may be specified"
+    [ -z "$2" ] && usage "Plan file may not be blank"
+    [ -z "$3" ] && usage "Snapshot file may not be blank"
+    [ -n "$LATEST_VERSION_SNAPSHOT" ] && usage "--capture-plan may not be used when LATEST_VERSION_SNAPSHOT is set"
+    run_plan "$2" "$3"
+    exit 0
 fi
 
+reset_arguments
+parse_arguments "$@"
+
+if [ -n "$PLANFILE" ]; then
+    # Record the request (minus the --plan argument) in the plan file, to be run later
+    line=""
+    while [ $# -gt 0 ]; do
+        if [ "$1" == "--plan" ]; then
+            shift 2
+            continue
+        fi
+        line+="$(printf "%q" "$1") "
+        shift
+    done
+    echo "$line" >> "$PLANFILE" || err_exit "Error writing to $PLANFILE"
+    info "Added request for ${IMAGE_NAME} to $PLANFILE"
+    exit 0
+fi
+
+if [ ${#MIRRORS[@]} -gt 0 ]; then
+    # The mirrors are raced as they are for a plan, so carry out the request as a plan of one
+    PLANFILE=$(mktemp /tmp/.latest_version.sh.$$.XXXXXX.plan) || err_exit "Unable to create plan file"
+    line=""
+    for arg in "$@"; do
+        line+="$(printf "%q" "$arg") "
+    done
+    echo "$line" > "$PLANFILE" || err_exit "Error writing to $PLANFILE"
+    ( run_plan "$PLANFILE" )
+    rc=$?
+    rm -f "$PLANFILE"
+    exit $rc
+fi
+
+set_url
+
+# A running version resolver may already have the URL parsed
+resolve <(resolver_request) && exit 0
+
 case "${DOCK_HELM_PYTH}" in
     "docker")   TMPFILE="/tmp/.latest_version.sh.$$.$RANDOM.repository.catalog.json" ;;
     "helm")     # Test to see if yaml module is available
@@ -290,45 +785,33 @@ case "${DOCK_HELM_PYTH}" in
 esac
 
 trap "rm -f $TMPFILE" EXIT
-echo "latest_version.sh: url=$URL" 1>&2
+download "$TMPFILE"
 
-if ! curl -sSf -u "${!ARTIFACTORY_USERNAME_VAR}:${!ARTIFACTORY_PASSWORD_VAR}" -o "$TMPFILE" "$URL" 1>&2 ; then
-    err_exit "Command failed: curl -sSf -o $TMPFILE $URL"
-fi
+# Construct our list of optional arguments to latest_version.py
+OPTIONAL_ARGS=()
 
-if [ "${DOCK_HELM_PYTH}" == python ]; then
-    # Extract just the version strings from the index, sort them by version, take the first one
-    # Some of the Python package files used underscores instead of dashes, so we will search for either.
-    image_regex=${IMAGE_NAME//[-_]/[-_]}
-    version_regex="^"
-    if [[ -n ${MAJOR} ]]; then
-        version_regex+="${MAJOR}[.]"
-        [[ -n ${MINOR} ]] && version_regex+="${MINOR}[.]"
-    fi
-    UEV=$(grep -Eo "\"${image_regex}-([0-9]+[.]){2}[0-9]+(-py3-none-any[.]whl|[.]tar[.]gz)\"" "${TMPFILE}" |
-            sed -e "s/^\"${image_regex}-//" -e "s/-py3-none-any[.]whl\"$//" -e "s/[.]tar[.]gz\"$//" |
-            grep -E "${version_regex}" | sort -uVr | head -1)
-    [[ ! $UEV =~ ^[0-9]+[.][0-9]+[.][0-9]+$ ]] && err_exit "Unable to determine latest available version of ${IMAGE_NAME} Python module"
-else
-    # Construct our list of optional arguments to latest_version.py
-    OPTIONAL_ARGS=""
-
-    # Even if it is set, we do not pass in the type argument if we are
-    # using arti, because for arti the type is baked into the URL itself
-    if [ -n "$TYPE" ] && [ "$SERVER" != "arti" ]; then
-        OPTIONAL_ARGS="${OPTIONAL_ARGS} --type $TYPE"
-    fi
-    if [ -n "$MAJOR" ]; then
-        OPTIONAL_ARGS="${OPTIONAL_ARGS} --major $MAJOR"
-        if [ -n "$MINOR" ]; then
-            OPTIONAL_ARGS="${OPTIONAL_ARGS} --minor $MINOR"
-        fi
+LVPY_TYPE=$(lvpy_type)
+if [ -n "$LVPY_TYPE" ]; then
+    OPTIONAL_ARGS+=(--type "$LVPY_TYPE")
+fi
+if [ -n "$MAJOR" ]; then
+    OPTIONAL_ARGS+=(--major "$MAJOR")
+    if [ -n "$MINOR" ]; then
+        OPTIONAL_ARGS+=(--minor "$MINOR")
     fi
-
-    # Now call latest_version.py located in this directory
-    UEV=$("$MYDIR_PATH/latest_version.py" "--${DOCK_HELM_PYTH}" --file "$TMPFILE" --image "${IMAGE_NAME}" ${OPTIONAL_ARGS}) || exit 1
 fi
+if [ -n "$TOP" ]; then
+    OPTIONAL_ARGS+=(--top "$TOP")
+fi
+if [ -n "$CONSTRAINT" ]; then
+    OPTIONAL_ARGS+=(--constraint "$CONSTRAINT")
+fi
+if [ "$NO_PRERELEASES" = Y ]; then
+    OPTIONAL_ARGS+=(--no-prereleases)
+fi
+
+# Now call latest_version.py located in this directory
+UEV=$("$MYDIR_PATH/latest_version.py" "--${DOCK_HELM_PYTH}" --file "$TMPFILE" --image "${IMAGE_NAME}" "${OPTIONAL_ARGS[@]}") || exit 1
 
-info "Found version ${UEV} of ${IMAGE_NAME}"
-echo "$UEV" > $OUTFILE && exit 0
-err_exit "Error writing to $OUTFILE"
+write_versions || exit 1
+exit 0
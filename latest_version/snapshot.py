@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2026 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Usage: snapshot.py --create snapshot_file list_file
+#        snapshot.py --extract [--if-present] snapshot_file list_file
+#        snapshot.py --contents snapshot_file
+#
+# A snapshot is a single compressed file holding a copy of every index document (Docker tags
+# list, Helm index, or Python simple index page) needed to look up the versions of a set of
+# images, so that they can later be looked up again without any network access: for
+# example, to rebuild exactly the same versions, to build where the server cannot be reached,
+# or to time version lookups without a live server.
+#
+# With --create, each line of list_file is a tab-separated url, file, and source (docker, helm,
+# or python), and snapshot_file is written with a copy of each file, stored under its url.
+# latest_version.sh --capture-plan creates snapshots this way.
+#
+# With --extract, each line of list_file is a tab-separated url and output file (optionally
+# followed by the source, which is ignored), and the document stored under each url is
+# written to its output file. Only the documents which are extracted are decompressed. The
+# result for each url is reported in the order of list_file, stopping at the first one which
+# is not in the snapshot, unless --if-present is specified, in which case the urls which are
+# not in the snapshot are just reported. The output file of a url which is not in the snapshot
+# is never created. latest_version.sh does this when LATEST_VERSION_SNAPSHOT is set.
+#
+# With --contents, the url, source, and size of each document in the snapshot are printed.
+#
+# A snapshot is a ZIP file. Each document is a separately deflated member, so any one of them
+# can be read without decompressing the others, and the file manifest.json lists the url,
+# source, member name, and size of each document, and when the snapshot was created.
+#
+# The same functionality is available to other Python tools through the Snapshot class and
+# the create_snapshot function.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+MANIFEST = "manifest.json"
+
+# Incremented if the layout of snapshots changes incompatibly
+FORMAT_VERSION = 1
+
+SOURCES = { "docker", "helm", "python" }
+
+def print_err(s):
+    print("snapshot.py: ERROR: " + s, file=sys.stderr)
+
+def print_info(s):
+    print("snapshot.py: " + s, file=sys.stderr)
+
+def err_exit(*msgs):
+    for m in msgs:
+        print_err(m)
+    sys.exit(1)
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot cannot be read or written, or does not hold a requested document.
+    """
+
+def create_snapshot(snapshot_file, documents):
+    """
+    Writes a snapshot of the documents, a list of (url, file, source) tuples, to snapshot_file.
+    If the same url is listed more than once, the first file is used. The snapshot is written
+    to a temporary file which is then renamed into place, so a partially written snapshot is
+    never left behind.
+
+    Raises SnapshotError if any of the files cannot be read or the snapshot cannot be written.
+    """
+    manifest = { "format": FORMAT_VERSION,
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                 "documents": dict() }
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(snapshot_file)), prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "wb") as out, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as snapshot:
+            for url, file_name, source in documents:
+                if url in manifest["documents"]:
+                    continue
+                member = "documents/%d" % (len(manifest["documents"]) + 1)
+                snapshot.write(file_name, member)
+                manifest["documents"][url] = { "source": source, "member": member,
+                                               "size": snapshot.getinfo(member).file_size }
+            snapshot.writestr(MANIFEST, json.dumps(manifest, indent=2, sort_keys=True))
+        # mkstemp makes the file private, but a snapshot is meant to be shared like any other file
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, snapshot_file)
+    except OSError as e:
+        raise SnapshotError("Error writing %s: %s" % (snapshot_file, e))
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return manifest
+
+class Snapshot(object):
+    """
+    A snapshot opened for reading. Only the manifest is read when it is opened; each document
+    is decompressed only when it is opened or extracted.
+
+    Raises SnapshotError if snapshot_file cannot be read or is not a snapshot.
+    """
+    def __init__(self, snapshot_file):
+        self.snapshot_file = snapshot_file
+        try:
+            self.zip_file = zipfile.ZipFile(snapshot_file, "r")
+        except (OSError, zipfile.BadZipFile) as e:
+            raise SnapshotError("Error reading snapshot %s: %s" % (snapshot_file, e))
+        try:
+            manifest = json.loads(self.zip_file.read(MANIFEST).decode())
+            if manifest["format"] != FORMAT_VERSION:
+                raise SnapshotError("Snapshot %s has unsupported format %s" % (snapshot_file, manifest["format"]))
+            self.created = manifest["created"]
+            self.documents = manifest["documents"]
+        except SnapshotError:
+            self.close()
+            raise
+        except (KeyError, TypeError, ValueError, zipfile.BadZipFile) as e:
+            self.close()
+            raise SnapshotError("Invalid manifest in snapshot %s: %s" % (snapshot_file, e))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.zip_file.close()
+
+    def open(self, url):
+        """
+        Returns a binary file object from which the document stored under url is read
+        (decompressing it as it is read). Raises SnapshotError if there is none.
+        """
+        document = self.documents.get(url)
+        if document is None:
+            raise SnapshotError("%s is not in snapshot %s" % (url, self.snapshot_file))
+        try:
+            return self.zip_file.open(document["member"])
+        except (KeyError, zipfile.BadZipFile) as e:
+            raise SnapshotError("Error reading %s from snapshot %s: %s" % (url, self.snapshot_file, e))
+
+    def extract(self, url, dest):
+        """
+        Writes the document stored under url to dest. Raises SnapshotError if there is none,
+        or if it cannot be read or written.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix=".tmp.")
+        try:
+            with os.fdopen(fd, "wb") as out, self.open(url) as document:
+                shutil.copyfileobj(document, out)
+            os.replace(tmp_path, dest)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise SnapshotError("Error extracting %s from snapshot %s to %s: %s" % (url, self.snapshot_file, dest, e))
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+def read_list_file(list_file, create):
+    # Returns the list of (url, file, source) tuples in the list file. The source is required
+    # to create a snapshot, and is otherwise optional (and None if not given).
+    documents = list()
+    try:
+        with open(list_file, "rt") as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                fields = line.split("\t")
+                if len(fields) not in ({ 3 } if create else { 2, 3 }) or not all(fields):
+                    err_exit("Line %d of %s must have a url, a file, and %s source, separated by tabs: %s" % (
+                        line_number, list_file, "a" if create else "optionally a", line))
+                if len(fields) == 3 and fields[2] not in SOURCES:
+                    err_exit("Line %d of %s: source must be docker, helm, or python. Invalid: %s" % (
+                        line_number, list_file, fields[2]))
+                documents.append((fields[0], fields[1], fields[2] if len(fields) == 3 else None))
+    except OSError as e:
+        err_exit("Error reading %s: %s" % (list_file, e))
+    return documents
+
+def parse_parameters(args):
+    if_present = args[:2] == [ "--extract", "--if-present" ]
+    if if_present:
+        args = args[:1] + args[2:]
+    if len(args) == 3 and args[0] in { "--create", "--extract" }:
+        mode, snapshot_file, list_file = args
+    elif len(args) == 2 and args[0] == "--contents":
+        (mode, snapshot_file), list_file = args, None
+    else:
+        err_exit("Usage: snapshot.py --create snapshot_file list_file",
+                 "       snapshot.py --extract [--if-present] snapshot_file list_file",
+                 "       snapshot.py --contents snapshot_file")
+    if not snapshot_file or list_file == "":
+        err_exit("Snapshot and list files may not be blank")
+    return { "mode": mode[2:], "snapshot_file": snapshot_file, "list_file": list_file,
+             "if_present": if_present }
+
+def create(params):
+    documents = read_list_file(params["list_file"], True)
+    try:
+        manifest = create_snapshot(params["snapshot_file"], documents)
+    except SnapshotError as e:
+        err_exit(str(e))
+    print_info("Wrote %d documents to %s" % (len(manifest["documents"]), params["snapshot_file"]))
+    return 0
+
+def extract(params):
+    documents = read_list_file(params["list_file"], False)
+    try:
+        snapshot = Snapshot(params["snapshot_file"])
+    except SnapshotError as e:
+        err_exit(str(e))
+    with snapshot:
+        # Extract every document that is there, and then report the results in order
+        errors = dict()
+        for url, dest, _ in documents:
+            try:
+                snapshot.extract(url, dest)
+            except SnapshotError as e:
+                errors[url] = e
+        for url, dest, _ in documents:
+            if url in errors and params["if_present"] and url not in snapshot.documents:
+                print_info("not in snapshot: %s" % url)
+                continue
+            elif url in errors:
+                err_exit(str(errors[url]))
+            print_info("extracted from snapshot created %s: %s" % (snapshot.created, url))
+    return 0
+
+def contents(params):
+    try:
+        snapshot = Snapshot(params["snapshot_file"])
+    except SnapshotError as e:
+        err_exit(str(e))
+    with snapshot:
+        print("# Created %s" % snapshot.created)
+        for url in sorted(snapshot.documents):
+            document = snapshot.documents[url]
+            print("%s\t%s\t%d" % (url, document["source"], document["size"]))
+    return 0
+
+def main(args):
+    params = parse_parameters(args)
+    return { "create": create, "extract": extract, "contents": contents }[params["mode"]](params)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2026 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Checks that VersionColumns (the NumPy ranking used for very large version lists) picks exactly
+the same versions as select_latest and select_top do from parsed Versions.
+
+Usage: test_version_columns.py (or python3 -m unittest test_version_columns)
+
+The checks are skipped if NumPy is not installed.
+"""
+
+import itertools
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import latest_version as lv
+
+NUMPY = lv.load_numpy()
+
+# Pre-release versions covering: none at all, numeric vs alphanumeric identifiers, numbers
+# compared by value (2 < 11), and shorter pre-releases padded against longer ones (alpha <
+# alpha.1 < alpha.beta)
+PRERELEASES = [ None, "alpha", "alpha.1", "alpha.2", "alpha.11", "alpha.beta", "alpha.1.x", "beta",
+                "beta.2", "beta.11", "rc.1", "1", "2", "10", "1.alpha", "0", "Alpha", "alpha-1",
+                "99999999999999999999" ]
+
+# Build metadata never affects precedence, so these make versions which tie
+BUILDS = [ None, "build.1", "x2" ]
+
+def version_strings(seed):
+    # Returns a shuffled list of version strings, with duplicates, ties, and nonstandard versions
+    strings = list()
+    for major, minor, patch, prerelease, build in itertools.product(
+            [ 0, 1, 2, 10 ], [ 0, 3 ], [ 0, 1, 9, 12 ], PRERELEASES, BUILDS):
+        s = "%d.%d.%d" % (major, minor, patch)
+        if prerelease is not None:
+            s += "-" + prerelease
+        if build is not None:
+            s += ("+" if build != "x2" else "_") + build
+        strings.append(s)
+    strings += [ "1.3.9", "1.3.9", "2.0.0-rc.1", "latest", "1.2", "v1.0.0", "01.2.3", "1.0.0-01" ]
+    random.Random(seed).shuffle(strings)
+    return strings
+
+@unittest.skipIf(NUMPY is None, "NumPy is not installed")
+class VersionColumnsTest(unittest.TestCase):
+    def check(self, strings, major=None, minor=None):
+        columns = lv.VersionColumns(NUMPY, strings)
+        versions = [ v for v in map(lv.Version, strings) if v.standard ]
+        if major is not None:
+            versions = [ v for v in versions if v.key[0][0][1] == major and (
+                minor is None or v.key[0][1][1] == minor) ]
+        latest = lv.select_latest(versions)
+        got = columns.latest("img", None, major, minor, True, None)
+        self.assertEqual([ v.string for v in got ], [ latest.string ])
+        for top in [ 1, 2, 5, 40, len(strings) + 1 ]:
+            expected = [ v.string for v in lv.select_top(versions, top) ]
+            got = [ v.string for v in columns.latest("img", None, major, minor, True, top) ]
+            self.assertEqual(got, expected, "top %d" % top)
+            self.assertEqual(got[0], latest.string)
+
+    def test_all_versions(self):
+        for seed in range(5):
+            self.check(version_strings(seed))
+
+    def test_prefixes(self):
+        strings = version_strings(0)
+        for major, minor in [ (1, None), (10, 3), (2, 0) ]:
+            self.check(strings, major, minor)
+
+    def test_no_prereleases(self):
+        self.check([ s for s in version_strings(1) if "-" not in s ])
+
+    def test_ties(self):
+        # Of versions with the same precedence, the last one ranks highest
+        self.check([ "1.0.0+a", "1.0.0", "1.0.0_b", "0.9.0", "1.0.0+c", "1.0.0-rc.1" ])
+
+    def test_constraint(self):
+        strings = version_strings(2)
+        columns = lv.VersionColumns(NUMPY, strings)
+        listed = lv.VersionList([ lv.Version(s) for s in strings ], lv.Version)
+        for text, prereleases in [ (">=1.3.1 <10.0.0", True), ("^2", False), ("~0.3", True) ]:
+            constraint = lv.VersionConstraint(text, prereleases)
+            for top in [ None, 3, 1000 ]:
+                self.assertEqual(
+                    [ v.string for v in columns.latest("img", None, None, None, True, top, constraint) ],
+                    [ v.string for v in listed.latest("img", None, None, None, True, top, constraint) ])
+
+    def test_rank_versions(self):
+        strings = version_strings(3)
+        threshold = lv.COLUMNS_THRESHOLD
+        lv.COLUMNS_THRESHOLD = len(strings)
+        try:
+            columns = lv.rank_versions("docker", iter(strings), True)
+            listed = lv.rank_versions("docker", iter(strings[1:]), True, reuse=True)
+        finally:
+            lv.COLUMNS_THRESHOLD = threshold
+        self.assertIsInstance(columns, lv.VersionColumns)
+        self.assertIsInstance(listed, lv.VersionList)
+        self.assertEqual(len(listed.versions), len(strings) - 1)
+
+if __name__ == "__main__":
+    unittest.main()
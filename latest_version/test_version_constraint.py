@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2026 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Checks which versions version constraints (--constraint and --no-prereleases) select, both
+by testing each version and by binary search over the sorted versions.
+
+Usage: test_version_constraint.py (or python3 -m unittest test_version_constraint)
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import latest_version as lv
+
+VERSIONS = [ "1.4.1", "1.4.2", "1.5.0-beta", "1.9.0", "2.0.0-rc.1", "2.0.0", "2.1.0", "2.1.3-alpha",
+             "0.3.1", "0.3.9", "0.4.0" ]
+
+def matching(text, prereleases=True, versions=VERSIONS):
+    # Returns the versions which satisfy the constraint, tested one at a time
+    constraint = lv.VersionConstraint(text, prereleases)
+    return [ s for s in versions if constraint.matches(lv.Version(s).key) ]
+
+def latest(text, prereleases=True, top=None, versions=VERSIONS):
+    # Returns the latest versions which satisfy the constraint, found by binary search
+    version_list = lv.VersionList([ lv.Version(s) for s in versions ], lv.Version)
+    constraint = lv.VersionConstraint(text, prereleases)
+    return [ v.string for v in version_list.latest("img", None, None, None, True, top, constraint) ]
+
+class VersionConstraintTest(unittest.TestCase):
+    def test_upper_bound_excludes_its_prereleases(self):
+        versions = [ "1.4.2", "1.9.0", "2.0.0-rc.1", "1.5.0-beta" ]
+        self.assertEqual(matching(">=1.4.2 <2.0.0", versions=versions), [ "1.4.2", "1.9.0", "1.5.0-beta" ])
+        self.assertEqual(latest(">=1.4.2 <2.0.0", versions=versions), [ "1.9.0" ])
+        self.assertEqual(latest(">=1.4.2 <2.0.0", top=3, versions=versions), [ "1.9.0", "1.5.0-beta", "1.4.2" ])
+        self.assertEqual(latest(">=1.4.2 <2.0.0", prereleases=False, versions=versions), [ "1.9.0" ])
+
+    def test_upper_bound_with_prerelease(self):
+        self.assertEqual(matching("<2.0.0-rc.2 >=1.9.0"), [ "1.9.0", "2.0.0-rc.1" ])
+        self.assertEqual(matching("<=2.0.0 >1.9.0"), [ "2.0.0-rc.1", "2.0.0" ])
+
+    def test_partial_versions(self):
+        self.assertEqual(matching("1.4"), [ "1.4.1", "1.4.2" ])
+        self.assertEqual(matching("<2"), [ "1.4.1", "1.4.2", "1.5.0-beta", "1.9.0", "0.3.1", "0.3.9", "0.4.0" ])
+        self.assertEqual(matching(">1"), [ "2.0.0-rc.1", "2.0.0", "2.1.0", "2.1.3-alpha" ])
+
+    def test_x_ranges(self):
+        for partial, x_ranges in [ ("1.4", [ "1.4.x", "1.4.X", "1.4.*" ]), ("1", [ "1.x", "1.x.x", "1.*.X" ]) ]:
+            for x_range in x_ranges:
+                for op in [ "", "=", ">", ">=", "<", "<=", "~", "^" ]:
+                    self.assertEqual(matching(op + x_range), matching(op + partial), op + x_range)
+        self.assertEqual(matching("x"), VERSIONS)
+
+    def test_tilde_and_caret(self):
+        self.assertEqual(matching("~1.4.1"), [ "1.4.1", "1.4.2" ])
+        self.assertEqual(matching("^2"), [ "2.0.0-rc.1", "2.0.0", "2.1.0", "2.1.3-alpha" ])
+        self.assertEqual(matching("^0.3.1"), [ "0.3.1", "0.3.9" ])
+
+    def test_any(self):
+        self.assertEqual(matching("*"), VERSIONS)
+        self.assertEqual(matching(None, prereleases=False), [ s for s in VERSIONS if "-" not in s ])
+
+    def test_invalid(self):
+        for text in [ "", "1.4.2.1", ">*", "~", "1.04", "<=>1", "1.x.4", "x.4", "1.4.x.x", "1.4.2.x" ]:
+            with self.assertRaises(ValueError, msg=text):
+                lv.VersionConstraint(text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2023 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2023, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -41,6 +41,18 @@
 # are done by the latest_version.sh script.
 #
 # This script always calls the latest_version script with the --overwrite flag
+#
+# Each stanza is validated and added to a plan as it is read (using latest_version.sh --plan),
+# and then the whole plan is run at once (using latest_version.sh --run-plan). This way, each
+# index file is only downloaded and parsed once, even if many stanzas use it.
+#
+# Usage: update_external_versions.sh [--capture-snapshot <snapshot_file>]
+#
+# If --capture-snapshot is specified, no versions are looked up. Instead every index file
+# used by the config file is downloaded and written to the specified snapshot file (using
+# latest_version.sh --capture-plan). If LATEST_VERSION_SNAPSHOT is set to such a file when
+# this script is run, the versions are looked up from the index files in the snapshot,
+# without any network access.
 
 CONFIGFILE="update_external_versions.conf"
 LVBASE="latest_version.sh"
@@ -72,13 +84,43 @@ function run_cmd
     return 0
 }
 
+function plan_err_exit
+{
+    # Usage: plan_err_exit <message>
+    # For an error in a stanza: the stanzas before it, which have already been planned, are
+    # run first, so that their outfiles are written just as if each stanza had been run as
+    # soon as it was read. (When capturing a snapshot, no partial snapshot is written.)
+    if [ -z "$SNAPSHOT" ] && [ -s "$PLANFILE" ]; then
+        run_plan
+    fi
+    err_exit "$@"
+}
+
 function run_lvscript
 {
-    if "$LVSCRIPT" "$@" ; then
-        info "Success: $LVSCRIPT $*"
+    # Usage: run_lvscript <latest_version.sh arguments>
+    # The arguments are recorded in the plan file, to be run later by run_plan
+    if "$LVSCRIPT" --plan "$PLANFILE" "$@" ; then
+        info "Planned: $LVSCRIPT $*"
         return 0
     fi
-    err_exit "Failed: $LVSCRIPT $*"
+    plan_err_exit "Failed: $LVSCRIPT --plan $PLANFILE $*"
+}
+
+function run_plan
+{
+    if [ -n "$SNAPSHOT" ]; then
+        if "$LVSCRIPT" --capture-plan "$PLANFILE" "$SNAPSHOT" ; then
+            info "Success: $LVSCRIPT --capture-plan $PLANFILE $SNAPSHOT"
+            return 0
+        fi
+        err_exit "Failed: $LVSCRIPT --capture-plan $PLANFILE $SNAPSHOT"
+    fi
+    if "$LVSCRIPT" --run-plan "$PLANFILE" ; then
+        info "Success: $LVSCRIPT --run-plan $PLANFILE"
+        return 0
+    fi
+    err_exit "Failed: $LVSCRIPT --run-plan $PLANFILE"
 }
 
 function update_tags
@@ -92,7 +134,7 @@ function update_tags
         field_value=$(echo "$vars" | cut -d":" -f2-)
         if [ "$field_name" != image ] && [ -z "$image" ]; then
             # If image is not set, we should not be seeing any other fields
-            err_exit "Line in $CONFIGFILE is not part of an image stanza: $vars"
+            plan_err_exit "Line in $CONFIGFILE is not part of an image stanza: $vars"
         fi
         case "$field_name" in
             "image")
@@ -110,17 +152,25 @@ function update_tags
                 if [ "$field_value" = docker ] || [ "$field_value" = helm ] || [ "$field_value" = python ]; then
                     lv_args+=("--$field_value")
                 else
-                    err_exit "Source field may only be set to docker, helm, or python. Invalid value: $field_value"
+                    plan_err_exit "Source field may only be set to docker, helm, or python. Invalid value: $field_value"
+                fi
+                ;;
+            "prereleases")
+                if [ "$field_value" = no ]; then
+                    lv_args+=("--no-prereleases")
+                elif [ "$field_value" != yes ]; then
+                    plan_err_exit "Prereleases field may only be set to yes or no. Invalid value: $field_value"
                 fi
                 ;;
             *)
-                # For all other fields (major, minor, outfile, server, team, type, and url) the
-                # argument name is the same as the field name, so it's easy
+                # For all other fields (constraint, major, minor, mirror, mirror-mode, outfile, server, team,
+                # type, and url) the argument name is the same as the field name, so it's easy. The mirror
+                # field may be repeated, once per mirror.
                 lv_args+=("--$field_name" "$field_value")
                 ;;
         esac
     done <<-EOF
-    $(grep -E '^[[:space:]]*(image|major|minor|outfile|server|source|team|type|url):' $CONFIGFILE |
+    $(grep -E '^[[:space:]]*(constraint|image|major|minor|mirror|mirror-mode|outfile|prereleases|server|source|team|type|url):' $CONFIGFILE |
         sed -e 's/^[[:space:]][[:space:]]*//' \
             -e 's/[[:space:]][[:space:]]*$//' \
             -e 's/^\([^:][^:]*\):[[:space:]][[:space:]]*/\1:/')
@@ -133,9 +183,18 @@ EOF
     if [ -n "$image" ]; then
         run_lvscript "${lv_args[@]}"  "$image"
     fi
+    [ -s "$PLANFILE" ] && run_plan
     return 0
 }
 
+SNAPSHOT=""
+if [ "$1" == "--capture-snapshot" ]; then
+    [ $# -eq 2 ] && [ -n "$2" ] || err_exit "Usage: $MYNAME [--capture-snapshot <snapshot_file>]"
+    SNAPSHOT="$2"
+elif [ $# -ne 0 ]; then
+    err_exit "Usage: $MYNAME [--capture-snapshot <snapshot_file>]"
+fi
+
 # We should be running from the root of the target repo, so the config file should
 # be found in this directory
 if [ ! -e "$CONFIGFILE" ]; then
@@ -180,5 +239,9 @@ if [ ! -x "$LVSCRIPT" ]; then
     err_exit "$LVSCRIPT file exists but is not executable"
 fi
 
+PLANFILE=/tmp/.update_external_versions.$$.$RANDOM.plan
+trap "rm -f $PLANFILE" EXIT
+: > "$PLANFILE" || err_exit "Unable to create $PLANFILE"
+
 update_tags
 exit 0
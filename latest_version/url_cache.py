@@ -0,0 +1,796 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2026 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Usage: url_cache.py [--cache-dir cache_dir [--max-age seconds]] [--paginate]
+#                     [--username-var var_name --password-var var_name]
+#                     url output_file
+#        url_cache.py [--cache-dir cache_dir [--max-age seconds]] [--jobs n]
+#                     --list list_file
+#        url_cache.py [--cache-dir cache_dir [--max-age seconds]] [--jobs n]
+#                     [--timing-log log_file] --mirrors list_file
+#
+# Writes the document at url to output_file, keeping a copy of it in cache_dir, so that
+# later fetches of the same url do not have to transfer it again if it has not changed.
+# If no cache_dir is specified, the document is simply downloaded.
+#
+# Each cached copy is stored with the ETag and Last-Modified headers it was served with.
+# If the copy was fetched (or revalidated) less than max_age seconds ago (default 0),
+# it is used without contacting the server at all. Otherwise the server is sent a
+# conditional request (using If-None-Match and If-Modified-Since), and if it responds
+# that the document has not been modified, the cached copy is used.
+#
+# The username and password (if needed) are read from the environment variables with
+# the specified names, so that they do not appear on the command line.
+#
+# With --paginate, the document may be split into pages, each giving the url of the next in
+# a Link header with rel="next" (as the Docker Registry HTTP API does for the tags list of an
+# image). Every page is fetched, and output_file is written as an RFC 7464 JSON text sequence:
+# each page preceded by an ASCII record separator (0x1E) and followed by a newline.
+#
+# The same cache directory may be used by several processes at once. Each url has its
+# own lock file, which is held while that url is being fetched, and each cached copy is
+# written to a temporary file which is then renamed into place, so a partially written
+# copy is never used.
+#
+# With --list, each line of list_file is a tab-separated url and output_file, optionally
+# followed by a username variable name and a password variable name, and then optionally
+# by the word paginate (to fetch that url as with --paginate). Up to n (default 8) of the
+# urls are fetched at once, and each thread keeps its connection to each server open, so
+# that fetching several documents from the same server does not require a new connection
+# (and TLS handshake) for each one. The result for each url is reported in the order of
+# list_file, stopping at the first one which could not be fetched. The output file of a url
+# which could not be fetched is never created, whether or not it is reported.
+#
+# With --mirrors, each line of list_file is a group name followed by the fields of a --list
+# line, and optionally then by the word union. The lines of a group are mirrors of the same
+# document, each with its own output file. All of the mirrors of a group are fetched at once,
+# and as soon as one of them has been fetched, the others are abandoned (their connections
+# are shut down, and their output files are never created), so the time taken is that of
+# the fastest mirror. If the lines of a group end with union, every mirror is waited for
+# instead, and each one which can be fetched is written. Up to n groups are fetched at once.
+# Which mirrors were used and how long each took are reported in the order of list_file,
+# stopping at the first group none of whose mirrors could be fetched, and with --timing-log,
+# they are also appended to log_file, one tab-separated line for each mirror: the time, the
+# group, the url, the outcome (used, abandoned, or failed), and the number of seconds.
+#
+# The same functionality is available to other Python tools through the UrlCache class.
+
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import re
+import shutil
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# How long to wait for the server, in seconds
+DEFAULT_TIMEOUT = 60
+
+# How many urls are fetched at once, by default
+DEFAULT_JOBS = 8
+
+# How many redirects are followed before giving up
+MAX_REDIRECTS = 5
+
+REDIRECT_CODES = { 301, 302, 303, 307, 308 }
+
+# Each link in a Link header is <url> followed by any number of ;-separated parameters
+LINK_RE = re.compile(r'<([^>]*)>((?:\s*;\s*[^;,]*)*)')
+LINK_REL_RE = re.compile(r';\s*rel\s*=\s*"?([^";,]*)"?', re.IGNORECASE)
+
+# Precedes each page written by fetch_pages
+RECORD_SEPARATOR = b"\x1e"
+
+def print_err(s):
+    print("url_cache.py: ERROR: " + s, file=sys.stderr)
+
+def print_info(s):
+    print("url_cache.py: " + s, file=sys.stderr)
+
+def err_exit(*msgs):
+    for m in msgs:
+        print_err(m)
+    sys.exit(1)
+
+def next_page_url(url, response):
+    # Returns the url of the next page given by the Link header of the response, if any,
+    # resolved relative to the url of the page
+    for link in response.headers.get_all("Link") or list():
+        for target, link_params in LINK_RE.findall(link):
+            rel = LINK_REL_RE.search(link_params)
+            if rel and "next" in rel.group(1).lower().split():
+                return urllib.parse.urljoin(url, target.strip())
+    return None
+
+class UrlCacheError(Exception):
+    """
+    Raised when a document cannot be fetched or written.
+    """
+
+class ConnectionPool(object):
+    """
+    Open HTTP and HTTPS connections, one to each server for each thread, so that the
+    requests a thread makes to the same server reuse a single keep-alive connection.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.local = threading.local()
+        self.ssl_context = ssl.create_default_context()
+        # Every connection made by any thread, so that they can all be aborted
+        self.all_connections = list()
+        self.lock = threading.Lock()
+        self.aborted = False
+
+    def handles(self, url):
+        # Urls which must go through a proxy are left to urllib, which knows how to use one
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in { "http", "https" } or not parts.hostname:
+            return False
+        return parts.scheme not in urllib.request.getproxies() or urllib.request.proxy_bypass(parts.hostname)
+
+    def connections(self):
+        try:
+            return self.local.connections
+        except AttributeError:
+            self.local.connections = dict()
+            return self.local.connections
+
+    def connection(self, scheme, hostname, port):
+        connections = self.connections()
+        key = (scheme, hostname, port)
+        if self.aborted:
+            raise ConnectionAbortedError("Fetch abandoned")
+        if key not in connections:
+            if scheme == "https":
+                connections[key] = http.client.HTTPSConnection(hostname, port, timeout=self.timeout,
+                                                               context=self.ssl_context)
+            else:
+                connections[key] = http.client.HTTPConnection(hostname, port, timeout=self.timeout)
+            with self.lock:
+                self.all_connections.append(connections[key])
+        return connections[key]
+
+    def abort(self):
+        """
+        Shuts down every connection of every thread, so that any request in progress on
+        one fails at once, and makes any later request fail. (A connection which is still
+        being established is not affected until it has been.)
+        """
+        with self.lock:
+            self.aborted = True
+            for conn in self.all_connections:
+                sock = conn.sock
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+    def reset(self):
+        """
+        Closes all of this thread's connections. This must be done if a response was not
+        read to the end, since the rest of it would otherwise be taken as the start of the
+        response to the next request, and before a thread which will not be reused exits.
+        """
+        connections = self.connections()
+        with self.lock:
+            for conn in connections.values():
+                conn.close()
+                self.all_connections.remove(conn)
+        connections.clear()
+
+    def get(self, url, headers):
+        # Returns the response to a GET request for url. A server may close a connection
+        # which has been idle for a while, so if the request fails before any response is
+        # received, it is tried once more on a new connection.
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        retried = False
+        while True:
+            conn = self.connection(parts.scheme, parts.hostname, parts.port)
+            try:
+                conn.request("GET", path, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if retried:
+                    raise
+                retried = True
+
+    def open(self, url, headers):
+        # Returns the response to a GET request for url (following any redirects), or None
+        # if the server responds that the document has not been modified. Raises
+        # UrlCacheError for any other status.
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.get(url, headers)
+            if response.status == 200:
+                return response
+            # Read the rest of the response, so that the connection can be reused
+            response.read()
+            if response.status == 304:
+                return None
+            elif response.status not in REDIRECT_CODES or not response.headers.get("Location"):
+                raise UrlCacheError("HTTP error %d (%s) fetching %s" % (response.status, response.reason, url))
+            new_url = urllib.parse.urljoin(url, response.headers["Location"])
+            if urllib.parse.urlsplit(new_url).netloc != urllib.parse.urlsplit(url).netloc:
+                # Do not send the credentials to a different server
+                headers = { k: v for k, v in headers.items() if k != "Authorization" }
+            if not self.handles(new_url):
+                return open_url(new_url, headers, self.timeout)
+            url = new_url
+        raise UrlCacheError("Too many redirects fetching %s" % url)
+
+def open_url(url, headers, timeout, pool=None):
+    # Returns the response to a GET request for url, or None if the server responds that
+    # the document has not been modified. Raises UrlCacheError for any other failure.
+    # If a connection pool is specified, it is used for any url that it can handle.
+    if pool is not None and pool.handles(url):
+        try:
+            return pool.open(url, headers)
+        except (OSError, http.client.HTTPException) as e:
+            pool.reset()
+            raise UrlCacheError("Error fetching %s: %s" % (url, e))
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        return urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise UrlCacheError("HTTP error %d (%s) fetching %s" % (e.code, e.reason, url))
+    except (urllib.error.URLError, OSError) as e:
+        raise UrlCacheError("Error fetching %s: %s" % (url, e))
+
+# The fields which the metadata of every cached copy must have
+METADATA_KEYS = ( "url", "etag", "last_modified", "next", "fetched" )
+
+# How long (in seconds) a temporary file in the cache directory must have gone unmodified
+# before it is taken to have been left behind
+STALE_AGE = 3600
+
+class UrlCache(object):
+    """
+    A directory of cached copies of documents, keyed by url (and username).
+
+    Each cached copy is stored in a single <key>.entry file, whose first line is a JSON
+    object with the url, the ETag and Last-Modified headers, and the time the copy was
+    last fetched or revalidated, and whose remaining bytes are the document itself.
+
+    If cache_dir is None, nothing is cached, and every fetch downloads the document.
+    Otherwise any temporary files left in it by a process which exited part way through
+    writing a copy are removed (unless remove_stale is False).
+    """
+    def __init__(self, cache_dir, max_age=0, timeout=DEFAULT_TIMEOUT, remove_stale=True):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.timeout = timeout
+        self.pool = ConnectionPool(timeout)
+        # How many files are being written (see write_file), and whether fetches have been
+        # abandoned, so that no more are written
+        self.writes = threading.Condition()
+        self.writing = 0
+        self.abandoned = False
+        if cache_dir is not None and remove_stale:
+            self.remove_stale_files()
+
+    def remove_stale_files(self):
+        # Removes the temporary files in the cache directory which have not been written to
+        # for STALE_AGE seconds. Those which are newer may still be being written by another
+        # process.
+        now = time.time()
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if not name.startswith(".tmp."):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.lstat(path).st_mtime >= STALE_AGE:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def entry_path(self, url, username):
+        key = hashlib.sha256(("%s\n%s" % (username or "", url)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def read_metadata(self, entry_file):
+        # Returns the metadata of a cached copy, or None if there is no usable copy. A copy
+        # whose metadata lacks any of METADATA_KEYS (such as one cached before the next page
+        # url was recorded) is not usable.
+        try:
+            with open(entry_file, "rb") as f:
+                metadata = json.loads(f.readline().decode())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(metadata, dict) or any(key not in metadata for key in METADATA_KEYS):
+            return None
+        if not isinstance(metadata["fetched"], (int, float)) or isinstance(metadata["fetched"], bool):
+            return None
+        return metadata
+
+    def copy_body(self, entry_file, dest):
+        with open(entry_file, "rb") as f:
+            f.readline()
+            with open(dest, "wb") as out:
+                shutil.copyfileobj(f, out)
+
+    def write_file(self, path, write):
+        # Calls write with a file object for a temporary file in the same directory as path,
+        # and then renames it to path. Once fetches have been abandoned (see abandon), no file
+        # is created or renamed into place: the connection was shut down, so what was read
+        # from it may have been cut short.
+        with self.writes:
+            if self.abandoned:
+                raise ConnectionAbortedError("Fetch abandoned")
+            self.writing += 1
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp.")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    write(f)
+                with self.writes:
+                    if self.abandoned:
+                        raise ConnectionAbortedError("Fetch abandoned")
+                    os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        finally:
+            with self.writes:
+                self.writing -= 1
+                self.writes.notify_all()
+
+    def abandon(self):
+        """
+        Abandons any fetches in progress, and makes any later ones fail, without writing any
+        more files. Once any files which were being written have been removed, returns.
+        """
+        with self.writes:
+            self.abandoned = True
+        self.pool.abort()
+        # The connections have been shut down, so the writes will soon fail
+        with self.writes:
+            while self.writing:
+                self.writes.wait()
+
+    def write_entry(self, entry_file, metadata, body):
+        # Write the metadata line and then the body (a file object) to a temporary file in
+        # the cache directory, then rename it into place
+        def write(f):
+            f.write(json.dumps(metadata, sort_keys=True).encode() + b"\n")
+            shutil.copyfileobj(body, f)
+        self.write_file(entry_file, write)
+
+    def fetch(self, url, dest, username=None, password=None):
+        """
+        Writes the document at url to the file dest, using the cached copy if it is
+        still valid. Returns a description of where the document came from: "cached"
+        (used without contacting the server), "not modified" (the server confirmed the
+        cached copy is current), or "downloaded".
+
+        Raises UrlCacheError if the document cannot be fetched or written.
+        """
+        return self.fetch_page(url, dest, username, password)[0]
+
+    def fetch_pages(self, url, dest, username=None, password=None):
+        """
+        Fetches a document which may be split into pages, each of which gives the url of
+        the next one in a Link header with rel="next" (as the Docker Registry HTTP API does
+        for tag lists), and writes the pages to dest as an RFC 7464 JSON text sequence:
+        each page is preceded by an ASCII record separator and followed by a newline.
+        Each page is cached separately. Returns a description of where the pages came
+        from, such as "3 pages (1 not modified, 2 downloaded)".
+
+        Raises UrlCacheError if any of the pages cannot be fetched or written.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix=".tmp.")
+        page_path = tmp_path + ".page"
+        statuses = list()
+        seen = set()
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while url is not None:
+                    if url in seen:
+                        raise UrlCacheError("Next page link leads back to %s" % url)
+                    seen.add(url)
+                    status, url = self.fetch_page(url, page_path, username, password)
+                    statuses.append(status)
+                    out.write(RECORD_SEPARATOR)
+                    with open(page_path, "rb") as page:
+                        shutil.copyfileobj(page, out)
+                    out.write(b"\n")
+            os.replace(tmp_path, dest)
+        except OSError as e:
+            raise UrlCacheError("Error writing %s: %s" % (dest, e))
+        finally:
+            for path in [ tmp_path, page_path ]:
+                if os.path.exists(path):
+                    os.unlink(path)
+        counts = [ "%d %s" % (statuses.count(status), status)
+                   for status in [ "cached", "not modified", "downloaded" ] if status in statuses ]
+        return "%d page%s (%s)" % (len(statuses), "" if len(statuses) == 1 else "s", ", ".join(counts))
+
+    def fetch_page(self, url, dest, username, password):
+        # Same as fetch, but returns a tuple of the description and the url of the next
+        # page of the document (or None, if there is no next page)
+        try:
+            if self.cache_dir is None:
+                return self.download(url, dest, username, password)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.entry_path(url, username) + ".lock", "a") as lock:
+                # Only one process fetches a given url at a time. Any others wait here,
+                # and then find the copy that it just fetched.
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                return self.fetch_locked(url, dest, username, password)
+        except (OSError, http.client.HTTPException) as e:
+            # For example, if the connection is dropped part way through the body
+            self.pool.reset()
+            raise UrlCacheError("Error fetching %s to %s: %s" % (url, dest, e))
+
+    def fetch_all(self, requests, jobs=DEFAULT_JOBS):
+        """
+        Fetches each of the (url, dest, username, password, paginate) requests, with up
+        to jobs of them in progress at once. Requests with paginate set are fetched with
+        fetch_pages, and others with fetch. Returns a list of the results, in the same
+        order as the requests. The result of each is either the description returned by
+        fetch or fetch_pages, or the UrlCacheError that it raised.
+        """
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(self.fetch_request, requests))
+
+    def fetch_request(self, request):
+        # Fetches a (url, dest, username, password, paginate) request, returning the description
+        # of where it came from, or the UrlCacheError raised
+        url, dest, username, password, paginate = request
+        try:
+            if paginate:
+                return self.fetch_pages(url, dest, username, password)
+            return self.fetch(url, dest, username, password)
+        except UrlCacheError as e:
+            return e
+
+    def fetch_mirrors(self, requests, union=False):
+        """
+        Fetches the same document from several mirrors at once. requests are (url, dest,
+        username, password, paginate) tuples, as for fetch_all, one for each mirror, each with
+        its own dest. Unless union is True, only the first mirror to deliver the whole document
+        is used: the others are abandoned, their connections are shut down, and their dest
+        files are never created. If union is True, every mirror is waited for.
+
+        Returns a list of (result, seconds) tuples, in the same order as the requests. Each
+        result is the description returned by fetch or fetch_pages, the UrlCacheError that
+        it raised, or None if the mirror was abandoned, and seconds is how long the mirror
+        took (or had taken when it was abandoned).
+        """
+        start = time.monotonic()
+        if len(requests) == 1:
+            return [ (self.fetch_request(requests[0]), time.monotonic() - start) ]
+
+        # Each mirror has its own connections, so that the abandoned ones can be shut down,
+        # and fetches into a staging directory, so that only the used ones are moved into place
+        caches = [ UrlCache(self.cache_dir, self.max_age, self.timeout, remove_stale=False) for _ in requests ]
+        staging = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(requests[0][1])), prefix=".tmp.mirrors.")
+        results = [ None ] * len(requests)
+        seconds = [ None ] * len(requests)
+        pending = set(range(len(requests)))
+        finished = threading.Condition()
+        state = { "used": False, "running": len(requests) }
+
+        def fetch_mirror(i):
+            url, dest, username, password, paginate = requests[i]
+            staged = os.path.join(staging, str(i))
+            result = caches[i].fetch_request((url, staged, username, password, paginate))
+            with finished:
+                if i in pending:
+                    if not isinstance(result, UrlCacheError):
+                        try:
+                            os.replace(staged, dest)
+                            state["used"] = True
+                        except OSError as e:
+                            result = UrlCacheError("Error writing %s: %s" % (dest, e))
+                    results[i] = result
+                    seconds[i] = time.monotonic() - start
+                    pending.discard(i)
+                state["running"] -= 1
+                if state["running"] == 0:
+                    shutil.rmtree(staging, ignore_errors=True)
+                finished.notify_all()
+
+        # The threads are daemon threads, so that a program need not wait for abandoned mirrors
+        # (one may still be connecting), but no abandoned mirror writes to the cache, or leaves
+        # a partly written file behind
+        for i in range(len(requests)):
+            threading.Thread(target=fetch_mirror, args=(i,), daemon=True).start()
+        with finished:
+            while pending and (union or not state["used"]):
+                finished.wait()
+            abandoned = sorted(pending)
+            for i in abandoned:
+                seconds[i] = time.monotonic() - start
+            pending.clear()
+        for i in abandoned:
+            caches[i].abandon()
+        if abandoned:
+            shutil.rmtree(staging, ignore_errors=True)
+        return list(zip(results, seconds))
+
+    def download(self, url, dest, username, password):
+        # Writes the document to a temporary file in the same directory as dest, and
+        # then renames it, so that dest is only created if the whole document is fetched
+        response = open_url(url, self.auth_headers(username, password), self.timeout, self.pool)
+        if response is None:
+            raise UrlCacheError("Server responded not modified for %s to an unconditional request" % url)
+        next_url = next_page_url(url, response)
+        with response:
+            self.write_file(dest, lambda f: shutil.copyfileobj(response, f))
+        return "downloaded", next_url
+
+    def auth_headers(self, username, password):
+        headers = dict()
+        if username is not None:
+            credentials = "%s:%s" % (username, password or "")
+            headers["Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+        return headers
+
+    def fetch_locked(self, url, dest, username, password):
+        entry_file = self.entry_path(url, username) + ".entry"
+        metadata = self.read_metadata(entry_file)
+        if metadata is not None and metadata["url"] != url:
+            metadata = None
+        now = time.time()
+        if metadata is not None and now - metadata["fetched"] < self.max_age:
+            self.copy_body(entry_file, dest)
+            return "cached", metadata["next"]
+
+        headers = self.auth_headers(username, password)
+        if metadata is not None:
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        response = open_url(url, headers, self.timeout, self.pool)
+        if response is None:
+            if metadata is None:
+                raise UrlCacheError("Server responded not modified for %s, but there is no cached copy" % url)
+            # Record when the copy was revalidated, for the max age
+            metadata["fetched"] = now
+            with open(entry_file, "rb") as f:
+                f.readline()
+                self.write_entry(entry_file, metadata, f)
+            self.copy_body(entry_file, dest)
+            return "not modified", metadata["next"]
+
+        with response:
+            metadata = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "next": next_page_url(url, response),
+                "fetched": now }
+            self.write_entry(entry_file, metadata, response)
+        self.copy_body(entry_file, dest)
+        return "downloaded", metadata["next"]
+
+def validate_max_age(s):
+    try:
+        max_age = float(s)
+    except ValueError:
+        err_exit("--max-age argument must be a number of seconds. Invalid: %s" % s)
+    if max_age < 0:
+        err_exit("--max-age argument must be nonnegative. Invalid: %s" % s)
+    return max_age
+
+def validate_jobs(s):
+    try:
+        jobs = int(s)
+    except ValueError:
+        err_exit("--jobs argument must be a positive integer. Invalid: %s" % s)
+    if jobs < 1:
+        err_exit("--jobs argument must be a positive integer. Invalid: %s" % s)
+    return jobs
+
+def parse_parameters(args):
+    params = {
+        "cache_dir": None,
+        "max_age": None,
+        "jobs": None,
+        "list": None,
+        "mirrors": None,
+        "timing_log": None,
+        "paginate": False,
+        "username_var": None,
+        "password_var": None,
+        "url": None,
+        "output_file": None }
+    positional = list()
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if arg in { "--cache-dir", "--max-age", "--jobs", "--list", "--mirrors", "--timing-log",
+                    "--username-var", "--password-var" }:
+            try:
+                flag_arg = args[i]
+            except IndexError:
+                err_exit("%s flag requires an argument" % arg)
+            i += 1
+            if not flag_arg:
+                err_exit("%s flag cannot have a blank argument" % arg)
+            elif arg == "--max-age":
+                params["max_age"] = validate_max_age(flag_arg)
+            elif arg == "--jobs":
+                params["jobs"] = validate_jobs(flag_arg)
+            else:
+                params[arg[2:].replace("-", "_")] = flag_arg
+        elif arg == "--paginate":
+            params["paginate"] = True
+        elif arg.startswith("--"):
+            err_exit("Unrecognized flag: %s" % arg)
+        else:
+            positional.append(arg)
+    if params["max_age"] is not None and params["cache_dir"] is None:
+        err_exit("--max-age may not be specified without --cache-dir")
+    if params["timing_log"] is not None and params["mirrors"] is None:
+        err_exit("--timing-log may only be specified with --mirrors")
+    if params["list"] is not None and params["mirrors"] is not None:
+        err_exit("--list and --mirrors are mutually exclusive")
+    for flag in [ "list", "mirrors" ]:
+        if params[flag] is None:
+            continue
+        elif positional:
+            err_exit("No url or output file may be specified with --%s" % flag)
+        elif params["username_var"] is not None or params["password_var"] is not None:
+            err_exit("--username-var and --password-var may not be specified with --%s" % flag)
+        elif params["paginate"]:
+            err_exit("--paginate may not be specified with --%s" % flag)
+        return params
+    if params["jobs"] is not None:
+        err_exit("--jobs may only be specified with --list or --mirrors")
+    elif len(positional) != 2:
+        err_exit("A url and an output file must be specified")
+    params["url"], params["output_file"] = positional
+    if (params["username_var"] is None) != (params["password_var"] is None):
+        err_exit("--username-var and --password-var must be specified together")
+    return params
+
+def credentials(username_var, password_var):
+    # Returns the username and password from the specified environment variables
+    if username_var is None:
+        return None, None
+    return os.environ.get(username_var, ""), os.environ.get(password_var, "")
+
+def read_list_file(list_file, mirrors=False):
+    # Returns the list of (url, output_file, username, password, paginate) requests in the list
+    # file. If mirrors is True, returns a list of (group, union, requests) tuples instead, one
+    # for each group of mirrors, in the order of their first lines.
+    requests = list()
+    groups = dict()
+    try:
+        with open(list_file, "rt") as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                fields = line.split("\t")
+                group = fields.pop(0) if mirrors else None
+                union = mirrors and fields[-1:] == [ "union" ]
+                if union:
+                    fields.pop()
+                if len(fields) not in { 2, 4, 5 } or not all(fields) or fields[4:] not in [ [], [ "paginate" ] ] or group == "":
+                    err_exit("Line %d of %s must have %sa url and an output file, optionally followed "
+                             "by username and password variable names and then paginate%s, separated "
+                             "by tabs: %s" % (line_number, list_file, "a group, " if mirrors else "",
+                                              " and then union" if mirrors else "", line))
+                username, password = credentials(*fields[2:4]) if len(fields) >= 4 else (None, None)
+                request = (fields[0], fields[1], username, password, len(fields) == 5)
+                if not mirrors:
+                    requests.append(request)
+                elif group not in groups:
+                    groups[group] = (group, union, [ request ])
+                    requests.append(groups[group])
+                elif groups[group][1] != union:
+                    err_exit("Line %d of %s: either every line of group %s must end with union, "
+                             "or none of them" % (line_number, list_file, group))
+                else:
+                    groups[group][2].append(request)
+    except OSError as e:
+        err_exit("Error reading %s: %s" % (list_file, e))
+    return requests
+
+def fetch_mirror_groups(cache, params):
+    # Fetches each group of mirrors in the --mirrors list file, and reports the results
+    groups = read_list_file(params["mirrors"], mirrors=True)
+    with ThreadPoolExecutor(max_workers=params["jobs"] or DEFAULT_JOBS) as executor:
+        results = list(executor.map(lambda group: cache.fetch_mirrors(group[2], group[1]), groups))
+    log_lines = list()
+    now = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    for (group, union, requests), mirror_results in zip(groups, results):
+        for request, (result, seconds) in zip(requests, mirror_results):
+            outcome = "abandoned" if result is None else "failed" if isinstance(result, UrlCacheError) else "used"
+            log_lines.append("%s\t%s\t%s\t%s\t%.3f\n" % (now, group, request[0], outcome, seconds))
+    if params["timing_log"] is not None:
+        try:
+            with open(params["timing_log"], "at") as f:
+                f.writelines(log_lines)
+        except OSError as e:
+            print_err("Error writing to %s: %s" % (params["timing_log"], e))
+    for (group, union, requests), mirror_results in zip(groups, results):
+        if len(requests) == 1:
+            result = mirror_results[0][0]
+            if isinstance(result, UrlCacheError):
+                err_exit(str(result))
+            print_info("%s: %s" % (result, requests[0][0]))
+            continue
+        for request, (result, seconds) in zip(requests, mirror_results):
+            if result is None:
+                print_info("abandoned after %.2fs: %s" % (seconds, request[0]))
+            elif isinstance(result, UrlCacheError):
+                print_info("failed after %.2fs: %s" % (seconds, result))
+            else:
+                print_info("%s in %.2fs: %s" % (result, seconds, request[0]))
+        if all(isinstance(result, UrlCacheError) for result, _ in mirror_results):
+            err_exit("None of the mirrors of %s could be fetched" % requests[0][0])
+    return 0
+
+def main(args):
+    params = parse_parameters(args)
+    cache = UrlCache(params["cache_dir"], max_age=params["max_age"] or 0)
+    if params["mirrors"] is not None:
+        return fetch_mirror_groups(cache, params)
+    elif params["list"] is not None:
+        requests = read_list_file(params["list"])
+        results = cache.fetch_all(requests, params["jobs"] or DEFAULT_JOBS)
+        for request, result in zip(requests, results):
+            if isinstance(result, UrlCacheError):
+                err_exit(str(result))
+            print_info("%s: %s" % (result, request[0]))
+        return 0
+    username, password = credentials(params["username_var"], params["password_var"])
+    fetch = cache.fetch_pages if params["paginate"] else cache.fetch
+    try:
+        status = fetch(params["url"], params["output_file"], username, password)
+    except UrlCacheError as e:
+        err_exit(str(e))
+    print_info("%s: %s" % (status, params["url"]))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
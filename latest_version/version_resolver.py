@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+#
+# MIT License
+#
+# (C) Copyright 2026 Hewlett Packard Enterprise Development LP
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Usage: version_resolver.py --serve --socket socket_path [--ttl seconds] [--idle seconds]
+#                            [--cache-dir cache_dir [--max-age seconds]]
+#        version_resolver.py --query --socket socket_path < request_lines
+#
+# A long-running resolver for build agents which look up many versions. With --serve, it
+# listens on the Unix socket socket_path and answers the same questions as latest_version.py
+# (the latest version(s) of an image of a given type, optionally of a given major and minor
+# number), using the same parsing and comparison logic. Each document it downloads (a Docker
+# tags list, Helm index.yaml, or Python simple index page) is parsed once and kept in memory,
+# along with the parsed versions of each image asked about. Once it is ttl seconds old
+# (default 300), it is fetched again the next time it is needed. If a cache_dir is specified, it
+# is fetched through url_cache.py, so a document which has not changed is neither transferred
+# nor parsed again. Documents which have not been needed for idle seconds (default 3600)
+# are dropped.
+#
+# The socket is created so that only its owner can connect to it. The username and password
+# for each url are read from the resolver's own environment, from the variables named in the
+# request, so credentials never pass through the socket.
+#
+# Each request is one line of JSON, with the fields source (docker, helm, or python), url,
+# username_var, password_var, image, type, major, minor, top, constraint, and prereleases (a
+# boolean, true if omitted), and each response is one line of JSON: either
+# {"versions": [...]} (latest first) or {"error": "message"}. Any number
+# of requests may be sent on one connection, and they are answered in order.
+#
+# With --query, each line of standard input is a tab-separated request, with the fields:
+#     source url username_var password_var image type major minor top constraint no_prereleases outfile
+# (only type, major, minor, top, constraint, and no_prereleases may be blank, and no_prereleases
+# must be blank or "no-prereleases"). The requests are sent to the resolver, and
+# the versions for each are written to its outfile, in order. If the resolver reports an error,
+# it is printed and the exit code is 1 (the outfiles of earlier requests have been written).
+# If the resolver cannot be reached, or stops responding, the exit code is 2, so the caller
+# can fall back to looking the versions up itself.
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+# How long a parsed document is used before it is fetched again, in seconds
+DEFAULT_TTL = 300
+
+# How long a parsed document is kept without being used, in seconds
+DEFAULT_IDLE = 3600
+
+SOURCES = { "docker", "helm", "python" }
+
+REQUEST_FIELDS = [ "source", "url", "username_var", "password_var", "image", "type", "major",
+                   "minor", "top", "constraint", "no_prereleases", "outfile" ]
+
+# Exit code of --query when the resolver cannot be used
+UNAVAILABLE = 2
+
+def print_err(s):
+    print("version_resolver.py: ERROR: " + s, file=sys.stderr)
+
+def print_info(s):
+    print("version_resolver.py: " + s, file=sys.stderr)
+
+def err_exit(*msgs):
+    for m in msgs:
+        print_err(m)
+    sys.exit(1)
+
+class ResolverError(Exception):
+    """
+    Raised when a request cannot be answered.
+    """
+
+class Document(object):
+    """
+    The parsed contents of one downloaded document, when it was last fetched, and when
+    it was last used.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.source = None
+        # The name the parsed document is known by in source (its URL)
+        self.name = None
+        self.fetched = None
+        self.used = time.monotonic()
+
+class VersionResolver(object):
+    """
+    Answers requests using documents fetched through a url_cache.UrlCache, each of which
+    is parsed into a latest_version.VersionSource that is used for ttl seconds before the
+    document is fetched again, and dropped if it has not been used for idle seconds.
+    """
+    def __init__(self, cache, ttl=DEFAULT_TTL, idle=DEFAULT_IDLE):
+        import latest_version
+        self.lv = latest_version
+        self.cache = cache
+        self.ttl = ttl
+        self.idle = idle
+        self.lock = threading.Lock()
+        # The Document for each (source, url, username_var, password_var)
+        self.documents = dict()
+
+    def document(self, key):
+        # Returns the VersionSource for the document and the name it is known by in it,
+        # fetching and parsing the document first if necessary
+        now = time.monotonic()
+        with self.lock:
+            # Drop any other documents which are not being fetched and have not been used
+            # recently
+            for other in [ k for k, d in self.documents.items()
+                           if k != key and not d.lock.locked() and now - d.used >= self.idle ]:
+                del self.documents[other]
+            document = self.documents.setdefault(key, Document())
+            document.used = now
+        # Only one thread fetches a given document at a time, and any others wait for it
+        with document.lock:
+            if document.fetched is None or time.monotonic() - document.fetched >= self.ttl:
+                self.fetch(document, *key)
+            return document.source, document.name
+
+    def fetch(self, document, source, url, username_var, password_var):
+        import url_cache
+        username, password = url_cache.credentials(username_var, password_var)
+        fetch = self.cache.fetch_pages if source == "docker" else self.cache.fetch
+        fd, dest = tempfile.mkstemp(prefix=".version_resolver.")
+        os.close(fd)
+        try:
+            status = fetch(url, dest, username, password)
+            if document.source is not None and "downloaded" not in status:
+                # The server confirmed that the parsed copy is still current
+                print_info("%s: %s" % (status, url))
+                document.fetched = time.monotonic()
+                return
+            version_source = self.lv.VersionSource()
+            try:
+                version_source.parsed_file(source, dest, url)
+            except Exception as e:
+                raise ResolverError("Error parsing %s: %s" % (url, e))
+            print_info("%s and parsed: %s" % (status, url))
+        except url_cache.UrlCacheError as e:
+            raise ResolverError("Unable to download %s: %s" % (url, e))
+        finally:
+            if os.path.exists(dest):
+                os.unlink(dest)
+        # The downloaded file is gone, so the parsed document is known by its URL instead
+        document.source = version_source
+        document.name = url
+        document.fetched = time.monotonic()
+
+    def close_connections(self):
+        """
+        Closes the connections which the calling thread opened to fetch documents.
+        """
+        self.cache.pool.reset()
+
+    def resolve(self, request):
+        """
+        Returns the list of latest version strings for the request (a dict, as described
+        above). Raises ResolverError if it cannot be answered.
+        """
+        if not isinstance(request, dict):
+            raise ResolverError("Request must be a JSON object")
+        source = request.get("source")
+        if source not in SOURCES:
+            raise ResolverError("source must be docker, helm, or python")
+        for name in [ "url", "image" ]:
+            if not isinstance(request.get(name), str) or not request[name]:
+                raise ResolverError("%s must be a nonblank string" % name)
+        for name in [ "username_var", "password_var", "type", "constraint" ]:
+            if request.get(name) is not None and not isinstance(request[name], str):
+                raise ResolverError("%s must be a string" % name)
+        for name, minimum in [ ("major", 0), ("minor", 0), ("top", 1) ]:
+            value = request.get(name)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < minimum):
+                raise ResolverError("%s must be an integer no less than %d" % (name, minimum))
+        if request.get("minor") is not None and request.get("major") is None:
+            raise ResolverError("A minor number may not be specified without a major number")
+        prereleases = request.get("prereleases", True)
+        if not isinstance(prereleases, bool):
+            raise ResolverError("prereleases must be a boolean")
+        constraint = None
+        if request.get("constraint") is not None or not prereleases:
+            if source == "python":
+                raise ResolverError("A constraint may not be specified for python")
+            try:
+                constraint = self.lv.VersionConstraint(request.get("constraint"), prereleases)
+            except ValueError as e:
+                raise ResolverError("Invalid constraint %s: %s" % (request["constraint"], e))
+        image_name = request["image"]
+        image_type = request.get("type") or None
+        version_source, name = self.document((source, request["url"], request.get("username_var") or None,
+                                              request.get("password_var") or None))
+        try:
+            versions = version_source.versions(source, name, image_name, image_type)
+        except Exception as e:
+            raise ResolverError("Error parsing %s: %s" % (request["url"], e))
+        try:
+            latest_versions = versions.latest(image_name, image_type, request.get("major"), request.get("minor"),
+                                              True, request.get("top"), constraint)
+        except self.lv.LatestVersionError as e:
+            raise ResolverError(str(e))
+        return [ v.string for v in latest_versions ]
+
+class ResolverHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            self.answer_requests()
+        finally:
+            # Each client has its own thread, which exits when the client goes away, so the
+            # connections it opened to fetch documents would otherwise be left open for good
+            self.server.resolver.close_connections()
+
+    def answer_requests(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+            except ValueError as e:
+                response = { "error": "Invalid request: %s" % e }
+            else:
+                try:
+                    response = { "versions": self.server.resolver.resolve(request) }
+                except ResolverError as e:
+                    response = { "error": str(e) }
+            try:
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+            except OSError:
+                # The client has gone away
+                return
+
+class ResolverServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, resolver):
+        self.resolver = resolver
+        # Only the owner of the socket may connect to it
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, ResolverHandler)
+        finally:
+            os.umask(old_umask)
+
+def connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def remove_stale_socket(socket_path):
+    # A socket left behind by a resolver which is no longer running is removed, but
+    # anything else is an error
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        err_exit("Unable to check %s: %s" % (socket_path, e))
+    if not stat.S_ISSOCK(mode):
+        err_exit("%s already exists and is not a socket" % socket_path)
+    try:
+        connect(socket_path).close()
+    except OSError:
+        os.unlink(socket_path)
+        return
+    err_exit("A resolver is already listening on %s" % socket_path)
+
+def serve(params):
+    import url_cache
+    socket_path = params["socket"]
+    resolver = VersionResolver(url_cache.UrlCache(params["cache_dir"], max_age=params["max_age"] or 0),
+                               ttl=DEFAULT_TTL if params["ttl"] is None else params["ttl"],
+                               idle=DEFAULT_IDLE if params["idle"] is None else params["idle"])
+    remove_stale_socket(socket_path)
+    try:
+        server = ResolverServer(socket_path, resolver)
+    except OSError as e:
+        err_exit("Unable to listen on %s: %s" % (socket_path, e))
+    # Stop cleanly (removing the socket) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print_info("Listening on %s" % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+    return 0
+
+def read_requests(f):
+    # Returns the list of requests (and output files) on the lines of f
+    requests = list()
+    for line_number, line in enumerate(f, start=1):
+        line = line.rstrip("\n")
+        if not line:
+            continue
+        fields = line.split("\t")
+        if len(fields) != len(REQUEST_FIELDS):
+            err_exit("Request line %d has %d fields, but should have %d" % (
+                line_number, len(fields), len(REQUEST_FIELDS)))
+        request = { name: (value or None) for name, value in zip(REQUEST_FIELDS, fields) }
+        for name in [ "major", "minor", "top" ]:
+            if request[name] is not None:
+                try:
+                    request[name] = int(request[name])
+                except ValueError:
+                    err_exit("Request line %d: %s must be an integer. Invalid: %s" % (
+                        line_number, name, request[name]))
+        if None in [ request["source"], request["url"], request["image"], request["outfile"] ]:
+            err_exit("Request line %d: source, url, image, and outfile may not be blank" % line_number)
+        if request["no_prereleases"] not in [ None, "no-prereleases" ]:
+            err_exit("Request line %d: no_prereleases must be blank or no-prereleases. Invalid: %s" % (
+                line_number, request["no_prereleases"]))
+        request["prereleases"] = request.pop("no_prereleases") is None
+        requests.append(request)
+    return requests
+
+def query(params):
+    requests = read_requests(sys.stdin)
+    if not requests:
+        return 0
+    try:
+        sock = connect(params["socket"])
+    except OSError as e:
+        print_info("Unable to connect to %s: %s" % (params["socket"], e))
+        return UNAVAILABLE
+    with sock, sock.makefile("rb") as responses:
+        try:
+            sock.sendall(b"".join(json.dumps({ name: value for name, value in request.items() if name != "outfile" }
+                                             ).encode() + b"\n" for request in requests))
+        except OSError as e:
+            print_info("Unable to send requests to %s: %s" % (params["socket"], e))
+            return UNAVAILABLE
+        for request in requests:
+            try:
+                response = json.loads(responses.readline().decode())
+                latest_versions = response.get("versions")
+                error = response.get("error")
+            except (OSError, ValueError, AttributeError) as e:
+                print_info("No valid response from %s: %s" % (params["socket"], e))
+                return UNAVAILABLE
+            if error is not None:
+                err_exit(error)
+            elif not isinstance(latest_versions, list):
+                print_info("No valid response from %s" % params["socket"])
+                return UNAVAILABLE
+            outfile = request["outfile"]
+            try:
+                with open(outfile, "wt") as f:
+                    for v in latest_versions:
+                        f.write(v + "\n")
+            except OSError as e:
+                err_exit("Error writing to %s: %s" % (outfile, e))
+            print_info("Found version %s of %s (written to %s)" % (" ".join(latest_versions), request["image"], outfile))
+    return 0
+
+def validate_seconds(flag, s):
+    try:
+        seconds = float(s)
+    except ValueError:
+        err_exit("%s argument must be a number of seconds. Invalid: %s" % (flag, s))
+    if seconds < 0:
+        err_exit("%s argument must be nonnegative. Invalid: %s" % (flag, s))
+    return seconds
+
+def parse_parameters(args):
+    params = {
+        "mode": None,
+        "socket": None,
+        "ttl": None,
+        "idle": None,
+        "cache_dir": None,
+        "max_age": None }
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if arg in { "--serve", "--query" }:
+            if params["mode"] is not None:
+                err_exit("Only one of --serve and --query may be specified")
+            params["mode"] = arg[2:]
+        elif arg in { "--socket", "--ttl", "--idle", "--cache-dir", "--max-age" }:
+            try:
+                flag_arg = args[i]
+            except IndexError:
+                err_exit("%s flag requires an argument" % arg)
+            i += 1
+            if not flag_arg:
+                err_exit("%s flag cannot have a blank argument" % arg)
+            elif arg in { "--ttl", "--idle", "--max-age" }:
+                params[arg[2:].replace("-", "_")] = validate_seconds(arg, flag_arg)
+            else:
+                params[arg[2:].replace("-", "_")] = flag_arg
+        elif arg.startswith("--"):
+            err_exit("Unrecognized flag: %s" % arg)
+        else:
+            err_exit("Unexpected argument: %s" % arg)
+    if params["mode"] is None:
+        err_exit("--serve or --query must be specified")
+    elif params["socket"] is None:
+        err_exit("--socket must be specified")
+    elif params["max_age"] is not None and params["cache_dir"] is None:
+        err_exit("--max-age may not be specified without --cache-dir")
+    elif params["mode"] == "query" and any(params[name] is not None for name in [ "ttl", "idle", "cache_dir" ]):
+        err_exit("--ttl, --idle, --cache-dir, and --max-age may only be specified with --serve")
+    return params
+
+def main(args):
+    params = parse_parameters(args)
+    if params["mode"] == "serve":
+        return serve(params)
+    return query(params)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2020-2022 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2020-2022, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -89,17 +89,48 @@ else
     err_exit "Unable to determine path to cms-meta-tools"
 fi
 
+function profile_arg
+{
+    # Usage: profile_arg <tool>
+    # Prints the file_filter --profile argument for the specified tool, which uses the
+    # default config file from the tool directory, followed by the config file with
+    # the same name in the root of the repo (if there is one)
+    local arg="$1=${CMS_META_TOOLS_PATH}/$1/$1.yaml"
+    [ -f "./$1.yaml" ] && arg="${arg}:./$1.yaml"
+    echo "$arg"
+}
+
+# Rather than each tool enumerating and filtering the files in the repo separately,
+# file_filter makes a single pass over the files tracked by git, and writes the list of
+# files for each tool to a file named after it. If this fails for some reason, the tools
+# are run without these lists, and do their own filtering.
+CLC_LIST=""
+GL_LIST=""
+if FF_LISTS_DIR=$(mktemp -d /tmp/.runLint.$$.XXXXXX) &&
+        run_cmd "${CMS_META_TOOLS_PATH}/file_filter/file_filter.sh" --walk . --git-tracked \
+            --profile-output-dir "$FF_LISTS_DIR" \
+            --profile "$(profile_arg copyright_license_check)" \
+            --profile "$(profile_arg go_lint)"
+then
+    CLC_LIST="$FF_LISTS_DIR/copyright_license_check"
+    GL_LIST="$FF_LISTS_DIR/go_lint"
+else
+    info "Unable to filter files for all tools in a single pass; each tool will filter its own files"
+fi
+
 # These do not take long to run, and do not depend on each other, so we let
 # them run even if one fails, so the build can report all problems found.
 RC=0
 
 # No config file is needed for this tool. The defaults are fine in many cases,
 # but it should run in every repo.
-run_cmd "${CMS_META_TOOLS_PATH}/copyright_license_check/copyright_license_check.sh" || RC=1
+run_cmd "${CMS_META_TOOLS_PATH}/copyright_license_check/copyright_license_check.sh" ${CLC_LIST:+"$CLC_LIST"} || RC=1
 
 # If there is no go code in the repo, this tool will do nothing and have
 # exit code 0
-run_cmd "${CMS_META_TOOLS_PATH}/go_lint/go_lint.sh" || RC=1
+run_cmd "${CMS_META_TOOLS_PATH}/go_lint/go_lint.sh" ${GL_LIST:+"$GL_LIST"} || RC=1
+
+[ -n "$FF_LISTS_DIR" ] && rm -rf "$FF_LISTS_DIR" >/dev/null 2>&1
 
 if [ $RC -eq 0 ]; then
     info "PASSED"
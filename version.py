@@ -2,7 +2,7 @@
 #
 # MIT License
 #
-# (C) Copyright 2021-2022 Hewlett Packard Enterprise Development LP
+# (C) Copyright 2021-2022, 2026 Hewlett Packard Enterprise Development LP
 #
 # Permission is hereby granted, free of charge, to any person obtaining a
 # copy of this software and associated documentation files (the "Software"),
@@ -57,11 +57,68 @@ def myprint(s):
     print("version.py: %s" % s, file=sys.stderr)
 
 
-def branch_name():
+class GitContext():
+    """
+    A GitContext runs the git queries needed to compute a version, for a single invocation.
+
+    Each distinct query is only run the first time it is asked for; after that its output (or the
+    error it failed with) is remembered and handed back again. One GitContext is shared by the
+    BranchVersion and all of its strategies, so no matter how many strategies ask for the branch
+    name or the commit list, git is only run once for each.
+    """
+    def __init__(self, project=THIS_PROJECT):
+        self.project = project
+        self._results = {}
+
+    def output(self, *args):
+        """
+        Returns the decoded output of 'git <args>', raising subprocess.CalledProcessError if it fails.
+        """
+        if args not in self._results:
+            try:
+                self._results[args] = subprocess.check_output(['git'] + list(args), cwd=self.project).decode('UTF-8')
+            except subprocess.CalledProcessError as e:
+                self._results[args] = e
+        result = self._results[args]
+        if isinstance(result, subprocess.CalledProcessError):
+            raise result
+        return result
+
+    @property
+    def branch(self):
+        """
+        The name of the current branch; make it work with all DST build pipelines.
+        """
+        return self.output('rev-parse', '--abbrev-ref', 'HEAD').rstrip()
+
+    @property
+    def status(self):
+        """
+        The output of git status for the project in the form of porcelain=2
+        """
+        return self.output('status', '--porcelain=2')
+
+    @property
+    def commits(self):
+        """
+        A list of the commits that are part of the current branch, newest first.
+        """
+        return self.output('log', '--pretty=format:%H').splitlines()
+
+    def last_commit(self, path):
+        """
+        The hash of the last commit to affect the given path.
+        """
+        return self.output('log', '--pretty=format:%H', '-n1', path).strip()
+
+
+def branch_name(git=None):
     """
     Obtains a copy of the name of the current branch; make it work with all DST build pipelines.
     """
-    return subprocess.check_output(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=THIS_PROJECT).decode('UTF-8').rstrip()
+    if git is None:
+        git = GitContext()
+    return git.branch
 
 
 class VersionStrategy():
@@ -75,11 +132,15 @@ class VersionStrategy():
     evaluating VersionStrategies, NoneTypes are skipped over in favor of the next available
     defined strategy for a given field, within the context of a given overall Version.
     """
-    def __init__(self, field):
+    def __init__(self, field, git=None):
         """
-        A Field is simply the x, y, or z position of a given version.
+        A Field is simply the x, y, or z position of a given version. Any git queries are made
+        through git, the GitContext shared with the rest of the version.
         """
         self.field = field
+        if git is None:
+            git = GitContext()
+        self.git = git
 
     def myprint(self, s):
         """
@@ -160,7 +221,7 @@ class GitBasedStrategy(VersionStrategy):
         """
         Returns the output of git status for a project in the form of porcelain=2
         """
-        return subprocess.check_output(['git', 'status', '--porcelain=2'], cwd=THIS_PROJECT).decode('UTF-8')
+        return self.git.status
 
     @property
     def is_clean(self):
@@ -171,14 +232,14 @@ class GitBasedStrategy(VersionStrategy):
         """
         The name of the branch in the local checkout. Discovered exactly once per invocation.
         """
-        return branch_name()
+        return self.git.branch
 
     @property
     def commits(self):
         """
         Returns a list of commits that are part of this branch.
         """
-        return subprocess.check_output(['git', 'log', '--pretty=format:%H'], cwd=THIS_PROJECT).decode('UTF-8').splitlines()
+        return self.git.commits
 
 
 class DeveloperBranchNameStrategy(GitBasedStrategy):
@@ -243,15 +304,14 @@ class CommitsFromParentBranch(GitBasedStrategy):
     """
     @property
     def parent_branch(self):
-        value = subprocess.check_output(['git', 'config', '--get-regex', 'branch.%s.merge' %(self.branch)], cwd=THIS_PROJECT).decode('UTF-8').strip().strip()
+        value = self.git.output('config', '--get-regex', 'branch.%s.merge' %(self.branch)).strip()
         branch = '/'.join(value.split('/')[2:])
         self.myprint("parent_branch = '%s'" % branch)
 
     @property
     def commits_from_parent(self):
-        num_commits = subprocess.check_output(
-            ['git', 'rev-list', '--count', self.branch, '--not', 'origin/%s' %(self.parent_branch)],
-            cwd=THIS_PROJECT).decode('UTF-8').strip()
+        num_commits = self.git.output(
+            'rev-list', '--count', self.branch, '--not', 'origin/%s' %(self.parent_branch)).strip()
         self.myprint("number of local branch commits = %s" % num_commits)
         return num_commits
 
@@ -290,7 +350,7 @@ class CommitsSinceChangedStrategy(GitBasedStrategy):
 
     @property
     def neighbor_pinned_strategy(self):
-        return PinnedFileStrategy(self.significant_neighbor)
+        return PinnedFileStrategy(self.significant_neighbor, self.git)
 
     @property
     def neighbor_pinned_last_commit(self):
@@ -298,9 +358,7 @@ class CommitsSinceChangedStrategy(GitBasedStrategy):
         Introspects the git history for the commit hash for the last change to affect our parent
         pinned version.
         """
-        last_commit = subprocess.check_output(
-            ['git', 'log', '--pretty=format:%H', '-n1', self.neighbor_pinned_strategy.pinned_path], 
-            cwd=THIS_PROJECT).decode('UTF-8').strip()
+        last_commit = self.git.last_commit(self.neighbor_pinned_strategy.pinned_path)
         self.myprint("Last commit to affect '%s' was '%s'" % (self.neighbor_pinned_strategy.pinned_path, last_commit))
         return last_commit
 
@@ -339,7 +397,13 @@ class BranchVersion(LooseVersion):
     
     This is a base class intended to be inherited by separate BranchVersion class definitions.
     """
-    def __init__(self):
+    def __init__(self, git=None):
+        """
+        git is the GitContext shared by all of the strategies of this version.
+        """
+        if git is None:
+            git = GitContext()
+        self.git = git
         self.x_strategies = []
         self.y_strategies = []
         self.z_strategies = []
@@ -418,15 +482,15 @@ class MasterBranchVersion(BranchVersion):
     def is_a(branch_name):
         return branch_name in ('master', 'main')
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, git=None):
+        super().__init__(git)
 
         # We never want to release this, so make the version number small
-        self.x_strategies.append(ZeroStrategy('x'))
-        self.y_strategies.append(ZeroStrategy('y'))
+        self.x_strategies.append(ZeroStrategy('x', self.git))
+        self.y_strategies.append(ZeroStrategy('y', self.git))
 
         # Make the zed version become the number of commits that are in this branch
-        self.z_strategies.append(CommitCountStrategy('z'))
+        self.z_strategies.append(CommitCountStrategy('z', self.git))
 
 
 class ReleaseBranchVersion(BranchVersion):
@@ -461,11 +525,11 @@ class ReleaseBranchVersion(BranchVersion):
         self.myprint("Patch version number = %s" % self._z)
         return self._z
 
-    def __init__(self):
-        super().__init__()
-        self.x_strategies.append(PinnedFileStrategy('x'))
-        self.y_strategies.append(PinnedFileStrategy('y'))
-        self.z_strategies.append(CommitsSinceChangedStrategy('z'))
+    def __init__(self, git=None):
+        super().__init__(git)
+        self.x_strategies.append(PinnedFileStrategy('x', self.git))
+        self.y_strategies.append(PinnedFileStrategy('y', self.git))
+        self.z_strategies.append(CommitsSinceChangedStrategy('z', self.git))
                 
 
 class DeveloperBranchVersion(BranchVersion):
@@ -502,33 +566,36 @@ class DeveloperBranchVersion(BranchVersion):
         self.myprint("Minor version number = %s" % self._y)
         return self._y
 
-    def __init__(self):
-        super().__init__()
-        self.x_strategies.append(ZeroStrategy('x')) # We don't release our stuff! Stay below 0.
-        self.y_strategies.append(DeveloperBranchOnlyDigitsStrategy('y'))
-        self.z_strategies.append(CommitsFromParentBranch('z'))
+    def __init__(self, git=None):
+        super().__init__(git)
+        self.x_strategies.append(ZeroStrategy('x', self.git)) # We don't release our stuff! Stay below 0.
+        self.y_strategies.append(DeveloperBranchOnlyDigitsStrategy('y', self.git))
+        self.z_strategies.append(CommitsFromParentBranch('z', self.git))
         # Our build system can't handle a lookup against origin, so we just look at commit count
-        self.z_strategies.append(CommitCountStrategy('z'))
+        self.z_strategies.append(CommitCountStrategy('z', self.git))
 
 
-def version_factory():
-    branch = branch_name()
+def version_factory(git=None):
+    # All of the git queries made while working out the version go through this one GitContext
+    if git is None:
+        git = GitContext()
+    branch = git.branch
     myprint("branch = %s" % branch)
     # If the TAG_NAME environment variable exists and is not blank, then we consider ourselves
     # to be in a release branch
     tag_name = os.environ.get('TAG_NAME', False)
     if tag_name:
         myprint("TAG_NAME environment variable set to %s" % tag_name)
-        return ReleaseBranchVersion()
+        return ReleaseBranchVersion(git)
     elif MasterBranchVersion.is_a(branch):
         myprint("Looks like the master branch")
-        return MasterBranchVersion()
+        return MasterBranchVersion(git)
     elif ReleaseBranchVersion.is_a(branch):
         myprint("Looks like a release branch")
-        return ReleaseBranchVersion()
+        return ReleaseBranchVersion(git)
     else:
         myprint("Looks like a developer branch")
-        return DeveloperBranchVersion()
+        return DeveloperBranchVersion(git)
 
 if __name__ == '__main__':
     version_factory()()